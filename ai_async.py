@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Async AI Provider Calls
+=================================
+
+Non-blocking counterparts of the OpenAI and Anthropic SDK calls used by the
+Flask apps, for the ASGI server. Requests go straight to the providers'
+HTTP APIs over one pooled ``httpx.AsyncClient``, so hundreds of slow
+completions wait on the event loop instead of each holding a worker thread.
+
+``fake_deltas`` and ``sse_stream`` mirror their ``ai_streaming``
+namesakes as async generators.
+"""
+
+import json
+import time
+
+from ai_streaming import SYSTEM_PROMPT, sse_event
+from lazy_imports import lazy_import
+from metrics import upstream
+
+asyncio = lazy_import('asyncio')
+httpx = lazy_import('httpx')
+
+OPENAI_API_URL = 'https://api.openai.com/v1'
+ANTHROPIC_API_URL = 'https://api.anthropic.com/v1'
+ANTHROPIC_VERSION = '2023-06-01'
+
+
+class ProviderError(Exception):
+    """Provider answered with an error status"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AsyncAIClient:
+    """OpenAI/Anthropic calls over a shared keep-alive connection pool"""
+
+    def __init__(self, openai_key=None, anthropic_key=None, timeout=60.0, max_connections=200):
+        self.openai_key = openai_key
+        self.anthropic_key = anthropic_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self._loop = None
+
+    def client(self):
+        """Pooled client for the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections // 4)
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _openai_headers(self):
+        return {'Authorization': f'Bearer {self.openai_key}'}
+
+    def _anthropic_headers(self):
+        return {'x-api-key': self.anthropic_key, 'anthropic-version': ANTHROPIC_VERSION}
+
+    async def _post(self, provider, operation, url, headers, body):
+        with upstream(provider, operation):
+            response = await self.client().post(url, headers=headers, json=body)
+            if response.status_code >= 400:
+                raise ProviderError(f"{url} returned {response.status_code}: {response.text[:200]}",
+                                    status_code=response.status_code)
+            return response.json()
+
+    async def _events(self, provider, operation, url, headers, body):
+        """JSON payloads of a provider's SSE stream"""
+        with upstream(provider, operation):
+            async with self.client().stream('POST', url, headers=headers, json=body) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise ProviderError(f"{url} returned {response.status_code}: {response.text[:200]}",
+                                        status_code=response.status_code)
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        return
+                    yield json.loads(data)
+
+    def _openai_chat(self, model, query, max_tokens, temperature, stream):
+        return {
+            'model': model,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': query}
+            ],
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'stream': stream
+        }
+
+    def _anthropic_messages(self, model, query, max_tokens, stream):
+        return {
+            'model': model,
+            'max_tokens': max_tokens,
+            'messages': [
+                {'role': 'user', 'content': f"As a financial AI assistant, please help with: {query}"}
+            ],
+            'stream': stream
+        }
+
+    async def openai_complete(self, model, query, max_tokens=500, temperature=0.7):
+        result = await self._post('openai', 'chat', f'{OPENAI_API_URL}/chat/completions', self._openai_headers(),
+                                  self._openai_chat(model, query, max_tokens, temperature, False))
+        return result['choices'][0]['message']['content']
+
+    async def anthropic_complete(self, model, query, max_tokens=500):
+        result = await self._post('anthropic', 'chat', f'{ANTHROPIC_API_URL}/messages', self._anthropic_headers(),
+                                  self._anthropic_messages(model, query, max_tokens, False))
+        return result['content'][0]['text']
+
+    async def openai_deltas(self, model, query, max_tokens=500, temperature=0.7):
+        """Yield text deltas from an OpenAI chat completion stream"""
+        events = self._events('openai', 'chat_stream', f'{OPENAI_API_URL}/chat/completions', self._openai_headers(),
+                              self._openai_chat(model, query, max_tokens, temperature, True))
+        async for chunk in events:
+            if not chunk.get('choices'):
+                continue
+            text = chunk['choices'][0].get('delta', {}).get('content')
+            if text:
+                yield text
+
+    async def anthropic_deltas(self, model, query, max_tokens=500):
+        """Yield text deltas from an Anthropic messages stream"""
+        events = self._events('anthropic', 'chat_stream', f'{ANTHROPIC_API_URL}/messages', self._anthropic_headers(),
+                              self._anthropic_messages(model, query, max_tokens, True))
+        async for event in events:
+            if event.get('type') == 'content_block_delta' and event.get('delta', {}).get('text'):
+                yield event['delta']['text']
+
+    async def embeddings(self, model, texts):
+        """Embedding vectors for ``texts`` (a string or list), in input order"""
+        result = await self._post('openai', 'embeddings', f'{OPENAI_API_URL}/embeddings', self._openai_headers(),
+                                  {'model': model, 'input': texts})
+        return [item['embedding'] for item in sorted(result['data'], key=lambda item: item['index'])]
+
+
+async def fake_deltas(text, interval=0.05, first_delay=None, chunk_words=1, fail_after=None):
+    """Local fake provider: yield ``text`` a few words at a time without blocking"""
+    words = text.split(' ')
+    pieces = [
+        ' '.join(words[i:i + chunk_words]) + (' ' if i + chunk_words < len(words) else '')
+        for i in range(0, len(words), chunk_words)
+    ]
+    for index, piece in enumerate(pieces):
+        if fail_after is not None and index >= fail_after:
+            raise RuntimeError('Fake provider failure')
+        await asyncio.sleep(first_delay if index == 0 and first_delay is not None else interval)
+        yield piece
+
+
+async def sse_stream(deltas, model, provider, started=None):
+    """Wrap an async delta iterator in the unified SSE event sequence.
+
+    Like ``ai_streaming.sse_stream``: ``started`` is when the provider
+    stream was opened, and ``deltas`` is closed when the stream ends.
+    """
+    if started is None:
+        started = time.perf_counter()
+    first_token_ms = None
+    chunks = 0
+    characters = 0
+
+    try:
+        yield sse_event('start', {'model': model, 'provider': provider})
+        async for text in deltas:
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event('delta', {'index': chunks, 'text': text})
+            chunks += 1
+            characters += len(text)
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+    finally:
+        aclose = getattr(deltas, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    yield sse_event('done', {
+        'model': model,
+        'provider': provider,
+        'chunks': chunks,
+        'characters': characters,
+        'first_token_ms': first_token_ms,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
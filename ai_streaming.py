@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+FinDeus - AI Token Streaming
+============================
+
+Relays provider token deltas to clients as Server-Sent Events. OpenAI and
+Anthropic streams are normalized into one event format:
+
+    event: start  data: {"model": ..., "provider": ...}
+    event: delta  data: {"index": 0, "text": "..."}
+    event: done   data: {"model": ..., "chunks": n, "characters": n,
+                         "first_token_ms": ..., "elapsed_ms": ...}
+    event: error  data: {"error": "..."}
+
+A local fake provider emits chunks at controlled intervals so the
+streaming path can be exercised without API keys.
+"""
+
+import json
+import time
+
+from metrics import upstream
+
+SYSTEM_PROMPT = "You are a financial AI assistant. Provide helpful, accurate financial advice and analysis."
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop reverse proxies from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+def wants_stream(data, args=None):
+    """True if the request opted into streaming via body or query string"""
+    value = (data or {}).get('stream')
+    if value is None and args is not None:
+        value = args.get('stream')
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def sse_event(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def openai_deltas(client, model, query, max_tokens=500, temperature=0.7):
+    """Yield text deltas from an OpenAI chat completion stream"""
+    with upstream('openai', 'chat_stream'):
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": query}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                yield text
+
+
+def anthropic_deltas(client, model, query, max_tokens=500):
+    """Yield text deltas from an Anthropic messages stream"""
+    with upstream('anthropic', 'chat_stream'):
+        stream = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "user", "content": f"As a financial AI assistant, please help with: {query}"}
+            ],
+            stream=True
+        )
+        for event in stream:
+            if event.type == 'content_block_delta' and getattr(event.delta, 'text', None):
+                yield event.delta.text
+
+
+def fake_deltas(text, interval=0.05, first_delay=None, chunk_words=1, fail_after=None):
+    """Local fake provider: yield ``text`` a few words at a time.
+
+    ``interval`` is the pause between chunks and ``first_delay`` the pause
+    before the first one (defaults to ``interval``). ``fail_after`` raises
+    after that many chunks to exercise the error path.
+    """
+    words = text.split(' ')
+    pieces = [
+        ' '.join(words[i:i + chunk_words]) + (' ' if i + chunk_words < len(words) else '')
+        for i in range(0, len(words), chunk_words)
+    ]
+    for index, piece in enumerate(pieces):
+        if fail_after is not None and index >= fail_after:
+            raise RuntimeError('Fake provider failure')
+        time.sleep(first_delay if index == 0 and first_delay is not None else interval)
+        yield piece
+
+
+def sse_stream(deltas, model, provider, started=None):
+    """Wrap a delta iterator in the unified SSE event sequence.
+
+    ``started`` is the ``time.perf_counter()`` at which the provider stream
+    was opened, if that was before this generator runs. ``deltas`` is
+    closed when the stream ends, including when the client goes away.
+    """
+    if started is None:
+        started = time.perf_counter()
+    first_token_ms = None
+    chunks = 0
+    characters = 0
+
+    try:
+        yield sse_event('start', {'model': model, 'provider': provider})
+        for text in deltas:
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event('delta', {'index': chunks, 'text': text})
+            chunks += 1
+            characters += len(text)
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+    finally:
+        close = getattr(deltas, 'close', None)
+        if close is not None:
+            close()
+
+    yield sse_event('done', {
+        'model': model,
+        'provider': provider,
+        'chunks': chunks,
+        'characters': characters,
+        'first_token_ms': first_token_ms,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Core API Handlers
+===========================
+
+Framework-free endpoint handlers shared by the Flask apps and the Netlify
+function. Each handler takes one ``params`` dict (path parameters, query
+string and JSON body merged) and returns ``(payload, status)``, where
+``payload`` is a JSON-serializable dict.
+
+``ROUTES`` is the dispatch table and ``match()`` resolves a path and
+method to a handler, so a caller without Flask or Werkzeug can serve every
+endpoint. Heavy modules (numpy, pandas, yfinance, sklearn) are imported on
+first use to keep cold starts small.
+"""
+
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone
+
+import metrics
+from coalescing import Coalescer
+from embedding_codec import encode_matrix, parse_format
+from lazy_imports import lazy_import
+from market_data import download_quotes, parse_symbols, to_columnar
+from ttl_cache import TTLCache
+
+yf = lazy_import('yfinance')
+history_store_module = lazy_import('history_store')
+indicators_module = lazy_import('indicators')
+forecasting_module = lazy_import('forecasting')
+risk_engine = lazy_import('risk_engine')
+portfolio_engine = lazy_import('portfolio_engine')
+holdings_upload = lazy_import('holdings_upload')
+symbol_index = lazy_import('symbol_index')
+covariance_module = lazy_import('covariance')
+portfolio_optimizer = lazy_import('portfolio_optimizer')
+
+logger = logging.getLogger(__name__)
+
+# Cache for market data
+CACHE_DURATION = 300  # 5 minutes
+QUOTE_CACHE_DURATION = 60  # 1 minute, matches /api/market/realtime
+STALE_DURATION = 30  # serve expired entries this long while refreshing
+INDICATOR_WINDOW = int(os.environ.get('INDICATOR_WINDOW', 1000))
+UPLOAD_READ_BYTES = 64 * 1024
+MAX_JSON_MATRIX = 200  # symbols; larger covariance matrices need a packed format
+
+
+def payload_size(value):
+    """Approximate size of a cached payload in bytes"""
+    return len(json.dumps(value, default=str))
+
+
+market_cache = TTLCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 4096)),
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    default_ttl=CACHE_DURATION,
+    stale_ttl=STALE_DURATION,
+    sizeof=payload_size,
+    name='market-cache'
+)
+
+# Identical concurrent upstream calls (quotes, AI answers, embeddings) share one request
+upstream = Coalescer('upstream')
+
+metrics.track_cache('market', market_cache.stats)
+metrics.track_coalescer(upstream)
+
+# Local OHLCV history, indicator state, forecast models and covariance
+# matrices, built on first use
+_history_store = None
+_indicator_cache = None
+_forecaster = None
+_covariance_service = None
+
+
+def get_history_store():
+    global _history_store
+    if _history_store is None:
+        _history_store = history_store_module.HistoryStore()
+    return _history_store
+
+
+def get_indicator_cache():
+    global _indicator_cache
+    if _indicator_cache is None:
+        _indicator_cache = indicators_module.IndicatorCache(get_history_store(), window=INDICATOR_WINDOW)
+    return _indicator_cache
+
+
+def get_forecaster():
+    global _forecaster
+    if _forecaster is None:
+        _forecaster = forecasting_module.Forecaster(get_history_store())
+    return _forecaster
+
+
+def get_covariance_service():
+    global _covariance_service
+    if _covariance_service is None:
+        _covariance_service = covariance_module.CovarianceService(get_history_store())
+        metrics.track_cache('covariance', _covariance_service.stats)
+    return _covariance_service
+
+
+def request_params(query=None, body=None, path_params=None, forced=None):
+    """Merge request inputs into one params dict; later sources win.
+
+    ``forced`` is applied last, so the request cannot override it.
+    """
+    params = dict(query or {})
+    if isinstance(body, dict):
+        params.update(body)
+    params.update(path_params or {})
+    params.update(forced or {})
+    return params
+
+
+def flag(value, default=True):
+    """Boolean from a JSON value or a query-string 'true'/'false'"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def wants_refresh(params):
+    """True if the request opted into downloading new bars before reading.
+
+    Reads are served from the local history store unless the client passes
+    ``refresh=true``.
+    """
+    return flag(params.get('refresh'), default=False)
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO date/datetime string or a number"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+
+def parse_interval(params):
+    interval = params.get('interval') or '1d'
+    if interval not in history_store_module.INITIAL_PERIOD:
+        raise ValueError(f'Unsupported interval: {interval}')
+    return interval
+
+
+def json_floats(values):
+    """Float list with NaN (indicator warm-up) as null"""
+    return [None if v != v else round(float(v), 6) for v in values]
+
+
+def read_chunks(stream, size=UPLOAD_READ_BYTES):
+    """Iterate a file-like request body ``size`` bytes at a time"""
+    return iter(lambda: stream.read(size), b'')
+
+
+def timestamped(payload):
+    payload['timestamp'] = datetime.now().isoformat()
+    return payload
+
+
+# Market Data Endpoints
+def ticker_info(symbol):
+    with metrics.upstream('yfinance', 'ticker_info'):
+        return yf.Ticker(symbol).info
+
+
+def reference_entry(symbol):
+    """Static metadata from the local symbol index, or None"""
+    index = symbol_index.get_index()
+    return index.get(symbol) if index is not None else None
+
+
+def fetch_realtime(symbol):
+    # Indexed symbols only need a price download; static fields are local
+    reference = reference_entry(symbol)
+    if reference is not None:
+        quote = market_cache.get(f"quote:{symbol}") or upstream.run(
+            f"quote:{symbol}", lambda: download_quotes([symbol]).get(symbol)
+        )
+        if quote is not None:
+            market_cache.set(f"quote:{symbol}", quote, ttl=QUOTE_CACHE_DURATION)
+            return {
+                'symbol': symbol,
+                'name': reference['name'] or symbol,
+                'price': quote['price'],
+                'change': quote['change'],
+                'change_percent': quote['change_percent'],
+                'volume': quote['volume'],
+                'market_cap': reference['market_cap'] or 0,
+                'pe_ratio': reference['trailing_pe'] or 0,
+                'sector': reference['sector'],
+                'industry': reference['industry'],
+                'currency': reference['currency'],
+                'exchange': reference['exchange'],
+            }
+
+    info = upstream.run(f"realtime:{symbol}", lambda: ticker_info(symbol))
+    return {
+        'symbol': symbol,
+        'name': info.get('longName', symbol),
+        'price': info.get('currentPrice', 0),
+        'change': info.get('regularMarketChange', 0),
+        'change_percent': info.get('regularMarketChangePercent', 0),
+        'volume': info.get('regularMarketVolume', 0),
+        'market_cap': info.get('marketCap', 0),
+        'pe_ratio': info.get('trailingPE', 0),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'currency': info.get('currency'),
+        'exchange': info.get('exchange'),
+    }
+
+
+def market_realtime(params):
+    """Get real-time market data"""
+    symbol = str(params.get('symbol', '')).upper()
+    try:
+        quote = market_cache.get_or_load(
+            f"realtime:{symbol}", lambda: fetch_realtime(symbol), ttl=QUOTE_CACHE_DURATION
+        )
+        return timestamped(dict(quote)), 200
+    except Exception as e:
+        logger.error(f"Error getting realtime data for {symbol}: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def market_batch(params):
+    """Get quotes for many symbols in one call"""
+    try:
+        symbols = parse_symbols(params.get('symbols'))
+
+        # Serve what we can from cache, fetch the rest in one download
+        quotes = {}
+        cached = []
+        for symbol in symbols:
+            quote = market_cache.get(f"quote:{symbol}")
+            if quote is not None:
+                quotes[symbol] = quote
+                cached.append(symbol)
+
+        misses = [s for s in symbols if s not in quotes]
+        if misses:
+            fetched = download_quotes(misses)
+            for symbol, quote in fetched.items():
+                market_cache.set(f"quote:{symbol}", quote, ttl=QUOTE_CACHE_DURATION)
+            quotes.update(fetched)
+
+        return timestamped(to_columnar(symbols, quotes, cached)), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error getting batch quotes: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def market_reference(params):
+    """Static reference data for many symbols from the local index"""
+    try:
+        symbols = parse_symbols(params.get('symbols') or params.get('symbol'))
+        index = symbol_index.get_index()
+        if index is None:
+            return {'error': 'Symbol reference index has not been built'}, 503
+
+        entries = {symbol: index.get(symbol) for symbol in symbols}
+        return timestamped({
+            'symbols': [s for s in symbols if entries[s] is not None],
+            'data': {s: entry for s, entry in entries.items() if entry is not None},
+            'missing': [s for s in symbols if entries[s] is None],
+            'indexed': len(index),
+            'built_at': datetime.fromtimestamp(index.built_at).isoformat(),
+        }), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error getting reference data: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def market_history(params):
+    """OHLCV bars from the local history store, optionally refreshed incrementally"""
+    symbol = str(params.get('symbol', '')).upper()
+    try:
+        interval = parse_interval(params)
+        store = get_history_store()
+        appended = 0
+        if wants_refresh(params):
+            appended = store.refresh([symbol], interval)[symbol]
+
+        bars = store.read(
+            symbol, interval,
+            start=parse_time(params.get('start')),
+            end=parse_time(params.get('end'))
+        )
+        if bars is None:
+            return {'error': f'No history for {symbol}; request it with refresh=true to download'}, 404
+
+        return timestamped({
+            'symbol': symbol,
+            'interval': interval,
+            'rows': int(bars['timestamp'].size),
+            'appended': appended,
+            'data': {name: values.tolist() for name, values in bars.items()},
+        }), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error getting history for {symbol}: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def market_indicators(params):
+    """Technical indicators for many symbols from the local history store"""
+    try:
+        symbols = parse_symbols(params.get('symbols'))
+        interval = parse_interval(params)
+        names = indicators_module.parse_indicators(params.get('indicators'))
+        bars = int(params.get('bars') or 0)
+        if not 0 <= bars <= INDICATOR_WINDOW:
+            raise ValueError(f'bars must be between 0 and {INDICATOR_WINDOW}')
+
+        if wants_refresh(params):
+            get_history_store().refresh(symbols, interval)
+
+        latest, series = get_indicator_cache().compute(symbols, interval, tail=bars)
+        found = [s for s in symbols if s in latest]
+        payload = {
+            'symbols': found,
+            'interval': interval,
+            'indicators': names,
+            'latest': {name: json_floats([latest[s][name] for s in found]) for name in names},
+            'missing': [s for s in symbols if s not in latest],
+        }
+        if bars:
+            payload['series'] = {
+                s: {name: json_floats(series[s][name]) for name in names} for s in found
+            }
+        return timestamped(payload), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error getting indicators: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+# Portfolio and Risk Endpoints
+def stored_universe(symbols, interval='1d'):
+    """Sorted subset of ``symbols`` that has stored history"""
+    stored = set(get_history_store().symbols(interval))
+    return sorted(s for s in set(symbols) if s in stored)
+
+
+def risk_model(symbols, interval='1d', lookback=252, method='sample'):
+    """RiskModel over the given symbols with stored history, from the covariance service"""
+    universe = stored_universe(symbols, interval)
+    if not universe:
+        return None
+    state = get_covariance_service().get(universe, lookback, method=method, interval=interval)
+    return portfolio_engine.RiskModel(state.symbols, state.returns, cov=state.cov)
+
+
+def portfolio_report(params, columns):
+    """Analysis of holding columns with the request's risk options"""
+    interval = parse_interval(params)
+    lookback = int(params.get('lookback', 252))
+    symbols = list(set(columns['symbol'].tolist()))
+
+    # Holdings posted without a sector are classified from the reference index
+    unclassified = columns['sector'] == portfolio_engine.UNCLASSIFIED
+    index = symbol_index.get_index()
+    if index is not None and unclassified.any():
+        sectors = columns['sector'].copy()
+        sectors[unclassified] = index.labels(columns['symbol'][unclassified], 'sector',
+                                             portfolio_engine.UNCLASSIFIED)
+        columns = dict(columns, sector=sectors)
+
+    if wants_refresh(params):
+        get_history_store().refresh(symbols, interval)
+
+    model = None
+    if flag(params.get('risk')):
+        model = risk_model(symbols, interval, lookback, params.get('covariance') or 'sample')
+    return portfolio_engine.analyze(
+        columns, model,
+        include_positions=flag(params.get('include_positions'), default=False),
+        min_variance=flag(params.get('min_variance'), default=False)
+    )
+
+
+def portfolio_analyze(params):
+    """Portfolio analysis endpoint"""
+    try:
+        holdings = params.get('holdings')
+        if not holdings:
+            return {'error': 'Holdings data required'}, 400
+
+        columns = portfolio_engine.holdings_columns(holdings)
+        return timestamped(portfolio_report(params, columns)), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error analyzing portfolio: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def portfolio_upload(params, body, content_type=None):
+    """Portfolio analysis of a streamed CSV or NDJSON holdings body.
+
+    ``body`` is an iterable of byte chunks; each one is parsed and folded
+    into running totals as it arrives.
+    """
+    try:
+        upload = holdings_upload.HoldingsUpload(
+            holdings_upload.parse_format(params.get('format'), content_type)
+        )
+        for data in body:
+            upload.feed(data)
+        report = portfolio_report(params, upload.finish())
+        report['upload'] = upload.summary()
+        return timestamped(report), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error analyzing uploaded portfolio: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def weight_range(value, name):
+    """``(min, max)`` weights from a maximum or a ``[min, max]`` pair"""
+    if isinstance(value, (list, tuple)):
+        if len(value) != 2:
+            raise ValueError(f'{name} must be a maximum weight or a [min, max] pair')
+        return float(value[0]), float(value[1])
+    return 0.0, float(value)
+
+
+def portfolio_optimize(params):
+    """Minimum-variance, maximum-Sharpe and target-return portfolios plus the efficient frontier.
+
+    The universe is ``symbols`` or the symbols of posted ``holdings`` (whose
+    weights are reported as the current portfolio). Covariance defaults to
+    Ledoit-Wolf, which stays well conditioned when assets outnumber periods.
+    """
+    try:
+        holdings = params.get('holdings')
+        current = None
+        labels = {}
+        if holdings:
+            positions = portfolio_engine.net_positions(portfolio_engine.holdings_columns(holdings))
+            symbols = positions['symbol'].tolist()
+            current = dict(zip(symbols, positions['value'].tolist()))
+            labels = {s: label for s, label in zip(symbols, positions['sector'].tolist())
+                      if label != portfolio_engine.UNCLASSIFIED}
+        else:
+            symbols = parse_symbols(params.get('symbols'), limit=portfolio_optimizer.MAX_ASSETS)
+        if len(symbols) > portfolio_optimizer.MAX_ASSETS:
+            raise ValueError(f'At most {portfolio_optimizer.MAX_ASSETS} assets per optimization')
+
+        interval = parse_interval(params)
+        window = int(params.get('window') or params.get('lookback') or covariance_module.DEFAULT_WINDOW)
+        method = params.get('covariance') or 'ledoit_wolf'
+        points = int(params.get('points', portfolio_optimizer.DEFAULT_FRONTIER_POINTS))
+        if not 0 <= points <= portfolio_optimizer.MAX_FRONTIER_POINTS:
+            raise ValueError(f'points must be between 0 and {portfolio_optimizer.MAX_FRONTIER_POINTS}')
+        risk_free = float(params.get('risk_free_rate') or 0.0)
+        min_weight = float(params.get('min_weight') or 0.0)
+        max_weight = float(params.get('max_weight') or 1.0)
+        bounds = {str(s).upper(): weight_range(v, f'bounds[{s}]') for s, v in (params.get('bounds') or {}).items()}
+        labels.update({str(s).upper(): str(label) for s, label in (params.get('sectors') or {}).items()})
+
+        if wants_refresh(params):
+            get_history_store().refresh(symbols, interval)
+
+        universe = stored_universe(symbols, interval)
+        if len(universe) < 2:
+            return {'error': 'At least two symbols with stored history are required'}, 404
+        covered = set(universe)
+        state = get_covariance_service().get(universe, window, method, interval)
+
+        # Sectors: request, then holdings, then the reference index
+        sectors = [labels.get(s) for s in universe]
+        index = symbol_index.get_index()
+        if index is not None and None in sectors:
+            indexed = index.labels(universe, 'sector', portfolio_engine.UNCLASSIFIED)
+            sectors = [label or indexed[i] for i, label in enumerate(sectors)]
+        sectors = [label or portfolio_engine.UNCLASSIFIED for label in sectors]
+
+        limits = {}
+        if params.get('max_sector_weight') not in (None, ''):
+            cap = float(params['max_sector_weight'])
+            limits = {label: (0.0, cap) for label in set(sectors) if label != portfolio_engine.UNCLASSIFIED}
+        limits.update({str(name): weight_range(v, f'sector_limits[{name}]')
+                       for name, v in (params.get('sector_limits') or {}).items()})
+
+        problem = portfolio_optimizer.build_problem(
+            universe, state.cov, state.returns, covariance_module.PERIODS_PER_YEAR.get(interval, 252),
+            params.get('expected_returns'), min_weight, max_weight, bounds, sectors, limits, risk_free
+        )
+        portfolios = {
+            'min_variance': problem.report(problem.min_variance()),
+            'max_sharpe': problem.report(problem.max_sharpe()),
+        }
+        if params.get('target_return') not in (None, ''):
+            target = float(params['target_return'])
+            portfolios['target_return'] = dict(problem.report(problem.target_return(target)), target=target)
+        if current is not None:
+            held = [current[s] for s in universe]
+            total = sum(held)
+            if total:
+                portfolios['current'] = problem.report([value / total for value in held])
+
+        payload = {
+            'symbols': universe,
+            'missing': [s for s in symbols if s not in covered],
+            'interval': interval,
+            'covariance': method,
+            'window': window,
+            'observations': int(state.returns.shape[0]),
+            'as_of': datetime.fromtimestamp(state.as_of, timezone.utc).isoformat(),
+            'risk_free_rate': risk_free,
+            'constraints': {
+                'min_weight': min_weight,
+                'max_weight': max_weight,
+                'bounds': {s: list(b) for s, b in bounds.items() if s in covered},
+                'sector_limits': {name: list(limits[name]) for name in problem.groups},
+            },
+            'portfolios': portfolios,
+        }
+        if points:
+            payload['frontier'] = problem.frontier_report(points, flag(params.get('include_weights'), default=False))
+        payload['solver'] = {
+            'method': 'critical_line',
+            'breakpoints': int(problem.critical_line()[0].size),
+            'steps': problem.steps,
+        }
+        return timestamped(payload), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error optimizing portfolio: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def risk_analysis(params):
+    """Risk analysis endpoint"""
+    try:
+        portfolio = params.get('portfolio', {})
+
+        # Symbols without posted returns are priced from the local history store
+        if 'returns' not in portfolio and portfolio.get('symbols'):
+            store = get_history_store()
+            if wants_refresh(params):
+                store.refresh(portfolio['symbols'])
+            _, returns = store.returns_matrix(
+                portfolio['symbols'], lookback=int(portfolio.get('lookback', 252))
+            )
+            portfolio = dict(portfolio, returns=dict(zip(portfolio['symbols'], returns.T)))
+
+        return timestamped(risk_engine.analyze_risk(portfolio)), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error analyzing risk: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+def covariance_matrix(params):
+    """Sample, EWMA or Ledoit-Wolf covariance over stored returns"""
+    try:
+        symbols = parse_symbols(params.get('symbols'), limit=covariance_module.MAX_SYMBOLS)
+        interval = parse_interval(params)
+        window = int(params.get('window') or covariance_module.DEFAULT_WINDOW)
+        method = params.get('method') or 'sample'
+        decay = float(params.get('decay') or covariance_module.DEFAULT_DECAY)
+        fmt = parse_format(params.get('format'))
+        correlation = flag(params.get('correlation'), default=False)
+
+        if wants_refresh(params):
+            get_history_store().refresh(symbols, interval)
+
+        universe = stored_universe(symbols, interval)
+        if not universe:
+            return {'error': 'No stored history for the requested symbols'}, 404
+        state = get_covariance_service().get(universe, window, method, interval, decay)
+
+        corr = state.correlation()
+        average = state.average_correlation(corr)
+        payload = {
+            'symbols': universe,
+            'missing': sorted(set(symbols) - set(universe)),
+            'interval': interval,
+            'method': method,
+            'window': window,
+            'observations': int(state.returns.shape[0]),
+            'as_of': datetime.fromtimestamp(state.as_of, timezone.utc).isoformat(),
+            'volatility': json_floats(state.volatility(annualized=True)),
+            'average_correlation': None if average is None else round(average, 6),
+            'incremental_updates': state.updates,
+            'matrix': 'correlation' if correlation else 'covariance',
+        }
+        if method == 'ewma':
+            payload['decay'] = decay
+        if method == 'ledoit_wolf':
+            payload['shrinkage'] = round(state.shrinkage, 6)
+
+        # Large matrices only go out packed; small ones may be plain lists
+        matrix = corr if correlation else state.cov
+        if fmt:
+            payload['data'] = encode_matrix(matrix, fmt)
+        elif len(universe) <= MAX_JSON_MATRIX:
+            payload['data'] = [json_floats(row) for row in matrix]
+        else:
+            payload['data'] = None
+            payload['note'] = f'Matrices over {MAX_JSON_MATRIX} symbols require format=f32|f16|int8'
+        return timestamped(payload), 200
+
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error building covariance matrix: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+# Prediction Endpoints
+def forecast(params):
+    """Price forecasts from per-symbol models trained on stored history"""
+    try:
+        symbols = parse_symbols(params.get('symbols') or params.get('symbol') or 'SPY', limit=50)
+        interval = parse_interval(params)
+        days = int(params.get('days', 30))
+
+        if wants_refresh(params):
+            get_history_store().refresh(symbols, interval)
+
+        forecaster = get_forecaster()
+        if 'symbols' not in params:
+            return timestamped(forecaster.forecast(symbols[0], interval, days)), 200
+
+        # Several symbols: stale models are retrained in parallel first
+        forecasts, skipped = forecaster.forecast_many(symbols, interval, days)
+        return timestamped({'forecasts': forecasts, 'skipped': skipped}), 200
+
+    except LookupError as e:
+        return {'error': str(e)}, 404
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error generating forecast: {str(e)}")
+        return {'error': str(e)}, 500
+
+
+# (methods, path pattern, handler); <name> segments become path params
+ROUTES = [
+    (('GET',), '/api/market/realtime/<symbol>', market_realtime),
+    (('GET', 'POST'), '/api/market/batch', market_batch),
+    (('GET',), '/api/market/reference', market_reference),
+    (('GET',), '/api/market/history/<symbol>', market_history),
+    (('GET',), '/api/market/indicators', market_indicators),
+    (('POST',), '/api/portfolio/analyze', portfolio_analyze),
+    (('POST',), '/api/portfolio/optimize', portfolio_optimize),
+    (('POST',), '/api/analysis/risk', risk_analysis),
+    (('GET', 'POST'), '/api/analysis/covariance', covariance_matrix),
+    (('POST',), '/api/predictions/forecast', forecast),
+]
+
+_COMPILED = [
+    (methods, re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '/?$'), handler)
+    for methods, pattern, handler in ROUTES
+]
+
+
+def match(path, method='GET'):
+    """Resolve ``(handler, path_params)`` for a request, or ``(None, None)``"""
+    for methods, regex, handler in _COMPILED:
+        found = regex.match(path)
+        if found and method in methods:
+            return handler, found.groupdict()
+    return None, None
@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""
+FinDeus - ASGI Server
+=====================
+
+Async entry point for the FinDeus APIs, so a slow AI call no longer holds
+a worker for its whole duration. Run under any ASGI server::
+
+    uvicorn asgi_app:app          # netlify_app routes, real providers
+    uvicorn asgi_app:demo_app     # web_app routes, simulated engine
+
+AI queries, token streams and embeddings await provider responses on the
+event loop (see ``ai_async``), so one process multiplexes hundreds of
+concurrent queries. Blocking work (api_core handlers, yfinance, batched
+ingest, vector search) runs on a bounded thread pool of ``ASGI_THREADS``.
+Caches, coalescing and AI routing state are shared with the Flask apps.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+import ai_async
+import api_core
+import metrics
+import netlify_app
+import response_encoding
+import web_app
+from ai_streaming import SSE_HEADERS, wants_stream
+from embedding_codec import OCTET_STREAM, encode_vector, parse_format
+from embedding_pipeline import content_hash
+from llm_router import RouterError
+from market_data import parse_symbols, to_columnar
+from semantic_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+}
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-sync')
+
+
+async def run_sync(fn, *args):
+    """Run blocking ``fn(*args)`` on the worker pool"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+class Request:
+    """Method, path, query string, headers and body of one HTTP request"""
+
+    def __init__(self, scope, body, receive=None):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.body = body
+        self.path_params = {}
+        self._receive = receive
+
+    async def stream(self):
+        """Body chunks as they arrive, for routes registered with ``stream=True``"""
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError('Client disconnected during upload')
+            if message.get('body'):
+                yield message['body']
+            if not message.get('more_body'):
+                return
+
+    def json(self):
+        """Parsed JSON body, or None if it is missing or invalid"""
+        if not self.body:
+            return None
+        try:
+            return response_encoding.loads(self.body)
+        except ValueError:
+            return None
+
+    def prefers(self, media_type):
+        """True if ``media_type`` is the client's first choice in Accept"""
+        ranked = []
+        for part in self.headers.get('accept', '').split(','):
+            fields = part.strip().split(';')
+            quality = 1.0
+            for field in fields[1:]:
+                name, _, value = field.strip().partition('=')
+                if name == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if fields[0].strip():
+                ranked.append((quality, fields[0].strip()))
+        return bool(ranked) and max(ranked, key=lambda r: r[0])[1] == media_type
+
+
+class Response:
+    def __init__(self, body, status=200, media_type='application/json', headers=None):
+        self.body = body if isinstance(body, bytes) else body.encode()
+        self.status = status
+        self.media_type = media_type
+        self.headers = headers or {}
+
+
+class StreamingResponse:
+    """Body sent chunk by chunk from an async iterator"""
+
+    def __init__(self, chunks, status=200, media_type='text/event-stream', headers=None):
+        self.chunks = chunks
+        self.status = status
+        self.media_type = media_type
+        self.headers = headers or {}
+
+
+def json_response(payload, status=200):
+    body, etag = response_encoding.dumps_with_etag(payload)
+    return Response(body, status, headers={'ETag': f'W/"{etag}"'})
+
+
+def encode_response(request, response):
+    """304 for a matching If-None-Match on GET, else compress per Accept-Encoding"""
+    if not isinstance(response, Response) or 'Content-Encoding' in response.headers:
+        return response
+    etag = response.headers.get('ETag', '')
+    if (request.method in ('GET', 'HEAD') and response.status == 200
+            and response_encoding.etag_matches(request.headers.get('if-none-match'), etag[2:].strip('"'))):
+        return Response(b'', 304, response.media_type, {'ETag': etag})
+
+    body, coding = response_encoding.encode_body(response.body, response.media_type,
+                                                 request.headers.get('accept-encoding'))
+    response.headers['Vary'] = 'Accept-Encoding'
+    if coding is not None:
+        response.body = body
+        response.headers['Content-Encoding'] = coding
+    return response
+
+
+def sse_response(events):
+    return StreamingResponse(events, headers=SSE_HEADERS)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def sync_chunks(chunks, loop):
+    """Blocking iterator over an async chunk iterator, for code on the worker pool"""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(chunks.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class ASGIApp:
+    """Minimal ASGI application: pattern routes, JSON and streamed responses, CORS"""
+
+    def __init__(self, name, on_shutdown=()):
+        self.name = name
+        self.routes = []
+        self.streaming = set()
+        self.on_shutdown = list(on_shutdown)
+
+    def route(self, pattern, methods=('GET',), stream=False):
+        """Register an async ``handler(request)``; <name> segments become path params.
+
+        With ``stream=True`` the body is not read up front; the handler
+        consumes it through ``request.stream()``.
+        """
+        regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '/?$')
+
+        def register(handler):
+            self.routes.append((tuple(methods), pattern, regex, handler))
+            if stream:
+                self.streaming.add(handler)
+            return handler
+        return register
+
+    def match(self, path, method):
+        """``(handler, path_params, pattern)``; pattern is set if only the method is wrong"""
+        path_known = None
+        for methods, pattern, regex, handler in self.routes:
+            found = regex.match(path)
+            if found:
+                if method in methods:
+                    return handler, found.groupdict(), pattern
+                path_known = pattern
+        return None, None, path_known
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        started = time.perf_counter()
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            handler, _, pattern = self.match(scope['path'], scope['method'])
+            if handler in self.streaming:
+                request = Request(scope, b'', receive)
+            else:
+                request = Request(scope, await read_body(receive))
+            if request.method == 'OPTIONS':
+                # Label by route pattern: raw paths would make the metric cardinality unbounded
+                route, response = pattern or 'unmatched', Response(b'', headers=PREFLIGHT_HEADERS)
+            else:
+                route, response = await self.dispatch(request)
+                response = encode_response(request, response)
+            await self.send_response(response, send, receive,
+                                     lambda: metrics.record_request(route, request.method, response.status,
+                                                                    time.perf_counter() - started))
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+
+    async def dispatch(self, request):
+        """``(route pattern, response)`` for a request"""
+        handler, path_params, pattern = self.match(request.path, request.method)
+        if handler is None:
+            if pattern is not None:
+                return pattern, json_response({'error': 'Method not allowed'}, 405)
+            return 'unmatched', json_response({'error': 'Endpoint not found'}, 404)
+
+        request.path_params = path_params
+        try:
+            return pattern, await handler(request)
+        except Exception as e:
+            logger.error(f"Unhandled error on {request.method} {request.path}: {str(e)}")
+            return pattern, json_response({'error': 'Internal server error'}, 500)
+
+    async def send_response(self, response, send, receive, on_start=None):
+        """Send ``response``; ``on_start`` runs once the status line is out"""
+        headers = {**CORS_HEADERS, 'Content-Type': response.media_type, **response.headers}
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items()],
+        })
+        if on_start is not None:
+            on_start()
+        if isinstance(response, Response):
+            await send({'type': 'http.response.body', 'body': response.body})
+            return
+
+        # Stop pulling from the provider as soon as the client goes away
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            async for chunk in response.chunks:
+                if disconnected.done():
+                    return
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk.encode() if isinstance(chunk, str) else chunk,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if hasattr(response.chunks, 'aclose'):
+                await response.chunks.aclose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for hook in self.on_shutdown:
+                    await hook()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def core_routes(target, handlers=None, forced=None):
+    """Serve api_core handlers on the worker pool"""
+    for methods, pattern, handler in api_core.ROUTES:
+        if handlers is not None and handler not in handlers:
+            continue
+
+        async def view(request, handler=handler):
+            params = api_core.request_params(request.query, request.json(), request.path_params, forced)
+            payload, status = await run_sync(handler, params)
+            return json_response(payload, status)
+        target.route(pattern, methods)(view)
+
+
+def upload_routes(target, forced=None):
+    """Streamed holdings upload, parsed on the worker pool as chunks arrive"""
+    @target.route('/api/portfolio/upload', methods=('POST',), stream=True)
+    async def portfolio_upload(request):
+        params = api_core.request_params(request.query, forced=forced)
+        chunks = sync_chunks(request.stream(), asyncio.get_running_loop())
+        payload, status = await run_sync(api_core.portfolio_upload, params, chunks,
+                                         request.headers.get('content-type'))
+        return json_response(payload, status)
+
+
+async def single(text):
+    yield text
+
+
+def metrics_routes(target):
+    @target.route('/metrics')
+    async def metrics_endpoint(request):
+        return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# Real API (netlify_app routes)
+app = ASGIApp('findeus-api', on_shutdown=[netlify_app.async_ai.aclose])
+ai_cache = netlify_app.ai_cache
+ai_router = netlify_app.ai_router
+upstream = api_core.upstream
+
+
+@app.route('/')
+async def root(request):
+    """Root endpoint for debugging"""
+    return json_response({
+        'message': 'FinDeus ASGI API is running',
+        'timestamp': datetime.now().isoformat(),
+        'available_endpoints': [pattern for _, pattern, _, _ in app.routes if pattern != '/']
+    })
+
+
+@app.route('/api/health')
+async def health_check(request):
+    """Health check endpoint"""
+    return json_response(dict(netlify_app.health_status(), server='asgi', worker_threads=ASGI_THREADS))
+
+
+core_routes(app)
+upload_routes(app)
+metrics_routes(app)
+
+
+async def open_stream(model, query):
+    """Start an async stream on a routed backend, failing over until one yields a first delta.
+
+    Same as ``netlify_app.open_stream``: the first delta is awaited here,
+    where a failure can still move to another backend. Returns
+    ``(model, deltas, started)``.
+    """
+    tried = []
+    for _ in range(ai_router.max_attempts):
+        routed = netlify_app.route_model(model, exclude=tried)
+        if routed is None:
+            break
+        tried.append(routed)
+        started = time.perf_counter()
+        deltas = None
+        try:
+            deltas = netlify_app.stream_deltas_async(routed, query)
+            first = await deltas.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except Exception as e:
+            ai_router.record(routed, time.perf_counter() - started, False)
+            if model != 'auto':
+                raise
+            logger.warning(f"Could not start stream on {routed}: {str(e)}")
+            continue
+        return routed, prepended(first, deltas), started
+    raise RouterError('No healthy AI backend available')
+
+
+async def prepended(first, deltas):
+    """``first`` (unless None) followed by the rest of ``deltas``"""
+    try:
+        if first is not None:
+            yield first
+        async for text in deltas:
+            yield text
+    finally:
+        await deltas.aclose()
+
+
+class RoutedDeltas(netlify_app.RoutedDeltas):
+    """Async ``netlify_app.RoutedDeltas``"""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.deltas.__anext__()
+        except StopAsyncIteration:
+            self.settle(True)
+            raise
+        except Exception:
+            self.settle(False)
+            raise
+
+    async def aclose(self):
+        self.settle(None)
+        aclose = getattr(self.deltas, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+async def caching_deltas(deltas, model, query, vector):
+    """Pass deltas through and cache the full answer once the stream completes"""
+    parts = []
+    async for text in deltas:
+        parts.append(text)
+        yield text
+    await run_sync(ai_cache.store, model, query, ''.join(parts), vector)
+
+
+@app.route('/api/ai/query', methods=('POST',))
+async def ai_query(request):
+    """Process AI queries"""
+    try:
+        data = request.json() or {}
+        query = data.get('query', '')
+        model = data.get('model', 'gpt-4')
+
+        if not query:
+            return json_response({'error': 'Query is required'}, 400)
+
+        if not netlify_app.model_available(model):
+            return json_response({'error': 'Model not available or API key missing'}, 400)
+
+        stream = wants_stream(data, request.query)
+        aembed = netlify_app.embed_query_async if ai_cache.embed is not None else None
+        cached = await ai_cache.alookup(model, query, aembed)
+
+        if cached.answer is not None:
+            if stream:
+                return sse_response(ai_async.sse_stream(single(cached.answer), model, 'cache'))
+            return json_response({
+                'response': cached.answer,
+                'model': model,
+                'cached': cached.tier,
+                'similarity': round(cached.score, 4),
+                'timestamp': datetime.now().isoformat()
+            })
+
+        if stream:
+            routed, deltas, started = await open_stream(model, query)
+            deltas = RoutedDeltas(caching_deltas(deltas, model, query, cached.vector), routed, started)
+            return sse_response(ai_async.sse_stream(deltas, routed, netlify_app.model_provider(routed),
+                                                    started=started))
+
+        candidates = netlify_app.auto_models if model == 'auto' else [model]
+
+        async def complete():
+            result = await ai_router.acomplete(query, candidates=candidates)
+            await run_sync(ai_cache.store, model, query, result.answer, cached.vector)
+            return result
+
+        result = await upstream.arun(f"ai:{model}:{normalize_query(query)}", complete)
+
+        return json_response({
+            'response': result.answer,
+            'model': result.backend,
+            'latency_ms': result.latency_ms,
+            'hedged': result.hedged,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except RouterError as e:
+        return json_response({'error': str(e)}, 503)
+    except Exception as e:
+        logger.error(f"Error processing AI query: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+@app.route('/api/embeddings/generate', methods=('POST',))
+async def generate_embeddings(request):
+    """Generate embeddings for documents"""
+    try:
+        data = request.json() or {}
+        text = data.get('text', '')
+        texts = data.get('texts')
+        fmt = parse_format(data.get('format') or request.query.get('format'))
+        raw = data.get('encoding') == 'raw' or request.prefers(OCTET_STREAM)
+
+        if not text and not texts:
+            return json_response({'error': 'Text is required'}, 400)
+        if texts is not None and not isinstance(texts, list):
+            return json_response({'error': 'texts must be a list'}, 400)
+        metadata = netlify_app.parse_metadata(data.get('metadata'))
+
+        if not netlify_app.OPENAI_API_KEY:
+            return json_response({'error': 'OpenAI API key not configured'}, 400)
+
+        # Many documents: the batching pipeline is thread-based, so it runs on the pool
+        if texts:
+            store = bool(data.get('store'))
+            summary, records = await run_sync(netlify_app.ingest_texts, texts, store, data)
+
+            if raw and not store:
+                body, headers = netlify_app.raw_batch(summary, records, fmt)
+                if headers is None:
+                    return json_response({'summary': summary, 'error': body}, 502)
+                return Response(body, media_type=OCTET_STREAM, headers=headers)
+
+            return json_response(netlify_app.ingest_result(summary, records, store, fmt))
+
+        embedding = (await netlify_app.embed_texts_async([text]))[0]
+        result = {
+            'text': text[:100] + '...' if len(text) > 100 else text,
+            'embedding_dimension': len(embedding),
+            'embedding': encode_vector(embedding, fmt) if fmt else embedding,
+            'timestamp': datetime.now().isoformat()
+        }
+
+        if data.get('store'):
+            doc_id = str(data.get('id') or content_hash(text, netlify_app.EMBEDDING_MODEL))
+            await run_sync(netlify_app.index_document, doc_id, text, embedding, metadata)
+            result['id'] = doc_id
+
+        return json_response(result)
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        logger.error(f"Error generating embeddings: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+@app.route('/api/embeddings/search', methods=('POST',))
+async def search_embeddings(request):
+    """Top-k documents from the local vector index"""
+    try:
+        data = request.json() or {}
+        query = data.get('query', '')
+        embedding = data.get('embedding')
+        k = int(data.get('k', 5))
+
+        if not query and embedding is None:
+            return json_response({'error': 'Query or embedding is required'}, 400)
+
+        if embedding is None:
+            if not netlify_app.OPENAI_API_KEY:
+                return json_response({'error': 'OpenAI API key not configured'}, 400)
+            embedding = (await netlify_app.embed_texts_async([query]))[0]
+
+        found = await run_sync(netlify_app.search_index, embedding, k, data.get('exact'))
+        if found is None:
+            return json_response({'error': 'Vector index is empty'}, 404)
+        matches, index_size, elapsed_ms = found
+
+        return json_response({
+            'matches': matches,
+            'index_size': index_size,
+            'search_ms': round(elapsed_ms, 3),
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        logger.error(f"Error searching embeddings: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+# Demo app (web_app routes, simulated engine)
+demo_app = ASGIApp('findeus-demo')
+_dashboard = None
+
+
+@demo_app.route('/')
+async def index(request):
+    """Main dashboard page"""
+    global _dashboard
+    if _dashboard is None:
+        with open(TEMPLATE_PATH, 'rb') as f:
+            _dashboard = f.read()
+    return Response(_dashboard, media_type='text/html; charset=utf-8')
+
+
+@demo_app.route('/api/health')
+async def demo_health_check(request):
+    """Health check endpoint"""
+    return json_response(dict(web_app.health_status(), server='asgi'))
+
+
+@demo_app.route('/api/ai/query', methods=('POST',))
+async def demo_ai_query(request):
+    """AI query endpoint"""
+    try:
+        data = request.json() or {}
+        query = data.get('query', '')
+
+        if not query:
+            return json_response({'error': 'Query is required'}, 400)
+
+        response = web_app.simulated_answer(query)
+
+        if wants_stream(data, request.query):
+            deltas = ai_async.fake_deltas(response, interval=0.02, chunk_words=3)
+            return sse_response(ai_async.sse_stream(deltas, 'findeus-sim', 'simulated'))
+
+        # Simulate AI processing without holding a thread
+        await asyncio.sleep(0.5)
+
+        return json_response({
+            'response': response,
+            'timestamp': datetime.now().isoformat(),
+            'confidence': 0.85,
+            'sources': ['Market Data', 'Technical Analysis', 'Risk Models']
+        })
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@demo_app.route('/api/market/data/<symbol>')
+async def demo_market_data(request):
+    """Market data endpoint"""
+    return json_response(web_app.simulate_market_data(request.path_params['symbol']))
+
+
+@demo_app.route('/api/market/batch', methods=('GET', 'POST'))
+async def demo_market_batch(request):
+    """Batch market data endpoint"""
+    try:
+        if request.method == 'POST':
+            raw_symbols = (request.json() or {}).get('symbols')
+        else:
+            raw_symbols = request.query.get('symbols')
+
+        symbols = parse_symbols(raw_symbols)
+        quotes = {symbol: web_app.simulate_quote(symbol) for symbol in symbols}
+
+        payload = to_columnar(symbols, quotes)
+        payload['timestamp'] = datetime.now().isoformat()
+        return json_response(payload)
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+
+# The demo app never downloads history
+core_routes(
+    demo_app,
+    handlers=(api_core.portfolio_analyze, api_core.risk_analysis, api_core.forecast),
+    forced={'refresh': False}
+)
+upload_routes(demo_app, forced={'refresh': False})
+metrics_routes(demo_app)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    target = 'asgi_app:demo_app' if '--demo' in sys.argv else 'asgi_app:app'
+    uvicorn.run(target, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+FinDeus Cold Start Benchmark
+============================
+
+Measures how long a fresh interpreter takes to import an app module and
+fails (exit code 1) when the median goes over budget, or when a heavy
+dependency that should be lazily imported is loaded at import time.
+
+Usage:
+    python bench_cold_start.py [--module netlify_app] [--runs 5] [--budget-ms 1500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', 1500))
+
+# Modules that must not be imported just by loading the app
+HEAVY_MODULES = [
+    'pandas',
+    'numpy',
+    'yfinance',
+    'sklearn',
+    'openai',
+    'anthropic',
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'elapsed_ms': elapsed, 'heavy_loaded': heavy}}))
+"""
+
+
+def measure_once(module):
+    """Import ``module`` in a fresh interpreter and report timing"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=here,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start import benchmark')
+    parser.add_argument('--module', default='netlify_app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+
+    print(f"⏱️  Cold start benchmark: import {args.module} ({args.runs} runs)")
+
+    timings = []
+    heavy_loaded = set()
+    for run in range(args.runs):
+        sample = measure_once(args.module)
+        timings.append(sample['elapsed_ms'])
+        heavy_loaded.update(sample['heavy_loaded'])
+        print(f"   Run {run + 1}: {sample['elapsed_ms']:.1f} ms")
+
+    median = statistics.median(timings)
+    print(f"   📊 Median: {median:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"   ❌ Cold start import is over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    if heavy_loaded:
+        print(f"   ❌ Heavy modules imported eagerly: {', '.join(sorted(heavy_loaded))}")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("   ✅ Cold start within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+FinDeus LLM Router Benchmark
+============================
+
+Replays queries against local fake providers with injected latency and
+failures, and compares routing strategies:
+
+    static   always the model the request names (the old prefix routing)
+    router   best healthy backend by live EWMA latency and error rate
+    hedged   router plus a hedged second request past the primary's p95
+
+Usage:
+    python bench_llm_router.py [--queries 400] [--concurrency 16] [--scale 0.05]
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_router import Backend, LLMRouter, RouterError
+
+# name: (quality, median latency s, lognormal sigma, slow-tail probability, error rate)
+PROFILES = {
+    'openai:gpt-4': (0.92, 1.2, 0.35, 0.08, 0.02),
+    'anthropic:claude-3-sonnet': (0.89, 0.8, 0.30, 0.05, 0.01),
+    'fake:flaky': (0.95, 0.5, 0.25, 0.02, 0.60),
+}
+SLOW_TAIL_FACTOR = 6.0
+
+
+class FakeProvider:
+    """Sleeps for a sampled latency, then answers or raises"""
+
+    def __init__(self, name, median, sigma, tail, error_rate, scale, seed):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.tail = tail
+        self.error_rate = error_rate
+        self.scale = scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        with self._lock:
+            latency = self.median * self._rng.lognormvariate(0, self.sigma)
+            if self._rng.random() < self.tail:
+                latency *= SLOW_TAIL_FACTOR
+            failed = self._rng.random() < self.error_rate
+        time.sleep(latency * self.scale)
+        if failed:
+            raise ConnectionError(f"{self.name} injected failure")
+        return f"{self.name} answer for: {query}"
+
+
+def build_backends(scale, seed):
+    return [
+        Backend(name, FakeProvider(name, median, sigma, tail, errors, scale, seed + i), quality=quality)
+        for i, (name, (quality, median, sigma, tail, errors)) in enumerate(PROFILES.items())
+    ]
+
+
+def run(strategy, queries, concurrency, scale, seed):
+    """Latencies (s) and failure count for one strategy"""
+    # Router timings are wall-clock, so rescale the latency knobs to match
+    router = LLMRouter(
+        build_backends(scale, seed),
+        prior_latency=1.0 * scale,
+        latency_weight=0.1 / scale,
+        hedge=strategy == 'hedged',
+        cooldown=60 * scale,
+        max_workers=concurrency * 2,
+    )
+    names = list(router.backends)
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            if strategy == 'static':
+                # The requested model only; no failover, no health checks
+                router.backends[names[i % 2]].call(f"query {i}")
+            else:
+                router.complete(f"query {i}")
+        except (RouterError, ConnectionError):
+            return None
+        # Report latency in unscaled (provider) seconds
+        return (time.perf_counter() - started) / scale
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(queries)))
+    latencies = sorted(r for r in results if r is not None)
+    return latencies, len(results) - len(latencies), router
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LLM routing strategies on fake providers')
+    parser.add_argument('--queries', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scale', type=float, default=0.05,
+                        help='wall-clock seconds per simulated provider second')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"🧭 LLM router benchmark: {args.queries} queries, concurrency {args.concurrency}")
+    print(f"   {'strategy':<8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'mean s':>7} {'errors':>7}")
+    for strategy in ('static', 'router', 'hedged'):
+        latencies, errors, router = run(strategy, args.queries, args.concurrency, args.scale, args.seed)
+        mean = statistics.fmean(latencies) if latencies else float('nan')
+        print(f"   {strategy:<8} {percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.95):>7.2f} "
+              f"{percentile(latencies, 0.99):>7.2f} {mean:>7.2f} {errors:>7}")
+        if strategy != 'static':
+            for name, stats in router.stats().items():
+                print(f"      {name:<28} {stats['state']:<9} requests={stats['requests']:<4} "
+                      f"ewma={stats['latency_ms'] / 1000 / args.scale:.2f}s hedges={stats['hedges']}")
+
+
+if __name__ == '__main__':
+    main()
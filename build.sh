@@ -41,6 +41,7 @@ fi
 echo "🔍 Verifying critical imports..."
 $PYTHON_CMD -c "import flask; print('✅ Flask imported successfully')"
 $PYTHON_CMD -c "import requests; print('✅ Requests imported successfully')"
+$PYTHON_CMD -c "import numpy, pandas, sklearn, yfinance; print('✅ Data stack imported successfully')"
 $PYTHON_CMD -c "import openai; print('✅ OpenAI imported successfully')"
 $PYTHON_CMD -c "import anthropic; print('✅ Anthropic imported successfully')"
 $PYTHON_CMD -c "import yfinance; print('✅ YFinance imported successfully')"
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Request Coalescing
+============================
+
+Collapses identical concurrent upstream calls into one.
+
+The first caller for a key becomes the leader: it runs the call and
+publishes the outcome on a ``Future``. Callers that arrive with the same
+key while it is in flight attach to that future and receive the same
+result (or exception), so a burst of identical requests costs one provider
+call. Nothing is kept once the call finishes; pair with a cache for reuse
+over time.
+
+``arun`` does the same for coroutines on an event loop: the first caller's
+coroutine runs as a task and later callers await it.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+from lazy_imports import lazy_import
+
+# asyncio is only needed by async callers; keep it off the cold-start path
+asyncio = lazy_import('asyncio')
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """Single in-flight future per key"""
+
+    def __init__(self, name='coalescer'):
+        self.name = name
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def run(self, key, fn, timeout=None):
+        """Return ``fn()``, sharing one execution among concurrent callers of ``key``"""
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._flights[key] = future
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                self.errors += 1
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+        return future.result(timeout=timeout)
+
+    async def arun(self, key, fn):
+        """Await ``fn()``, sharing one task among concurrent callers of ``key``.
+
+        The shared task is shielded, so a caller that is cancelled (e.g. a
+        disconnected client) does not cancel it for the others.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                task.add_done_callback(lambda done: self._finish(key, done))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if task.cancelled() or task.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        """Counters for health and metrics endpoints"""
+        requests = self.calls + self.coalesced
+        return {
+            'in_flight': len(self._flights) + len(self._tasks),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'coalesced_ratio': round(self.coalesced / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Covariance Service
+============================
+
+Sample, EWMA and Ledoit-Wolf covariance matrices over large universes,
+built from returns in the local history store.
+
+* Matrices are float32 and built column block by column block
+  (``COVARIANCE_BLOCK`` symbols at a time), so temporaries stay at
+  ``block x universe`` however many symbols are requested.
+* Results are cached per (interval, universe, window, method).
+* When the store gains a day of returns, the cached matrix is moved
+  forward with rank-one updates instead of a rebuild:
+
+  - sample: add the new day and drop the oldest (Welford-style
+    update/downdate of the scatter matrix);
+  - EWMA: the RiskMetrics recursion ``decay * S + (1 - decay) * r r'``,
+    renormalized over the window and minus the row that leaves it;
+  - Ledoit-Wolf: the sample update, then the shrinkage intensity is
+    re-estimated from the window in O(periods x symbols).
+
+Updated states are new objects (copy-on-write), so readers holding the
+previous matrix never see a half-applied update. After
+``MAX_INCREMENTAL_UPDATES`` updates the matrix is rebuilt to shed float32
+drift.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from ttl_cache import TTLCache
+
+METHODS = ('sample', 'ewma', 'ledoit_wolf')
+DEFAULT_WINDOW = 252
+DEFAULT_DECAY = 0.94
+BLOCK = int(os.environ.get('COVARIANCE_BLOCK', 512))
+MAX_SYMBOLS = int(os.environ.get('COVARIANCE_MAX_SYMBOLS', 5000))
+CHECK_INTERVAL = 60  # seconds between looks for new returns in the store
+MAX_NEW_DAYS = 5  # more new days than this and a rebuild is cheaper
+MAX_INCREMENTAL_UPDATES = 63
+
+# Periods per year for annualizing, by history interval (6.5-hour sessions)
+PERIODS_PER_YEAR = {
+    '1d': 252,
+    '1wk': 52,
+    '1h': 252 * 7,
+    '30m': 252 * 13,
+    '15m': 252 * 26,
+    '5m': 252 * 78,
+    '1m': 252 * 390,
+}
+
+
+def gram(x, row_weights=None, block=BLOCK):
+    """``x.T @ diag(row_weights) @ x`` in float32, one column block at a time"""
+    x = np.asarray(x, dtype=np.float32)
+    n = x.shape[1]
+    out = np.empty((n, n), dtype=np.float32)
+    for i in range(0, n, block):
+        left = x[:, i:i + block]
+        if row_weights is not None:
+            left = left * row_weights[:, None]
+        # Upper block row, mirrored into the lower block column
+        out[i:i + block, i:] = left.T @ x[:, i:]
+        out[i + block:, i:i + block] = out[i:i + block, i + block:].T
+    return out
+
+
+def rank_update(matrix, scale=1.0, terms=(), block=BLOCK):
+    """New ``scale * matrix + sum(alpha * v v')`` built block by block"""
+    out = np.empty_like(matrix)
+    if terms:
+        # All rank-one terms go in as one (block x k) @ (k x n) product
+        vectors = np.array([v for _, v in terms], dtype=np.float32)
+        scaled = vectors * np.array([alpha for alpha, _ in terms], dtype=np.float32)[:, None]
+        buffer = np.empty((min(block, matrix.shape[0]), matrix.shape[1]), dtype=np.float32)
+    for i in range(0, matrix.shape[0], block):
+        rows = out[i:i + block]
+        np.multiply(matrix[i:i + block], np.float32(scale), out=rows)
+        if terms:
+            update = buffer[:rows.shape[0]]
+            np.matmul(scaled[:, i:i + block].T, vectors, out=update)
+            rows += update
+    return out
+
+
+def frobenius_sq(matrix, block=BLOCK):
+    """Squared Frobenius norm; float32 row sums accumulated in float64"""
+    return float(sum(np.einsum('ij,ij->i', matrix[i:i + block], matrix[i:i + block]).sum(dtype=np.float64)
+                     for i in range(0, matrix.shape[0], block)))
+
+
+def ledoit_wolf_shrinkage(centered, scatter):
+    """Ledoit-Wolf (2004) intensity toward ``mu * I`` and ``mu``.
+
+    ``scatter`` is ``centered.T @ centered``; the 1/T sample matrix is never
+    materialized.
+    """
+    periods, n = centered.shape
+    mu = float(np.trace(scatter, dtype=np.float64)) / (n * periods)
+    norm_sq = frobenius_sq(scatter) / (periods * periods)
+    delta = (norm_sq - n * mu * mu) / n  # ||sample - mu I||^2 / n
+    row_sq = np.square(centered, dtype=np.float64).sum(axis=1)
+    beta = (float(row_sq @ row_sq) / periods - norm_sq) / (n * periods)
+    if delta <= 0:
+        return 0.0, mu
+    return float(min(max(beta, 0.0), delta) / delta), mu
+
+
+def shrink(sample, shrinkage, mu, scale=1.0, block=BLOCK):
+    """``(1 - shrinkage) * scale * sample + shrinkage * mu * I`` as a new matrix"""
+    out = rank_update(sample, (1.0 - shrinkage) * scale, block=block)
+    out[np.diag_indices_from(out)] += np.float32(shrinkage * mu)
+    return out
+
+
+def universe_key(interval, symbols, window, method, decay=DEFAULT_DECAY):
+    digest = hashlib.blake2b(','.join(symbols).encode(), digest_size=16).hexdigest()
+    label = f'ewma:{decay}' if method == 'ewma' else method
+    return f'{interval}:{window}:{label}:{digest}'
+
+
+class CovarianceState:
+    """A covariance matrix plus what it takes to move it forward a day"""
+
+    def __init__(self, symbols, interval, window, method, timestamps, returns,
+                 decay=DEFAULT_DECAY, updates=0, revisions=None):
+        self.symbols = np.asarray(symbols, dtype=str)
+        self.interval = interval
+        self.window = window
+        self.method = method
+        self.decay = decay
+        self.timestamps = timestamps
+        self.returns = np.asarray(returns, dtype=np.float32)
+        self.updates = updates
+        # Store revision of each symbol's bars the returns were read at
+        self.revisions = revisions
+        self.built_at = time.time()
+        self.checked_at = time.monotonic()
+        # Serializes moving this state forward; it is evicted along with the state
+        self.lock = threading.Lock()
+        self.mean = None
+        self.scatter = None
+        self.shrinkage = None
+        self.cov = None
+
+    @classmethod
+    def build(cls, symbols, interval, window, method, timestamps, returns,
+              decay=DEFAULT_DECAY, block=BLOCK):
+        state = cls(symbols, interval, window, method, timestamps, returns, decay)
+        periods = state.returns.shape[0]
+        if periods < 2:
+            raise ValueError('At least two periods of returns are required')
+
+        if method == 'ewma':
+            # Normalized RiskMetrics weights, newest observation heaviest, zero mean
+            weights = (1 - decay) * decay ** np.arange(periods - 1, -1, -1, dtype=np.float64)
+            weights /= weights.sum()
+            state.cov = gram(state.returns, weights.astype(np.float32), block)
+            return state
+
+        state.mean = state.returns.mean(axis=0, dtype=np.float64)
+        centered = state.returns - state.mean.astype(np.float32)
+        state.scatter = gram(centered, block=block)
+        state._finish(centered, block)
+        return state
+
+    def _finish(self, centered, block=BLOCK):
+        periods = self.returns.shape[0]
+        if self.method == 'ledoit_wolf':
+            self.shrinkage, mu = ledoit_wolf_shrinkage(centered, self.scatter)
+            self.cov = shrink(self.scatter, self.shrinkage, mu, 1.0 / periods, block)
+        else:
+            self.cov = rank_update(self.scatter, 1.0 / (periods - 1), block=block)
+
+    def advance(self, timestamps, returns, block=BLOCK):
+        """New state with ``returns`` (one row per new period) folded in"""
+        state = CovarianceState(self.symbols, self.interval, self.window, self.method,
+                                self.timestamps, self.returns, self.decay, self.updates,
+                                self.revisions)
+        state.mean, state.scatter, state.cov = self.mean, self.scatter, self.cov
+
+        for timestamp, row in zip(timestamps, np.asarray(returns, dtype=np.float32)):
+            window = np.vstack([state.returns, row[None, :]])
+            row = row.astype(np.float64)
+            stamps = np.append(state.timestamps, timestamp)
+            dropped = window.shape[0] > self.window
+            count = state.returns.shape[0]
+
+            if self.method == 'ewma':
+                # Same normalized, windowed weights as a rebuild: the oldest row's
+                # weight decays to decay ** count and is then removed
+                decay = self.decay
+                scale = (1 - decay) / (1 - decay ** (count if dropped else count + 1))
+                terms = [(scale, row)]
+                if dropped:
+                    terms.append((-scale * decay ** count, window[0].astype(np.float64)))
+                previous = (1 - decay) / (1 - decay ** count)
+                state.cov = rank_update(state.cov, scale * decay / previous, terms, block)
+            else:
+                # Welford update with the new row, downdate with the oldest one
+                delta = row - state.mean
+                mean = state.mean + delta / (count + 1)
+                terms = [(count / (count + 1), delta)]
+                if dropped:
+                    oldest = window[0].astype(np.float64) - mean
+                    terms.append((-(count + 1) / count, oldest))
+                    mean = mean - oldest / count
+                state.scatter = rank_update(state.scatter, 1.0, terms, block)
+                state.mean = mean
+
+            state.returns = window[1:] if dropped else window
+            state.timestamps = stamps[1:] if dropped else stamps
+            state.updates += 1
+
+        if self.method != 'ewma':
+            state._finish(state.returns - state.mean.astype(np.float32), block)
+        return state
+
+    @property
+    def as_of(self):
+        return int(self.timestamps[-1])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.cov, self.scatter, self.returns, self.timestamps) if a is not None)
+
+    def volatility(self, annualized=False):
+        vol = np.sqrt(np.maximum(np.diag(self.cov).astype(np.float64), 0.0))
+        return vol * np.sqrt(PERIODS_PER_YEAR.get(self.interval, 252)) if annualized else vol
+
+    def correlation(self, block=BLOCK):
+        """Correlation matrix, float32, built block by block"""
+        vol = self.volatility()
+        inverse = np.where(vol > 0, 1.0 / np.where(vol > 0, vol, 1.0), 0.0).astype(np.float32)
+        out = np.empty_like(self.cov)
+        for i in range(0, self.cov.shape[0], block):
+            out[i:i + block] = self.cov[i:i + block] * inverse[i:i + block, None] * inverse[None, :]
+        return out
+
+    def average_correlation(self, correlation=None):
+        """Mean off-diagonal correlation, or None for a single symbol"""
+        n = self.cov.shape[0]
+        if n < 2:
+            return None
+        if correlation is None:
+            correlation = self.correlation()
+        total = sum(float(correlation[i:i + BLOCK].sum(dtype=np.float64)) for i in range(0, n, BLOCK))
+        return (total - float(np.trace(correlation, dtype=np.float64))) / (n * (n - 1))
+
+
+class CovarianceService:
+    """Cached covariance states over a HistoryStore"""
+
+    def __init__(self, store, max_bytes=None, block=BLOCK):
+        self.store = store
+        self.block = block
+        self.cache = TTLCache(
+            max_entries=int(os.environ.get('COVARIANCE_CACHE_ENTRIES', 16)),
+            max_bytes=max_bytes or int(os.environ.get('COVARIANCE_CACHE_BYTES', 1024 * 1024 * 1024)),
+            default_ttl=24 * 3600,
+            sizeof=lambda state: state.nbytes,
+            name='covariance-cache'
+        )
+        self.rebuilds = 0
+        self.incremental = 0
+
+    def get(self, symbols, window=DEFAULT_WINDOW, method='sample', interval='1d', decay=DEFAULT_DECAY):
+        """Covariance state for a universe, built, cached or advanced as needed"""
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}")
+        if not 0 < decay < 1:
+            raise ValueError('decay must be between 0 and 1')
+        if window < 2:
+            raise ValueError('window must be at least 2')
+        symbols = sorted({str(s).upper() for s in symbols})
+        if len(symbols) > MAX_SYMBOLS:
+            raise ValueError(f'At most {MAX_SYMBOLS} symbols per covariance matrix')
+        key = universe_key(interval, symbols, window, method, decay)
+
+        def build():
+            revisions = self._revisions(symbols, interval)
+            timestamps, returns = self.store.returns_matrix(symbols, interval, lookback=window)
+            self.rebuilds += 1
+            state = CovarianceState.build(symbols, interval, window, method, timestamps, returns,
+                                          decay, self.block)
+            state.revisions = revisions
+            return state
+
+        state = self.cache.get(key)
+        if state is None:
+            return self.cache.get_or_load(key, build)
+        if time.monotonic() - state.checked_at < CHECK_INTERVAL:
+            return state
+
+        with state.lock:
+            current = self.cache.get(key)
+            if current is not None and current is not state:
+                return current
+            advanced = self._advance(state)
+            if advanced is None:
+                advanced = build()
+            advanced.checked_at = time.monotonic()
+            self.cache.set(key, advanced)
+            return advanced
+
+    def _revisions(self, symbols, interval):
+        return tuple(self.store.revision(symbol, interval) for symbol in symbols)
+
+    def _advance(self, state):
+        """State moved forward to the store's latest returns, or None to rebuild"""
+        # Bars already folded in were rewritten (a closed partial bar, a re-adjustment)
+        if self._revisions(state.symbols.tolist(), state.interval) != state.revisions:
+            return None
+        try:
+            timestamps, returns = self.store.returns_matrix(
+                state.symbols.tolist(), state.interval, lookback=0, start=state.as_of
+            )
+        except ValueError:
+            # No period after ``as_of`` shared by every symbol yet
+            return state
+        fresh = timestamps > state.as_of
+        timestamps, returns = timestamps[fresh], returns[fresh]
+        if timestamps.size == 0:
+            return state
+        if timestamps.size > MAX_NEW_DAYS or state.updates + timestamps.size > MAX_INCREMENTAL_UPDATES:
+            return None
+        self.incremental += int(timestamps.size)
+        return state.advance(timestamps, returns, self.block)
+
+    def stats(self):
+        return dict(self.cache.stats(), rebuilds=self.rebuilds, incremental_updates=self.incremental)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Compact Embedding Encoding
+====================================
+
+Packs embeddings as little-endian binary arrays instead of JSON float
+lists (about 30 KB of text per 1536-dim vector).
+
+Formats:
+    f32   float32, 4 bytes per value, lossless for provider output
+    f16   float16, 2 bytes per value
+    int8  int8 with one float32 scale per vector (value = q * scale)
+
+JSON responses carry the array base64-encoded; clients decode with
+``numpy.frombuffer(base64.b64decode(data), dtype=dtype)``. Raw
+``application/octet-stream`` batch bodies are laid out as the int8 scales
+(``count`` float32 values, int8 only), the row-major matrix, and then,
+when ``X-Embedding-Rows`` is ``suffix-i4x2``, one int32 ``(document,
+chunk)`` pair per row mapping it back to its input.
+"""
+
+import base64
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+FORMATS = {
+    'f32': '<f4',
+    'f16': '<f2',
+    'int8': '<i1',
+}
+OCTET_STREAM = 'application/octet-stream'
+
+
+def parse_format(value):
+    """Validate a ``format`` option; None or 'json' means plain float lists"""
+    if value in (None, '', 'json'):
+        return None
+    if value not in FORMATS:
+        raise ValueError(f"format must be one of json, {', '.join(FORMATS)}")
+    return value
+
+
+def quantize(matrix, fmt):
+    """Cast an (n, dim) matrix to ``fmt``; returns (packed, scales or None)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if fmt == 'int8':
+        # Symmetric per-vector scaling keeps each row's largest value at +/-127
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        packed = np.rint(matrix / scales[:, None]).astype(FORMATS['int8'])
+        return packed, scales.astype('<f4')
+    return np.ascontiguousarray(matrix, dtype=FORMATS[fmt]), None
+
+
+def _b64(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')
+
+
+def encode_vector(vector, fmt):
+    """JSON-ready encoding of a single embedding"""
+    packed, scales = quantize(np.asarray(vector, dtype=np.float32)[None, :], fmt)
+    encoded = {
+        'format': fmt,
+        'dtype': FORMATS[fmt],
+        'dim': packed.shape[1],
+        'data': _b64(packed[0]),
+    }
+    if scales is not None:
+        encoded['scale'] = float(scales[0])
+    return encoded
+
+
+def encode_matrix(vectors, fmt):
+    """JSON-ready encoding of many embeddings as one row-major blob"""
+    packed, scales = quantize(vectors, fmt)
+    encoded = {
+        'format': fmt,
+        'dtype': FORMATS[fmt],
+        'count': packed.shape[0],
+        'dim': packed.shape[1] if packed.ndim == 2 else 0,
+        'data': _b64(packed),
+    }
+    if scales is not None:
+        encoded['scales'] = _b64(scales)
+        encoded['scales_dtype'] = '<f4'
+    return encoded
+
+
+def raw_matrix(vectors, fmt, rows=None):
+    """Raw octet-stream body plus headers describing its layout.
+
+    ``rows`` optionally gives each vector's ``(document, chunk)`` position,
+    appended after the matrix.
+    """
+    packed, scales = quantize(vectors, fmt)
+    body = packed.tobytes()
+    if scales is not None:
+        body = scales.tobytes() + body
+    if rows is not None:
+        body += np.asarray(rows, dtype='<i4').reshape(packed.shape[0], 2).tobytes()
+    headers = {
+        'X-Embedding-Format': fmt,
+        'X-Embedding-Dtype': FORMATS[fmt],
+        'X-Embedding-Count': str(packed.shape[0]),
+        'X-Embedding-Dim': str(packed.shape[1] if packed.ndim == 2 else 0),
+        'X-Embedding-Scales': 'prefix-f4' if scales is not None else 'none',
+        'X-Embedding-Rows': 'suffix-i4x2' if rows is not None else 'none',
+    }
+    return body, headers
+
+
+def decode(encoded):
+    """Inverse of encode_vector/encode_matrix, returning float32 arrays"""
+    values = np.frombuffer(base64.b64decode(encoded['data']), dtype=encoded['dtype'])
+    if 'count' in encoded:
+        values = values.reshape(encoded['count'], encoded['dim'])
+    values = values.astype(np.float32)
+    if 'scale' in encoded:
+        values *= encoded['scale']
+    elif 'scales' in encoded:
+        scales = np.frombuffer(base64.b64decode(encoded['scales']), dtype=encoded['scales_dtype'])
+        values *= scales[:, None]
+    return values
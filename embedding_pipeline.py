@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Embedding Ingestion Pipeline
+======================================
+
+Turns documents into stored embeddings efficiently:
+
+1. Documents are split into overlapping word-window chunks.
+2. Chunks whose content hash is already embedded are skipped.
+3. The rest are packed into batches (many inputs per provider request),
+   capped by item count and approximate token budget.
+4. Up to ``max_concurrency`` batches are in flight at once, and each batch
+   retries with exponential backoff and jitter on 429 and 5xx responses.
+"""
+
+import hashlib
+import logging
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+OPENAI_EMBEDDINGS_URL = 'https://api.openai.com/v1/embeddings'
+DEFAULT_EMBEDDING_MODEL = 'text-embedding-ada-002'
+
+# OpenAI accepts up to 2048 inputs per embeddings request
+MAX_BATCH_ITEMS = 512
+# Rough token budget per request (about 4 characters per token)
+MAX_BATCH_TOKENS = 250_000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Transport failures worth retrying; other OSErrors (missing files, permissions) are not
+TRANSPORT_ERRORS = (ConnectionError, TimeoutError, socket.timeout)
+
+
+class EmbeddingError(Exception):
+    """Embedding request failed and should not (or can no longer) be retried"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def content_hash(text, model=DEFAULT_EMBEDDING_MODEL):
+    """Dedup key for a chunk: the same text under another model is different"""
+    return hashlib.sha1(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+
+def chunk_text(text, chunk_words=200, overlap_words=40):
+    """Split text into overlapping windows of whitespace-separated words"""
+    if overlap_words >= chunk_words:
+        raise ValueError('overlap_words must be smaller than chunk_words')
+    words = text.split()
+    if not words:
+        return []
+    if len(words) <= chunk_words:
+        return [' '.join(words)]
+
+    step = chunk_words - overlap_words
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(' '.join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def make_batches(items, max_items=MAX_BATCH_ITEMS, max_tokens=MAX_BATCH_TOKENS):
+    """Greedily pack ``(key, text)`` items into provider-sized batches"""
+    batch = []
+    tokens = 0
+    for item in items:
+        item_tokens = len(item[1]) // 4 + 1
+        if batch and (len(batch) >= max_items or tokens + item_tokens > max_tokens):
+            yield batch
+            batch = []
+            tokens = 0
+        batch.append(item)
+        tokens += item_tokens
+    if batch:
+        yield batch
+
+
+def openai_embed_batch(session, api_key, texts, model=DEFAULT_EMBEDDING_MODEL, timeout=60):
+    """One embeddings request for many inputs; returns vectors in input order"""
+    import requests
+
+    try:
+        response = session.post(
+            OPENAI_EMBEDDINGS_URL,
+            headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json'
+            },
+            json={'model': model, 'input': texts},
+            timeout=timeout
+        )
+    except requests.Timeout as e:
+        raise TimeoutError(str(e)) from e
+    except requests.ConnectionError as e:
+        raise ConnectionError(str(e)) from e
+    if response.status_code != 200:
+        retry_after = response.headers.get('Retry-After')
+        raise EmbeddingError(
+            f"Embeddings request failed with status {response.status_code}",
+            status=response.status_code,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+        )
+
+    data = sorted(response.json()['data'], key=lambda item: item['index'])
+    return [item['embedding'] for item in data]
+
+
+def with_retries(call, max_retries=5, base_delay=0.5, max_delay=30.0, sleep=time.sleep):
+    """Run ``call()``, retrying 429/5xx and connection errors with backoff.
+
+    A server-requested ``Retry-After`` is honoured up to ``max_delay``.
+    """
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except EmbeddingError as e:
+            if e.status not in RETRY_STATUSES or attempt >= max_retries:
+                raise
+            delay = None if e.retry_after is None else min(max_delay, e.retry_after)
+        except TRANSPORT_ERRORS as e:
+            if attempt >= max_retries:
+                raise EmbeddingError(str(e)) from e
+            delay = None
+
+        if delay is None:
+            # Full jitter keeps concurrent batches from retrying in lockstep
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+        attempt += 1
+        logger.info(f"Retrying embeddings batch in {delay:.2f}s (attempt {attempt})")
+        sleep(delay)
+
+
+class EmbeddingPipeline:
+    """Chunk, dedupe, batch and concurrently embed documents.
+
+    ``embed_batch(texts)`` performs one provider request and returns one
+    vector per text. ``is_embedded(key)`` reports whether a content hash is
+    already stored, and ``sink(records)`` receives each finished batch as a
+    list of ``{'id', 'text', 'embedding', 'metadata'}`` dicts.
+    """
+
+    def __init__(self, embed_batch, sink, is_embedded=None, model=DEFAULT_EMBEDDING_MODEL,
+                 max_concurrency=4, max_batch_items=MAX_BATCH_ITEMS,
+                 max_batch_tokens=MAX_BATCH_TOKENS, max_retries=5,
+                 chunk_words=200, overlap_words=40):
+        self.embed_batch = embed_batch
+        self.sink = sink
+        self.is_embedded = is_embedded or (lambda key: False)
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+
+    def plan(self, documents):
+        """Chunk documents and drop chunks that are already embedded.
+
+        ``documents`` is an iterable of strings or ``{'text', 'metadata'}``
+        dicts. Returns ``(pending, skipped)`` where pending maps content
+        hash to ``(text, metadata)``.
+        """
+        pending = {}
+        skipped = 0
+        for doc_index, document in enumerate(documents):
+            if isinstance(document, str):
+                text, metadata = document, {}
+            elif isinstance(document, dict):
+                text, metadata = document.get('text', ''), document.get('metadata') or {}
+                if not isinstance(metadata, dict):
+                    raise ValueError(f'Document {doc_index} metadata must be an object')
+            else:
+                raise ValueError(f'Document {doc_index} must be a string or an object')
+
+            for chunk_index, chunk in enumerate(
+                chunk_text(text, self.chunk_words, self.overlap_words)
+            ):
+                key = content_hash(chunk, self.model)
+                if key in pending or self.is_embedded(key):
+                    skipped += 1
+                    continue
+                pending[key] = (chunk, dict(metadata, document=doc_index, chunk=chunk_index))
+        return pending, skipped
+
+    def _run_batch(self, batch, pending):
+        texts = [text for _, text in batch]
+        vectors = with_retries(lambda: self.embed_batch(texts), max_retries=self.max_retries)
+        if len(vectors) != len(texts):
+            raise EmbeddingError('Provider returned a different number of embeddings')
+        records = [
+            {'id': key, 'text': text, 'embedding': vector, 'metadata': pending[key][1]}
+            for (key, text), vector in zip(batch, vectors)
+        ]
+        self.sink(records)
+        return len(records)
+
+    def ingest(self, documents):
+        """Embed every new chunk; returns a summary of the run"""
+        started = time.perf_counter()
+        pending, skipped = self.plan(documents)
+        batches = list(make_batches(
+            ((key, text) for key, (text, _) in pending.items()),
+            max_items=self.max_batch_items,
+            max_tokens=self.max_batch_tokens
+        ))
+
+        embedded = 0
+        failed = 0
+        errors = []
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                futures = {pool.submit(self._run_batch, batch, pending): batch for batch in batches}
+                for future in as_completed(futures):
+                    try:
+                        embedded += future.result()
+                    except Exception as e:
+                        failed += len(futures[future])
+                        errors.append(str(e))
+                        logger.error(f"Embeddings batch failed: {str(e)}")
+
+        return {
+            'chunks': len(pending) + skipped,
+            'embedded': embedded,
+            'skipped': skipped,
+            'failed': failed,
+            'batches': len(batches),
+            'errors': errors[:10],
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Forecasting Engine
+============================
+
+Per-symbol price forecasts from models trained on stored history.
+
+* Features are built vectorized from closes (lagged returns, realized
+  volatility, moving-average gaps, RSI, MACD) with the indicator engine.
+* One multi-output random forest per symbol predicts the cumulative log
+  return for every day of the horizon at once, so a forecast is a single
+  ``predict`` on the latest feature row.
+* Fitted models and scalers are persisted with joblib under
+  ``{root}/{interval}/{SYMBOL}.joblib`` together with the timestamp of the
+  last bar they saw. They are retrained only when the history store has
+  newer bars; otherwise requests are served from the warm in-memory model.
+* Serving builds the latest feature row over the same trailing window of
+  bars that training used. RSI and MACD are exponentially smoothed, so a
+  shorter window would give the model features it never saw.
+* Several stale symbols are trained in parallel in a process pool.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import indicators
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.environ.get('FORECAST_MODEL_PATH', os.path.join('data', 'models'))
+MODEL_VERSION = 1
+MAX_HORIZON = 30
+# Bars of history used for training; older bars add little for daily forecasts
+DEFAULT_LOOKBACK = 1500
+# Longest feature window; bars before it are warm-up only
+WARMUP = 50
+MIN_TRAIN_ROWS = 100
+
+FEATURES = (
+    'ret_1', 'ret_5', 'ret_10', 'ret_20',
+    'vol_5', 'vol_20',
+    'sma_gap_20', 'sma_gap_50',
+    'rsi_14', 'macd_hist',
+)
+
+
+def _lag_return(log_close, lag):
+    out = np.full_like(log_close, np.nan)
+    out[lag:] = log_close[lag:] - log_close[:-lag]
+    return out
+
+
+def build_features(close):
+    """(bars, features) matrix; rows inside the warm-up window contain NaN"""
+    close = np.asarray(close, dtype=np.float64)
+    log_close = np.log(close)
+    daily = _lag_return(log_close, 1)
+    _, _, macd_hist = indicators.macd(close)
+    columns = [
+        daily,
+        _lag_return(log_close, 5),
+        _lag_return(log_close, 10),
+        _lag_return(log_close, 20),
+        indicators.rolling_std(daily, 5),
+        indicators.rolling_std(daily, 20),
+        close / indicators.sma(close, 20) - 1.0,
+        close / indicators.sma(close, 50) - 1.0,
+        indicators.rsi(close, 14) / 100.0,
+        macd_hist / close,
+    ]
+    return np.column_stack(columns)
+
+
+def build_targets(close, horizon):
+    """(bars, horizon) cumulative forward log returns; NaN past the last bar"""
+    log_close = np.log(np.asarray(close, dtype=np.float64))
+    n = log_close.size
+    targets = np.full((n, horizon), np.nan)
+    for h in range(1, horizon + 1):
+        targets[:n - h, h - 1] = log_close[h:] - log_close[:-h]
+    return targets
+
+
+def fit_model(close, timestamps, horizon=MAX_HORIZON, n_estimators=100, n_jobs=1, seed=0):
+    """Train one symbol's scaler and forest; the unit of work sent to a worker.
+
+    A time-ordered holdout (last 20%) measures directional accuracy before
+    the final model is refit on every usable row.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    started = time.perf_counter()
+    X = build_features(close)
+    Y = build_targets(close, horizon)
+    usable = ~np.isnan(X).any(axis=1) & ~np.isnan(Y).any(axis=1)
+    X, Y = X[usable], Y[usable]
+    if X.shape[0] < MIN_TRAIN_ROWS:
+        raise ValueError(f'Need at least {MIN_TRAIN_ROWS + WARMUP + horizon} bars to train')
+
+    def forest():
+        return RandomForestRegressor(
+            n_estimators=n_estimators, max_depth=8, min_samples_leaf=5,
+            max_features=0.5, n_jobs=n_jobs, random_state=seed
+        )
+
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, shuffle=False)
+    scaler = StandardScaler().fit(X_train)
+    holdout = forest().fit(scaler.transform(X_train), Y_train)
+    predicted = holdout.predict(scaler.transform(X_test))
+    accuracy = float(np.mean(np.sign(predicted[:, -1]) == np.sign(Y_test[:, -1])))
+    rmse = float(np.sqrt(np.mean((predicted - Y_test) ** 2)))
+
+    scaler = StandardScaler().fit(X)
+    model = forest().fit(scaler.transform(X), Y)
+    timestamps = np.asarray(timestamps)
+    return {
+        'version': MODEL_VERSION,
+        'model': model,
+        'scaler': scaler,
+        'horizon': horizon,
+        'features': FEATURES,
+        'last_timestamp': int(timestamps[-1]),
+        'bar_seconds': int(np.median(np.diff(timestamps[-50:]))) if timestamps.size > 1 else 86400,
+        'train_rows': int(X.shape[0]),
+        'accuracy': accuracy,
+        'rmse': rmse,
+        'trained_at': time.time(),
+        'fit_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+READY = ('warm', 'trained')
+
+
+def _fit_worker(symbol, close, timestamps, horizon, n_estimators):
+    return symbol, fit_model(close, timestamps, horizon=horizon, n_estimators=n_estimators)
+
+
+def future_dates(last_timestamp, interval, bar_seconds, days):
+    """ISO dates (daily) or datetimes (intraday) of the next ``days`` bars"""
+    last = np.datetime64(int(last_timestamp), 's')
+    if interval == '1d':
+        dates = np.busday_offset(last.astype('datetime64[D]'), np.arange(1, days + 1), roll='forward')
+        return [str(d) for d in dates]
+    steps = last + np.arange(1, days + 1) * np.timedelta64(int(bar_seconds), 's')
+    return [str(s) for s in steps]
+
+
+class Forecaster:
+    """Warm per-symbol models backed by a HistoryStore and a model directory"""
+
+    def __init__(self, store, root=DEFAULT_ROOT, horizon=MAX_HORIZON,
+                 lookback=DEFAULT_LOOKBACK, n_estimators=100, max_workers=None):
+        self.store = store
+        self.root = root
+        self.horizon = horizon
+        self.lookback = lookback
+        self.n_estimators = n_estimators
+        self.max_workers = max_workers
+        self._models = {}
+        self._train_lock = threading.Lock()
+
+    @property
+    def window(self):
+        """Trailing bars features are built over, in training and serving alike"""
+        return self.lookback + WARMUP + self.horizon
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.root, interval, f"{symbol.upper()}.joblib")
+
+    def _load(self, symbol, interval):
+        import joblib
+
+        try:
+            bundle = joblib.load(self._path(symbol, interval))
+        except FileNotFoundError:
+            return None
+        if bundle.get('version') != MODEL_VERSION or bundle.get('horizon') != self.horizon:
+            return None
+        return bundle
+
+    def _save(self, symbol, interval, bundle):
+        import joblib
+
+        path = self._path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        joblib.dump(bundle, tmp)
+        os.replace(tmp, path)
+
+    def _current(self, symbol, interval, last, revision):
+        """Model trained on exactly the stored bars, from memory or disk"""
+        key = (symbol.upper(), interval)
+
+        def current(bundle):
+            return (bundle is not None and bundle['last_timestamp'] == last
+                    and bundle.get('revision', 0) == revision)
+
+        bundle = self._models.get(key)
+        if not current(bundle):
+            bundle = self._load(symbol, interval)
+            if not current(bundle):
+                return None
+            self._models[key] = bundle
+        return bundle
+
+    def ensure(self, symbols, interval='1d'):
+        """Make sure every symbol has a model for its latest stored bar.
+
+        Returns ``{symbol: 'warm' | 'trained' | 'missing' | 'insufficient'}``,
+        the last meaning too few bars to train on. Stale symbols are fitted
+        in parallel, one process per symbol; a single stale symbol is fitted
+        in-process with every core building trees.
+        """
+        status = {}
+        stale = []
+        for symbol in symbols:
+            last = self.store.last_timestamp(symbol, interval)
+            if last is None:
+                status[symbol] = 'missing'
+            elif self._current(symbol, interval, last, self.store.revision(symbol, interval)) is not None:
+                status[symbol] = 'warm'
+            else:
+                stale.append(symbol)
+        if not stale:
+            return status
+
+        with self._train_lock:
+            jobs = []
+            revisions = {}
+            for symbol in stale:
+                # Another request may have trained it while we waited
+                revisions[symbol] = self.store.revision(symbol, interval)
+                last = self.store.last_timestamp(symbol, interval)
+                if self._current(symbol, interval, last, revisions[symbol]) is not None:
+                    status[symbol] = 'warm'
+                    continue
+                bars = self.store.read(symbol, interval, columns=['close'])
+                if bars['close'].size < MIN_TRAIN_ROWS + WARMUP + self.horizon:
+                    status[symbol] = 'insufficient'
+                    continue
+                jobs.append((symbol, np.array(bars['close'][-self.window:]),
+                             np.array(bars['timestamp'][-self.window:])))
+
+            for symbol, bundle in self._fit(jobs):
+                bundle['revision'] = revisions[symbol]
+                self._save(symbol, interval, bundle)
+                self._models[(symbol.upper(), interval)] = bundle
+                status[symbol] = 'trained'
+                logger.info(f"Trained forecast model for {symbol} ({interval}) in {bundle['fit_ms']} ms")
+        return status
+
+    def _fit(self, jobs):
+        if not jobs:
+            return []
+        max_workers = min(self.max_workers or os.cpu_count() or 1, len(jobs))
+        if max_workers <= 1:
+            n_jobs = -1 if len(jobs) == 1 else 1
+            return [
+                (symbol, fit_model(close, ts, self.horizon, self.n_estimators, n_jobs=n_jobs))
+                for symbol, close, ts in jobs
+            ]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_fit_worker, symbol, close, ts, self.horizon, self.n_estimators)
+                for symbol, close, ts in jobs
+            ]
+            return [future.result() for future in futures]
+
+    def forecast_many(self, symbols, interval='1d', days=MAX_HORIZON):
+        """Forecasts for every symbol that has a model, plus the ones skipped"""
+        status = self.ensure(symbols, interval)
+        forecasts = []
+        for symbol in symbols:
+            if status[symbol] in READY:
+                result = self.forecast(symbol, interval, days)
+                result['model']['status'] = status[symbol]
+                forecasts.append(result)
+        return forecasts, {symbol: state for symbol, state in status.items() if state not in READY}
+
+    def forecast(self, symbol, interval='1d', days=MAX_HORIZON):
+        """Forecast path for the next ``days`` bars from the warm model.
+
+        Each day carries the median forest prediction, a 10-90% band from
+        the spread of individual trees, and ``confidence``: the share of
+        trees that agree with the median's direction.
+        """
+        if not 1 <= days <= self.horizon:
+            raise ValueError(f'days must be between 1 and {self.horizon}')
+        status = self.ensure([symbol], interval)[symbol]
+        if status == 'missing':
+            raise LookupError(f'No history for {symbol.upper()}')
+        if status == 'insufficient':
+            raise ValueError(f'Need at least {MIN_TRAIN_ROWS + WARMUP + self.horizon} bars '
+                             f'of history to forecast {symbol.upper()}')
+
+        bars = self.store.read(symbol, interval, columns=['close'])
+        close = np.asarray(bars['close'][-self.window:], dtype=np.float64)
+        bundle = self._models[(symbol.upper(), interval)]
+
+        x = bundle['scaler'].transform(build_features(close)[-1:])
+        per_tree = np.stack([tree.predict(x)[0] for tree in bundle['model'].estimators_])
+        per_tree = per_tree[:, :days]
+        median = np.median(per_tree, axis=0)
+        low, high = np.percentile(per_tree, [10, 90], axis=0)
+        agree = np.mean(np.sign(per_tree) == np.sign(median), axis=0)
+
+        last_close = float(close[-1])
+        dates = future_dates(bundle['last_timestamp'], interval, bundle['bar_seconds'], days)
+        path = [
+            {
+                'date': dates[i],
+                'price': round(last_close * float(np.exp(median[i])), 2),
+                'lower': round(last_close * float(np.exp(low[i])), 2),
+                'upper': round(last_close * float(np.exp(high[i])), 2),
+                'confidence': round(float(agree[i]), 2),
+            }
+            for i in range(days)
+        ]
+        return {
+            'symbol': symbol.upper(),
+            'interval': interval,
+            'last_close': round(last_close, 2),
+            'forecast': path,
+            'trend': 'bullish' if median[-1] > 0 else 'bearish',
+            'accuracy': round(bundle['accuracy'], 2),
+            'model': {
+                'status': status,
+                'trained_at': bundle['trained_at'],
+                'train_rows': bundle['train_rows'],
+                'rmse': round(bundle['rmse'], 5),
+                'fit_ms': bundle['fit_ms'],
+            },
+        }
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Local OHLCV History Store
+===================================
+
+On-disk columnar store for daily and intraday bars so analysis runs from
+local disk instead of re-downloading history.
+
+Layout, one directory per interval and symbol::
+
+    {root}/{interval}/{SYMBOL}/
+        meta.json          row count, generation and column dtypes (the commit point)
+        timestamp.i8       int64 UTC epoch seconds, strictly increasing
+        open.f8 high.f8 low.f8 close.f8 volume.f8
+
+Columns are raw little-endian arrays. Appends write the new rows to the
+end of each column file and then atomically replace ``meta.json``, so
+readers never see a partially written append. Reads memory-map the
+columns and return slices, which are views into the page cache rather
+than copies.
+
+Committed bytes are never modified. Changing stored bars writes a new
+generation of column files (``close.{gen}.f8``) committed by the same
+``meta.json`` swap: when a refresh brings a newer version of the newest
+bar (an intraday partial daily bar), or when the provider re-adjusted
+prices already stored (a split or dividend), in which case the symbol's
+full history is downloaded again. Files other processes may have mapped
+are never truncated, and the previous generation is kept until the next
+one.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from market_data import missing_symbols
+from metrics import upstream
+
+DEFAULT_ROOT = os.environ.get('HISTORY_STORE_PATH', os.path.join('data', 'history'))
+
+COLUMNS = {
+    'timestamp': '<i8',
+    'open': '<f8',
+    'high': '<f8',
+    'low': '<f8',
+    'close': '<f8',
+    'volume': '<f8',
+}
+SOURCE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# Relative close difference on an overlapping bar that means the history was re-adjusted
+ADJUSTMENT_TOLERANCE = 1e-5
+
+# How far back the first download for a symbol reaches; yfinance caps intraday history
+INITIAL_PERIOD = {
+    '1d': 'max',
+    '1wk': 'max',
+    '1h': '730d',
+    '30m': '60d',
+    '15m': '60d',
+    '5m': '60d',
+    '1m': '7d',
+}
+
+
+def _column_path(directory, column, generation=0):
+    suffix = f"{generation}.{COLUMNS[column][1:]}" if generation else COLUMNS[column][1:]
+    return os.path.join(directory, f"{column}.{suffix}")
+
+
+def _sorted_bars(bars):
+    """Columns cast to their dtypes, sorted by timestamp, keeping the latest of duplicates"""
+    new = {name: np.asarray(bars[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    order = np.argsort(new['timestamp'], kind='stable')
+    new = {name: values[order] for name, values in new.items()}
+    ts = new['timestamp']
+    keep = np.ones(ts.size, dtype=bool)
+    keep[:-1] = ts[:-1] != ts[1:]
+    return {name: values[keep] for name, values in new.items()}
+
+
+def _write(path, data, offset=None):
+    """Append bytes durably, after truncating to ``offset`` (bytes of a crashed append)"""
+    with open(path, 'ab') as f:
+        if offset is not None:
+            f.truncate(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _to_epoch_seconds(index):
+    """UTC epoch seconds for a pandas DatetimeIndex (naive means UTC)"""
+    import pandas as pd
+
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return np.asarray((index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1), dtype='<i8')
+
+
+class HistoryStore:
+    """Per-symbol columnar OHLCV files with incremental append"""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._maps = {}
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, interval, symbol.upper())
+
+    def _lock(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _meta(self, symbol, interval):
+        try:
+            with open(os.path.join(self._dir(symbol, interval), 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def symbols(self, interval='1d'):
+        """Symbols with stored bars for ``interval``"""
+        directory = os.path.join(self.root, interval)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            name for name in os.listdir(directory)
+            if os.path.exists(os.path.join(directory, name, 'meta.json'))
+        )
+
+    def rows(self, symbol, interval='1d'):
+        meta = self._meta(symbol, interval)
+        return meta['rows'] if meta else 0
+
+    def revision(self, symbol, interval='1d'):
+        """Counter bumped whenever stored bars change rather than being appended to.
+
+        Caches that advance incrementally on new rows rebuild when it moves.
+        """
+        meta = self._meta(symbol, interval)
+        return meta.get('revision', 0) if meta else 0
+
+    def last_timestamp(self, symbol, interval='1d'):
+        """Epoch seconds of the newest stored bar, or None"""
+        columns = self._columns(symbol, interval)
+        if columns is None or columns['timestamp'].size == 0:
+            return None
+        return int(columns['timestamp'][-1])
+
+    def _new_meta(self, symbol, interval):
+        return {
+            'symbol': symbol.upper(),
+            'interval': interval,
+            'rows': 0,
+            'generation': 0,
+            'revision': 0,
+            'columns': COLUMNS,
+        }
+
+    def _commit(self, symbol, interval, meta):
+        """Atomically replace ``meta.json``, publishing the rows written before it"""
+        directory = self._dir(symbol, interval)
+        meta['updated'] = time.time()
+        tmp = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, 'meta.json'))
+        self._maps.pop((symbol.upper(), interval), None)
+
+    def append(self, symbol, interval, bars):
+        """Append bars newer than the last stored one and update the last one.
+
+        ``bars`` maps column name to an array. Rows before the last stored
+        timestamp are dropped so refreshes are idempotent; a row at that
+        timestamp replaces the stored bar if it differs (a partial bar
+        that has since closed), which rewrites the columns as a new
+        generation. Returns the number of rows written.
+        """
+        with self._lock(symbol, interval):
+            directory = self._dir(symbol, interval)
+            os.makedirs(directory, exist_ok=True)
+            meta = self._meta(symbol, interval) or self._new_meta(symbol, interval)
+            generation = meta.get('generation', 0)
+            rows = meta['rows']
+
+            new = _sorted_bars(bars)
+            stored = self._columns(symbol, interval)
+            if stored is not None and rows:
+                last = stored['timestamp'][-1]
+                new = {name: values[new['timestamp'] >= last] for name, values in new.items()}
+                if new['timestamp'].size and new['timestamp'][0] == last:
+                    changed = any(
+                        not np.array_equal(stored[name][-1:], new[name][:1], equal_nan=True)
+                        for name in SOURCE_COLUMNS
+                    )
+                    if changed:
+                        merged = {name: np.concatenate([stored[name][:-1], new[name]]) for name in COLUMNS}
+                        self._publish(symbol, interval, meta, merged)
+                        return int(new['timestamp'].size)
+                    new = {name: values[1:] for name, values in new.items()}
+
+            count = new['timestamp'].size
+            if count == 0:
+                return 0
+
+            for name, dtype in COLUMNS.items():
+                # Discard bytes from an append that crashed before its commit
+                _write(_column_path(directory, name, generation), new[name].tobytes(),
+                       offset=rows * np.dtype(dtype).itemsize)
+
+            meta['rows'] = rows + count
+            self._commit(symbol, interval, meta)
+            return count
+
+    def replace(self, symbol, interval, bars):
+        """Replace every stored bar of a symbol with ``bars``.
+
+        The columns go to a new generation of files committed by the
+        ``meta.json`` swap. Returns the number of rows written.
+        """
+        with self._lock(symbol, interval):
+            os.makedirs(self._dir(symbol, interval), exist_ok=True)
+            meta = self._meta(symbol, interval) or self._new_meta(symbol, interval)
+            return self._publish(symbol, interval, meta, _sorted_bars(bars))
+
+    def _publish(self, symbol, interval, meta, columns):
+        """Write ``columns`` as a new generation and commit it; the caller holds the lock"""
+        directory = self._dir(symbol, interval)
+        previous = meta.get('generation', 0)
+        generation = previous + 1
+        for name in COLUMNS:
+            _write(_column_path(directory, name, generation), columns[name].tobytes(), offset=0)
+        meta['rows'] = int(columns['timestamp'].size)
+        meta['generation'] = generation
+        meta['revision'] = meta.get('revision', 0) + 1
+        self._commit(symbol, interval, meta)
+
+        # Keep the previous generation for readers that loaded its meta.json;
+        # mapped files survive unlinking
+        if previous:
+            for name in COLUMNS:
+                try:
+                    os.remove(_column_path(directory, name, previous - 1))
+                except FileNotFoundError:
+                    pass
+        return meta['rows']
+
+    def _columns(self, symbol, interval):
+        """Memory-mapped columns for the committed rows, cached per generation and row count"""
+        meta = self._meta(symbol, interval)
+        if meta is None:
+            return None
+        key = (symbol.upper(), interval)
+        version = (meta.get('generation', 0), meta['rows'])
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        directory = self._dir(symbol, interval)
+        generation, rows = version
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if rows == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(_column_path(directory, name, generation), dtype=dtype,
+                                          mode='r', shape=(rows,))
+        self._maps[key] = (version, columns)
+        return columns
+
+    def read(self, symbol, interval='1d', start=None, end=None, columns=None):
+        """Bars with ``start <= timestamp < end`` (epoch seconds) as array views.
+
+        Returns None for an unknown symbol. The arrays are read-only slices
+        of memory-mapped files; copy them before mutating.
+        """
+        stored = self._columns(symbol, interval)
+        if stored is None:
+            return None
+        ts = stored['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+        hi = ts.size if end is None else int(np.searchsorted(ts, end, side='left'))
+        names = columns or list(COLUMNS)
+        if 'timestamp' not in names:
+            names = ['timestamp'] + list(names)
+        return {name: stored[name][lo:hi] for name in names}
+
+    def _download(self, symbols, interval, **kwargs):
+        """``{symbol: columns}`` for the symbols one multi-ticker download has bars for"""
+        import pandas as pd
+        import yfinance as yf
+
+        with upstream('yfinance', 'download_history') as call:
+            frame = yf.download(tickers=symbols, interval=interval, auto_adjust=True,
+                                group_by='ticker', threads=True, progress=False, **kwargs)
+            missing = missing_symbols(frame, symbols)
+            if missing:
+                call.fail(f"No data for {', '.join(missing)}")
+        if frame is None or frame.empty:
+            return {}
+
+        downloaded = {}
+        multi = isinstance(frame.columns, pd.MultiIndex)
+        available = set(frame.columns.get_level_values(0)) if multi else set(symbols[:1])
+        for symbol in symbols:
+            if symbol not in available:
+                continue
+            bars = (frame[symbol] if multi else frame).dropna(subset=['Close'])
+            if bars.empty:
+                continue
+            columns = {'timestamp': _to_epoch_seconds(bars.index)}
+            for name, source in SOURCE_COLUMNS.items():
+                columns[name] = bars[source].to_numpy(dtype=np.float64, na_value=np.nan)
+            downloaded[symbol] = columns
+        return downloaded
+
+    def _readjusted(self, symbol, interval, bars):
+        """True if ``bars`` reprice complete bars already stored (a split or dividend)"""
+        stored = self._columns(symbol, interval)
+        if stored is None or stored['timestamp'].size < 2:
+            return False
+        ts = stored['timestamp']
+        # The newest stored bar may have been partial, so compare only the ones before it
+        overlap = (bars['timestamp'] >= ts[0]) & (bars['timestamp'] < ts[-1])
+        positions = np.searchsorted(ts, bars['timestamp'][overlap])
+        matched = ts[positions] == bars['timestamp'][overlap]
+        if not matched.any():
+            return False
+        stored_close = stored['close'][positions[matched]]
+        new_close = bars['close'][overlap][matched]
+        return not np.allclose(new_close, stored_close, rtol=ADJUSTMENT_TOLERANCE, atol=0.0)
+
+    def refresh(self, symbols, interval='1d'):
+        """Fetch only bars newer than what is stored, in one multi-ticker download.
+
+        The download starts from each symbol's second-newest bar: the newest
+        one may be partial and is updated, and the one before it shows
+        whether the provider re-adjusted the history, in which case the
+        symbol is downloaded again in full. Returns ``{symbol: rows_written}``.
+        """
+        import pandas as pd
+
+        symbols = [s.upper() for s in symbols]
+        anchors = {}
+        for symbol in symbols:
+            stored = self._columns(symbol, interval)
+            if stored is not None and stored['timestamp'].size:
+                anchors[symbol] = int(stored['timestamp'][-min(2, stored['timestamp'].size)])
+
+        kwargs = {}
+        if len(anchors) == len(symbols):
+            # Every symbol has history: start from the oldest anchor bar
+            kwargs['start'] = pd.Timestamp(min(anchors.values()), unit='s', tz='UTC').strftime('%Y-%m-%d')
+        else:
+            kwargs['period'] = INITIAL_PERIOD.get(interval, 'max')
+        downloaded = self._download(symbols, interval, **kwargs)
+
+        written = {symbol: 0 for symbol in symbols}
+        readjusted = []
+        for symbol, bars in downloaded.items():
+            if symbol not in anchors or not self._readjusted(symbol, interval, bars):
+                written[symbol] = self.append(symbol, interval, bars)
+            elif 'period' in kwargs:
+                # This download already reaches as far back as a first one
+                written[symbol] = self.replace(symbol, interval, bars)
+            else:
+                readjusted.append(symbol)
+
+        if readjusted:
+            period = INITIAL_PERIOD.get(interval, 'max')
+            for symbol, bars in self._download(readjusted, interval, period=period).items():
+                written[symbol] = self.replace(symbol, interval, bars)
+        return written
+
+    def returns_matrix(self, symbols, interval='1d', lookback=252, start=None, end=None):
+        """Simple close-to-close returns aligned on timestamps common to all symbols.
+
+        Returns ``(timestamps, matrix)`` with one column per symbol.
+        """
+        series = []
+        for symbol in symbols:
+            bars = self.read(symbol, interval, start=start, end=end, columns=['close'])
+            if bars is None or bars['close'].size < 2:
+                raise ValueError(f'No stored history for {symbol.upper()}')
+            series.append(bars)
+
+        common = series[0]['timestamp']
+        for bars in series[1:]:
+            common = np.intersect1d(common, bars['timestamp'], assume_unique=True)
+        if lookback:
+            common = common[-(lookback + 1):]
+        if common.size < 2:
+            raise ValueError('Not enough overlapping history across symbols')
+
+        closes = np.empty((common.size, len(symbols)))
+        for column, bars in enumerate(series):
+            positions = np.searchsorted(bars['timestamp'], common)
+            closes[:, column] = bars['close'][positions]
+        return common[1:], closes[1:] / closes[:-1] - 1.0
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Streaming Holdings Upload
+===================================
+
+Incremental CSV/NDJSON holdings parsing for /api/portfolio/upload.
+
+The request body is fed in as it arrives. Complete lines are parsed in
+blocks of ``CHUNK_ROWS`` into typed column arrays and folded straight into
+per-symbol running totals, so memory grows with the number of distinct
+symbols, not with the number of rows or the size of the file. When the
+last chunk lands only the final partial block is left to fold, and the
+totals are already in the column form ``portfolio_engine.analyze`` takes.
+
+Every line is one record: CSV fields may be quoted (to hold commas) but
+a quoted field must not contain a line break, and such rows are rejected.
+Uploads are capped at ``portfolio_engine.MAX_POSITIONS`` distinct symbols.
+"""
+
+import csv
+import io
+import itertools
+
+import numpy as np
+
+from portfolio_engine import MAX_POSITIONS, holdings_columns
+from response_encoding import loads
+
+CHUNK_ROWS = 8192
+MAX_LINE_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+}
+FORMATS = ('csv', 'ndjson')
+
+# Common CSV export headers mapped to holding fields
+COLUMN_ALIASES = {
+    'ticker': 'symbol',
+    'market_value': 'value',
+    'shares': 'quantity',
+    'cost': 'cost_basis',
+    'class': 'asset_class',
+}
+TEXT_FIELDS = ('symbol', 'sector', 'asset_class')
+NUMBER_FIELDS = ('value', 'quantity', 'price', 'cost_basis')
+
+
+def parse_format(fmt=None, content_type=None):
+    """'csv' or 'ndjson' from an explicit format or the request Content-Type"""
+    if fmt:
+        fmt = str(fmt).lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported upload format: {fmt} (use {' or '.join(FORMATS)})")
+        return fmt
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in MEDIA_TYPES:
+        return MEDIA_TYPES[media_type]
+    raise ValueError('Send holdings as text/csv or application/x-ndjson, or pass format=csv|ndjson')
+
+
+class HoldingsParser:
+    """Split a byte stream into lines and parse them in blocks of rows"""
+
+    def __init__(self, fmt, chunk_rows=CHUNK_ROWS):
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.line_number = 0
+        self._tail = b''
+        self._lines = []
+        self._fields = None
+
+    def feed(self, data):
+        """Column blocks completed by ``data``"""
+        lines = (self._tail + data).split(b'\n')
+        self._tail = lines.pop()
+        if len(self._tail) > MAX_LINE_BYTES:
+            raise ValueError(f'Line {self.line_number + len(lines) + 1} is longer than {MAX_LINE_BYTES} bytes')
+        self._lines.extend(lines)
+        while len(self._lines) >= self.chunk_rows:
+            block, self._lines = self._lines[:self.chunk_rows], self._lines[self.chunk_rows:]
+            columns = self._parse(block)
+            if columns is not None:
+                yield columns
+
+    def close(self):
+        """Remaining rows once the body has ended"""
+        block = self._lines + ([self._tail] if self._tail.strip() else [])
+        self._lines, self._tail = [], b''
+        columns = self._parse(block) if block else None
+        if columns is not None:
+            yield columns
+
+    def _parse(self, lines):
+        first = self.line_number + 1
+        self.line_number += len(lines)
+        if self.fmt == 'csv':
+            columns = self._parse_csv(lines, first)
+        else:
+            columns = self._parse_ndjson(lines, first)
+        if columns is None:
+            return None
+        try:
+            return holdings_columns(columns)
+        except ValueError as e:
+            raise ValueError(f'Lines {first}-{self.line_number}: {e}')
+
+    def _parse_csv(self, lines, first):
+        data = b'\n'.join(lines)
+        if b'"' in data:
+            # An unbalanced quote opens a field that would swallow the next line
+            for offset, line in enumerate(lines):
+                if line.count(b'"') % 2:
+                    raise ValueError(f'Line {first + offset}: quoted fields must not contain line breaks')
+        text = data.decode('utf-8')
+        if first == 1:
+            text = text.lstrip('\ufeff')
+        rows = [row for row in csv.reader(io.StringIO(text)) if row]
+        if self._fields is None:
+            if not rows:
+                return None
+            header = [COLUMN_ALIASES.get(name, name) for name in
+                      (name.strip().lower().replace(' ', '_') for name in rows.pop(0))]
+            if 'symbol' not in header:
+                raise ValueError('CSV header must include a symbol column')
+            self._fields = {name: header.index(name) for name in TEXT_FIELDS + NUMBER_FIELDS if name in header}
+        if not rows:
+            return None
+
+        # Transpose rows to columns in C; short rows are padded with empty cells
+        cells = list(itertools.zip_longest(*rows, fillvalue=''))
+        columns = {}
+        for name, position in self._fields.items():
+            if position >= len(cells):
+                continue
+            column = np.array(cells[position], dtype=object)
+            if name in NUMBER_FIELDS:
+                # None becomes NaN when the column is converted to floats
+                column[column == ''] = None
+            columns[name] = column
+        return columns
+
+    def _parse_ndjson(self, lines, first):
+        records = []
+        for offset, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except ValueError:
+                raise ValueError(f'Line {first + offset} is not valid JSON')
+            if not isinstance(record, dict):
+                raise ValueError(f'Line {first + offset} must be a JSON object')
+            records.append(record)
+        return records or None
+
+
+class HoldingsAccumulator:
+    """Per-symbol running totals of streamed holding columns"""
+
+    def __init__(self, capacity=1024):
+        self.rows = 0
+        self._slots = {}
+        self._symbols = []
+        self._sectors = []
+        self._asset_classes = []
+        self._value = np.zeros(capacity)
+        self._cost = np.zeros(capacity)
+        self._has_cost = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def _reserve(self, size):
+        if size <= self._value.size:
+            return
+        capacity = max(size, 2 * self._value.size)
+        for name in ('_value', '_cost', '_has_cost'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:old.size] = old
+            setattr(self, name, grown)
+
+    def add(self, columns):
+        """Fold one block from ``holdings_columns`` into the totals"""
+        symbols, first, inverse = np.unique(columns['symbol'], return_index=True, return_inverse=True)
+        slots = np.empty(symbols.size, dtype=np.intp)
+        for i, symbol in enumerate(symbols.tolist()):
+            slot = self._slots.get(symbol)
+            if slot is None:
+                if len(self._symbols) >= MAX_POSITIONS:
+                    raise ValueError(f'At most {MAX_POSITIONS:,} positions are supported')
+                # The first row seen for a symbol supplies its labels
+                slot = self._slots[symbol] = len(self._symbols)
+                self._symbols.append(symbol)
+                self._sectors.append(columns['sector'][first[i]])
+                self._asset_classes.append(columns['asset_class'][first[i]])
+            slots[i] = slot
+        self._reserve(len(self._symbols))
+
+        cost = columns['cost_basis']
+        known = ~np.isnan(cost)
+        # Symbols are unique within ``slots``, so fancy-indexed += is safe
+        self._value[slots] += np.bincount(inverse, weights=columns['value'], minlength=symbols.size)
+        self._cost[slots] += np.bincount(inverse, weights=np.where(known, cost, 0.0), minlength=symbols.size)
+        self._has_cost[slots] |= np.bincount(inverse, weights=known, minlength=symbols.size) > 0
+        self.rows += columns['symbol'].size
+
+    def columns(self):
+        """Totals as one row per symbol, in ``holdings_columns`` form"""
+        size = len(self._symbols)
+        return {
+            'symbol': np.array(self._symbols, dtype=str),
+            'value': self._value[:size].copy(),
+            'cost_basis': np.where(self._has_cost[:size], self._cost[:size], np.nan),
+            'sector': np.array(self._sectors, dtype=object),
+            'asset_class': np.array(self._asset_classes, dtype=object),
+        }
+
+
+class HoldingsUpload:
+    """Parse and aggregate one streamed holdings body"""
+
+    def __init__(self, fmt, chunk_rows=CHUNK_ROWS):
+        self.fmt = fmt
+        self.parser = HoldingsParser(fmt, chunk_rows)
+        self.totals = HoldingsAccumulator()
+        self.bytes = 0
+        self.blocks = 0
+
+    def feed(self, data):
+        self.bytes += len(data)
+        for columns in self.parser.feed(data):
+            self.totals.add(columns)
+            self.blocks += 1
+
+    def finish(self):
+        """Aggregated columns once the body has ended"""
+        for columns in self.parser.close():
+            self.totals.add(columns)
+            self.blocks += 1
+        if not self.totals.rows:
+            raise ValueError('Holdings data required')
+        return self.totals.columns()
+
+    def summary(self):
+        return {
+            'format': self.fmt,
+            'rows': self.totals.rows,
+            'symbols': len(self.totals),
+            'bytes': self.bytes,
+            'blocks': self.blocks,
+        }
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Technical Indicator Engine
+====================================
+
+Vectorized SMA/EMA, RSI, MACD, Bollinger bands, ATR and rolling volatility.
+
+Every function works along the last axis, so a (symbols, bars) matrix
+computes all symbols in one pass. Window statistics use cumulative sums
+and ``sliding_window_view`` and never loop per bar in Python. Recursive
+averages (EMA, Wilder smoothing) are evaluated in closed form over blocks,
+so the only Python loop is over blocks of a few thousand bars.
+
+``compute_all`` returns full indicator series plus a state dict, and
+``update`` advances that state by one new bar per symbol in O(window).
+"""
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TRADING_DAYS = 252
+
+DEFAULTS = {
+    'sma': 20,
+    'ema': 20,
+    'rsi': 14,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'bollinger': 20,
+    'bollinger_k': 2.0,
+    'atr': 14,
+    'volatility': 20,
+}
+# Largest (1 - alpha) ** -n the blocked EMA lets grow before rebasing
+_MAX_GROWTH = 1e150
+
+
+def _as_2d(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[None, :] if values.ndim == 1 else values
+
+
+def _restore(result, like):
+    return result[0] if np.ndim(like) == 1 else result
+
+
+def sma(values, window):
+    """Simple moving average; the first ``window - 1`` bars are NaN"""
+    x = _as_2d(values)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        csum = np.cumsum(x, axis=-1)
+        out[:, window - 1] = csum[:, window - 1]
+        out[:, window:] = csum[:, window:] - csum[:, :-window]
+        out[:, window - 1:] /= window
+    return _restore(out, values)
+
+
+def smooth(values, alpha, initial=None):
+    """Exponential smoothing ``y[t] = alpha * x[t] + (1 - alpha) * y[t-1]``.
+
+    Seeded with ``initial`` (per row) or the first value. Evaluated in
+    closed form: inside a block, ``y = d**t * (y0 + alpha * cumsum(x / d**i))``
+    with ``d = 1 - alpha``; blocks are sized so ``d**-i`` stays finite.
+    """
+    x = _as_2d(values)
+    n = x.shape[-1]
+    out = np.empty_like(x)
+    if n == 0:
+        return _restore(out, values)
+
+    decay = 1.0 - alpha
+    if initial is None:
+        carry = x[:, 0].copy()
+        start = 1
+        out[:, 0] = carry
+    else:
+        carry = np.asarray(initial, dtype=np.float64).reshape(x.shape[0]).copy()
+        start = 0
+
+    if decay <= 0:
+        out[:, start:] = x[:, start:]
+        return _restore(out, values)
+
+    block = max(1, int(math.log(_MAX_GROWTH) / -math.log(decay))) if decay < 1 else n
+    for lo in range(start, n, block):
+        hi = min(lo + block, n)
+        powers = decay ** np.arange(1, hi - lo + 1)
+        weighted = np.cumsum(x[:, lo:hi] / powers, axis=-1)
+        out[:, lo:hi] = powers * (carry[:, None] + alpha * weighted)
+        carry = out[:, hi - 1]
+    return _restore(out, values)
+
+
+def ema(values, span):
+    """Exponential moving average with ``alpha = 2 / (span + 1)``"""
+    return smooth(values, 2.0 / (span + 1))
+
+
+def rolling_std(values, window, ddof=0):
+    """Rolling standard deviation via a strided window view"""
+    x = _as_2d(values)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        windows = sliding_window_view(x, window, axis=-1)
+        out[:, window - 1:] = windows.std(axis=-1, ddof=ddof)
+    return _restore(out, values)
+
+
+def rsi(close, period=14):
+    """Relative Strength Index with Wilder smoothing; the first bar is NaN"""
+    x = _as_2d(close)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] < 2:
+        return _restore(out, close)
+    delta = np.diff(x, axis=-1)
+    gain = smooth(np.clip(delta, 0, None), 1.0 / period)
+    loss = smooth(np.clip(-delta, 0, None), 1.0 / period)
+    out[:, 1:] = _rsi_from(gain, loss)
+    return _restore(out, close)
+
+
+def _rsi_from(gain, loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        value = 100.0 - 100.0 / (1.0 + rs)
+    # No losses at all means maximum strength; a flat series is neutral
+    value = np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), value)
+    return value
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window=20, k=2.0):
+    """Middle, upper and lower Bollinger bands"""
+    middle = sma(close, window)
+    width = k * rolling_std(close, window)
+    return middle, middle + width, middle - width
+
+
+def true_range(high, low, close):
+    """True range; the first bar falls back to high - low"""
+    h, l, c = _as_2d(high), _as_2d(low), _as_2d(close)
+    tr = h - l
+    if c.shape[-1] > 1:
+        prev = c[:, :-1]
+        tr[:, 1:] = np.maximum.reduce([tr[:, 1:], np.abs(h[:, 1:] - prev), np.abs(l[:, 1:] - prev)])
+    return _restore(tr, close)
+
+
+def atr(high, low, close, period=14):
+    """Average True Range with Wilder smoothing"""
+    return smooth(true_range(high, low, close), 1.0 / period)
+
+
+def rolling_volatility(close, window=20, periods_per_year=TRADING_DAYS):
+    """Annualized rolling standard deviation of log returns"""
+    x = _as_2d(close)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] > window:
+        log_returns = np.diff(np.log(x), axis=-1)
+        out[:, 1:] = rolling_std(log_returns, window, ddof=1) * math.sqrt(periods_per_year)
+    return _restore(out, close)
+
+
+def compute_all(close, high=None, low=None, params=None):
+    """Every indicator for a (symbols, bars) close matrix.
+
+    Returns ``(series, state)``: ``series`` maps indicator name to an
+    array shaped like ``close`` and ``state`` carries what ``update``
+    needs to extend the series one bar at a time.
+    """
+    p = dict(DEFAULTS, **(params or {}))
+    c = _as_2d(close)
+    h = c if high is None else _as_2d(high)
+    l = c if low is None else _as_2d(low)
+
+    ema_fast = ema(c, p['macd_fast'])
+    ema_slow = ema(c, p['macd_slow'])
+    macd_line = ema_fast - ema_slow
+    macd_signal = ema(macd_line, p['macd_signal'])
+    middle, upper, lower = bollinger(c, p['bollinger'], p['bollinger_k'])
+    tr = true_range(h, l, c)
+    atr_series = smooth(tr, 1.0 / p['atr'])
+
+    delta = np.diff(c, axis=-1)
+    gain = smooth(np.clip(delta, 0, None), 1.0 / p['rsi']) if delta.shape[-1] else delta
+    loss = smooth(np.clip(-delta, 0, None), 1.0 / p['rsi']) if delta.shape[-1] else delta
+    rsi_series = np.full_like(c, np.nan)
+    if delta.shape[-1]:
+        rsi_series[:, 1:] = _rsi_from(gain, loss)
+
+    ema_series = ema(c, p['ema'])
+    series = {
+        'sma': sma(c, p['sma']),
+        'ema': ema_series,
+        'rsi': rsi_series,
+        'macd': macd_line,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd_line - macd_signal,
+        'bollinger_middle': middle,
+        'bollinger_upper': upper,
+        'bollinger_lower': lower,
+        'atr': atr_series,
+        'volatility': rolling_volatility(c, p['volatility']),
+    }
+
+    window = max(p['sma'], p['bollinger'], p['volatility'] + 1)
+    state = {
+        'params': p,
+        'closes': c[:, -window:].copy(),
+        'ema': ema_series[:, -1].copy(),
+        'ema_fast': ema_fast[:, -1].copy(),
+        'ema_slow': ema_slow[:, -1].copy(),
+        'macd_signal': macd_signal[:, -1].copy(),
+        'rsi_gain': gain[:, -1].copy() if delta.shape[-1] else np.zeros(c.shape[0]),
+        'rsi_loss': loss[:, -1].copy() if delta.shape[-1] else np.zeros(c.shape[0]),
+        'atr': atr_series[:, -1].copy(),
+        'bars': c.shape[-1],
+    }
+    if np.ndim(close) == 1:
+        series = {name: values[0] for name, values in series.items()}
+    return series, state
+
+
+def update(state, close, high=None, low=None):
+    """Advance ``state`` by one bar per symbol; returns (latest values, state).
+
+    ``close``/``high``/``low`` hold one value per symbol. Work is O(window)
+    per symbol and vectorized across symbols.
+    """
+    p = state['params']
+    c = np.atleast_1d(np.asarray(close, dtype=np.float64))
+    h = c if high is None else np.atleast_1d(np.asarray(high, dtype=np.float64))
+    l = c if low is None else np.atleast_1d(np.asarray(low, dtype=np.float64))
+
+    prev_close = state['closes'][:, -1]
+    closes = np.concatenate((state['closes'][:, 1:], c[:, None]), axis=1)
+    bars = state['bars'] + 1
+
+    def step(previous, value, alpha):
+        return alpha * value + (1.0 - alpha) * previous
+
+    ema_value = step(state['ema'], c, 2.0 / (p['ema'] + 1))
+    ema_fast = step(state['ema_fast'], c, 2.0 / (p['macd_fast'] + 1))
+    ema_slow = step(state['ema_slow'], c, 2.0 / (p['macd_slow'] + 1))
+    macd_line = ema_fast - ema_slow
+    macd_signal = step(state['macd_signal'], macd_line, 2.0 / (p['macd_signal'] + 1))
+
+    delta = c - prev_close
+    if state['bars'] > 1:
+        gain = step(state['rsi_gain'], np.clip(delta, 0, None), 1.0 / p['rsi'])
+        loss = step(state['rsi_loss'], np.clip(-delta, 0, None), 1.0 / p['rsi'])
+    else:
+        gain, loss = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+
+    tr = np.maximum.reduce([h - l, np.abs(h - prev_close), np.abs(l - prev_close)])
+    atr_value = step(state['atr'], tr, 1.0 / p['atr'])
+
+    def window_mean(n):
+        return closes[:, -n:].mean(axis=1) if bars >= n else np.full(c.shape, np.nan)
+
+    middle = window_mean(p['bollinger'])
+    width = (p['bollinger_k'] * closes[:, -p['bollinger']:].std(axis=1)
+             if bars >= p['bollinger'] else np.full(c.shape, np.nan))
+    if bars > p['volatility']:
+        log_returns = np.diff(np.log(closes[:, -(p['volatility'] + 1):]), axis=1)
+        volatility = log_returns.std(axis=1, ddof=1) * math.sqrt(TRADING_DAYS)
+    else:
+        volatility = np.full(c.shape, np.nan)
+
+    latest = {
+        'sma': window_mean(p['sma']),
+        'ema': ema_value,
+        'rsi': _rsi_from(gain, loss),
+        'macd': macd_line,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd_line - macd_signal,
+        'bollinger_middle': middle,
+        'bollinger_upper': middle + width,
+        'bollinger_lower': middle - width,
+        'atr': atr_value,
+        'volatility': volatility,
+    }
+    new_state = dict(
+        state,
+        closes=closes,
+        ema=ema_value,
+        ema_fast=ema_fast,
+        ema_slow=ema_slow,
+        macd_signal=macd_signal,
+        rsi_gain=gain,
+        rsi_loss=loss,
+        atr=atr_value,
+        bars=bars,
+    )
+    return latest, new_state
+
+
+GROUPS = {
+    'sma': ('sma',),
+    'ema': ('ema',),
+    'rsi': ('rsi',),
+    'macd': ('macd', 'macd_signal', 'macd_histogram'),
+    'bollinger': ('bollinger_middle', 'bollinger_upper', 'bollinger_lower'),
+    'atr': ('atr',),
+    'volatility': ('volatility',),
+}
+
+
+def parse_indicators(raw):
+    """Indicator column names for a comma-separated list of groups (default all)"""
+    if not raw:
+        return [name for names in GROUPS.values() for name in names]
+    names = []
+    for group in (g.strip().lower() for g in raw.split(',')):
+        if group not in GROUPS:
+            raise ValueError(f"Unknown indicator: {group}; expected one of {', '.join(GROUPS)}")
+        names.extend(GROUPS[group])
+    return names
+
+
+class IndicatorCache:
+    """Latest indicator values per stored symbol, advanced bar by bar.
+
+    Reads bars from a ``HistoryStore``-like object. A symbol's first request
+    computes its indicators over the last ``window`` bars (batched with every
+    other symbol that needs the same length); later requests only feed the
+    bars appended since, through ``update``. Above ``max_steps`` new bars, or
+    once the store's ``revision`` shows stored bars were rewritten, it
+    recomputes in full.
+    """
+
+    def __init__(self, store, window=1000, max_steps=50, params=None):
+        self.store = store
+        self.window = window
+        self.max_steps = max_steps
+        self.params = params
+        self._states = {}
+
+    def _bars(self, symbol, interval):
+        bars = self.store.read(symbol, interval, columns=['high', 'low', 'close'])
+        if bars is None or bars['close'].size == 0:
+            return None
+        return bars
+
+    def compute(self, symbols, interval='1d', tail=0):
+        """``(latest, series)`` for ``symbols`` present in the store.
+
+        ``latest`` maps symbol to ``{indicator: value}``. ``series`` holds the
+        last ``tail`` values of every indicator and is only filled (by a
+        full recompute) when ``tail`` is positive.
+        """
+        latest = {}
+        series = {}
+        full = {}
+        for symbol in symbols:
+            # Read before the bars, so a rewrite in between forces a recompute next time
+            revision = self.store.revision(symbol, interval)
+            bars = self._bars(symbol, interval)
+            if bars is None:
+                continue
+            rows = bars['close'].size
+            cached = self._states.get((symbol, interval))
+            if (tail <= 0 and cached is not None and cached[1] == revision
+                    and 0 <= rows - cached[0] <= self.max_steps):
+                latest[symbol] = self._advance(symbol, interval, bars, cached)
+            else:
+                full.setdefault(min(rows, self.window), []).append((symbol, bars, revision))
+
+        # Symbols with the same number of bars share one (symbols, bars) batch
+        for length, group in full.items():
+            close = np.stack([bars['close'][-length:] for _, bars, _ in group])
+            high = np.stack([bars['high'][-length:] for _, bars, _ in group])
+            low = np.stack([bars['low'][-length:] for _, bars, _ in group])
+            values, state = compute_all(close, high, low, self.params)
+            for row, (symbol, bars, revision) in enumerate(group):
+                row_state = _row_state(state, row)
+                row_latest = {name: float(v[row, -1]) for name, v in values.items()}
+                self._states[(symbol, interval)] = (bars['close'].size, revision, row_state, row_latest)
+                latest[symbol] = row_latest
+                if tail > 0:
+                    series[symbol] = {name: v[row, -tail:] for name, v in values.items()}
+        return latest, series
+
+    def _advance(self, symbol, interval, bars, cached):
+        rows, revision, state, values = cached
+        for i in range(rows, bars['close'].size):
+            step, state = update(state, bars['close'][i], bars['high'][i], bars['low'][i])
+            values = {name: float(v[0]) for name, v in step.items()}
+        self._states[(symbol, interval)] = (bars['close'].size, revision, state, values)
+        return values
+
+
+def _row_state(state, row):
+    """Single-symbol slice of a batched state"""
+    return {
+        name: (value[row:row + 1].copy() if isinstance(value, np.ndarray) else value)
+        for name, value in state.items()
+    }
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Lazy Module Imports
+=============================
+
+Defers heavy third-party imports (yfinance, pandas, sklearn, openai,
+anthropic, ...) until a route first touches them, so serverless cold
+starts only pay for what the invoked route actually uses.
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+_import_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """Module stand-in that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        object.__setattr__(self, '_lazy_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_lazy_module')
+        if module is None:
+            with _import_lock:
+                module = object.__getattribute__(self, '_lazy_module')
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    object.__setattr__(self, '_lazy_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if object.__getattribute__(self, '_lazy_module') else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Return ``name`` if it is already imported, otherwise a lazy proxy for it"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def is_loaded(module):
+    """True once a module (lazy or not) has actually been imported"""
+    if isinstance(module, LazyModule):
+        return object.__getattribute__(module, '_lazy_module') is not None
+    return True
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Latency-Aware LLM Router
+==================================
+
+Routes each AI query to the best healthy backend (provider + model) using
+live statistics instead of fixed numbers:
+
+* Per backend it keeps an EWMA of latency and error rate plus a window of
+  recent latencies for p95. Backends are ranked by
+  ``quality - latency_weight * latency_s - error_weight * error_rate``,
+  the same "confidence minus response time" trade-off the meta-controller
+  uses.
+* A circuit breaker opens after ``failure_threshold`` consecutive failures
+  and skips the backend for ``cooldown`` seconds; afterwards a single
+  probe request is let through to decide whether it closes again. A probe
+  that is abandoned (``release``) or never reports within
+  ``probe_timeout`` seconds lets the next request probe instead.
+* With hedging enabled, a second request goes to the next-best backend
+  when the first one is slower than its own p95, and whichever answers
+  first wins. Failed requests fail over to the next backend.
+* Blocking calls run on a pool of ``max_workers`` threads. The hedge
+  timer starts when the call starts running, so time spent queued behind
+  a busy pool does not trigger hedges.
+
+``acomplete`` is the same routing for async servers: backends with an
+``acall`` coroutine run as tasks on the event loop instead of pool threads.
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from lazy_imports import lazy_import
+
+asyncio = lazy_import('asyncio')
+
+logger = logging.getLogger(__name__)
+
+RouteResult = namedtuple('RouteResult', ['answer', 'backend', 'latency_ms', 'hedged', 'attempts'])
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class RouterError(Exception):
+    """No backend could answer the query"""
+
+
+class Backend:
+    """One routable model: ``call(query)`` returns the answer text.
+
+    ``acall(query)``, if given, is the coroutine equivalent used by
+    ``LLMRouter.acomplete``.
+    """
+
+    def __init__(self, name, call, provider=None, quality=0.9, acall=None):
+        self.name = name
+        self.call = call
+        self.acall = acall
+        self.provider = provider or name.split(':')[0]
+        self.quality = quality
+
+
+class BackendStats:
+    """Live latency, error and breaker state for one backend"""
+
+    def __init__(self, prior_latency, window):
+        self.latency = prior_latency
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.probe_until = 0.0
+
+    def p95(self, min_samples):
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class LLMRouter:
+    """Pick, hedge and fail over between AI backends"""
+
+    def __init__(self, backends=(), alpha=0.2, prior_latency=1.0, latency_weight=0.1,
+                 error_weight=1.0, failure_threshold=5, cooldown=30.0, hedge=False,
+                 hedge_min_samples=20, window=200, max_attempts=3, max_workers=16,
+                 probe_timeout=120.0, clock=time.monotonic):
+        self.alpha = alpha
+        self.prior_latency = prior_latency
+        self.latency_weight = latency_weight
+        self.error_weight = error_weight
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.window = window
+        self.max_attempts = max_attempts
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+
+        self.backends = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-router')
+        for backend in backends:
+            self.add(backend)
+
+    def add(self, backend):
+        with self._lock:
+            self.backends[backend.name] = backend
+            self._stats[backend.name] = BackendStats(self.prior_latency, self.window)
+
+    def score(self, name):
+        backend, stats = self.backends[name], self._stats[name]
+        return (backend.quality - self.latency_weight * stats.latency
+                - self.error_weight * stats.error_rate)
+
+    @staticmethod
+    def _probeable(stats, now):
+        """Breaker cooldown over and no live probe in flight"""
+        if stats.state == OPEN:
+            return now >= stats.open_until
+        return stats.state == HALF_OPEN and now >= stats.probe_until
+
+    def rank(self, candidates=None):
+        """Healthy backends, best first.
+
+        A backend whose breaker cooldown has expired is included so it can
+        be probed; ``claim`` lets only one request through at a time.
+        """
+        now = self.clock()
+        names = [n for n in (self.backends if candidates is None else candidates) if n in self.backends]
+        with self._lock:
+            healthy = [
+                name for name in names
+                if self._stats[name].state == CLOSED or self._probeable(self._stats[name], now)
+            ]
+            return sorted(healthy, key=self.score, reverse=True)
+
+    def claim(self, name):
+        """Reserve ``name`` for a request; False if its breaker blocks it"""
+        with self._lock:
+            stats = self._stats[name]
+            if stats.state == CLOSED:
+                return True
+            now = self.clock()
+            if self._probeable(stats, now):
+                stats.state = HALF_OPEN
+                stats.probe_until = now + self.probe_timeout
+                return True
+            return False
+
+    def release(self, name):
+        """Give back a claim whose request ended without an outcome.
+
+        A client that abandons a stream says nothing about the backend; if
+        it was the half-open probe, the next request may probe instead.
+        """
+        with self._lock:
+            stats = self._stats[name]
+            if stats.state == HALF_OPEN:
+                stats.probe_until = self.clock()
+
+    def select(self, candidates=None):
+        """Claim and return the best healthy backend name, or None"""
+        for name in self.rank(candidates):
+            if self.claim(name):
+                return name
+        return None
+
+    def record(self, name, latency, ok):
+        """Fold one finished request into the backend's statistics"""
+        with self._lock:
+            stats = self._stats[name]
+            stats.requests += 1
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            if ok:
+                # The first observation replaces the prior instead of being averaged in
+                if stats.samples:
+                    stats.latency += self.alpha * (latency - stats.latency)
+                else:
+                    stats.latency = latency
+                stats.samples.append(latency)
+                stats.consecutive_failures = 0
+                if stats.state != CLOSED:
+                    logger.info(f"Circuit for {name} closed")
+                stats.state = CLOSED
+                return
+
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.state == HALF_OPEN or stats.consecutive_failures >= self.failure_threshold:
+                if stats.state != OPEN:
+                    logger.warning(f"Circuit for {name} opened after "
+                                   f"{stats.consecutive_failures} consecutive failures")
+                stats.state = OPEN
+                stats.open_until = self.clock() + self.cooldown
+
+    def _run(self, name, query, running=None):
+        started = self.clock()
+        if running is not None:
+            running[name] = started
+        try:
+            answer = self.backends[name].call(query)
+        except Exception:
+            self.record(name, self.clock() - started, False)
+            raise
+        self.record(name, self.clock() - started, True)
+        return answer
+
+    def _hedge_delay(self, name):
+        with self._lock:
+            return self._stats[name].p95(self.hedge_min_samples)
+
+    def complete(self, query, candidates=None, hedge=None):
+        """Answer ``query`` from the best backend; returns a RouteResult.
+
+        Raises RouterError when every attempted backend fails or none is
+        healthy. A hedged request that loses keeps running in the pool and
+        still updates its backend's statistics.
+        """
+        queue = self.rank(candidates)
+        if not queue:
+            raise RouterError('No healthy AI backend available')
+        hedge = self.hedge if hedge is None else hedge
+
+        started = self.clock()
+        pending = {}
+        running = {}  # name -> when its call left the pool queue
+        errors = []
+        hedged = False
+        attempts = 0
+
+        def submit():
+            nonlocal attempts
+            while queue:
+                name = queue.pop(0)
+                if self.claim(name):
+                    attempts += 1
+                    pending[self._pool.submit(self._run, name, query, running)] = name
+                    return name
+            return None
+
+        primary = submit()
+        if primary is None:
+            raise RouterError('No healthy AI backend available')
+        while pending:
+            timeout = None
+            if hedge and not hedged and queue and len(pending) == 1:
+                p95 = self._hedge_delay(primary)
+                if p95 is not None:
+                    began = running.get(primary)
+                    timeout = p95 if began is None else max(0.0, began + p95 - self.clock())
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                began = running.get(primary)
+                if began is None or self.clock() < began + p95:
+                    continue  # still queued, or started late: time it from its start
+                # Primary is slower than its p95: race the next-best backend
+                hedged = True
+                backup = submit()
+                if backup is not None:
+                    with self._lock:
+                        self._stats[primary].hedges += 1
+                    logger.info(f"Hedging {primary} with {backup}")
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {str(e)}")
+                    continue
+                return RouteResult(answer, name, round((self.clock() - started) * 1000, 1),
+                                   hedged, attempts)
+
+            if not pending and queue and attempts < self.max_attempts:
+                submit()
+
+        raise RouterError(f"All AI backends failed: {'; '.join(errors)}")
+
+    async def _arun(self, name, query):
+        started = self.clock()
+        try:
+            answer = await self.backends[name].acall(query)
+        except Exception:
+            self.record(name, self.clock() - started, False)
+            raise
+        self.record(name, self.clock() - started, True)
+        return answer
+
+    async def acomplete(self, query, candidates=None, hedge=None):
+        """Async ``complete``: same ranking, hedging and failover on the event loop.
+
+        Only backends with an ``acall`` are used. A hedged request that loses
+        keeps running as a task and still updates its backend's statistics.
+        """
+        queue = [name for name in self.rank(candidates) if self.backends[name].acall is not None]
+        if not queue:
+            raise RouterError('No healthy AI backend available')
+        hedge = self.hedge if hedge is None else hedge
+
+        started = self.clock()
+        pending = {}
+        errors = []
+        hedged = False
+        attempts = 0
+
+        def submit():
+            nonlocal attempts
+            while queue:
+                name = queue.pop(0)
+                if self.claim(name):
+                    attempts += 1
+                    pending[asyncio.ensure_future(self._arun(name, query))] = name
+                    return name
+            return None
+
+        primary = submit()
+        if primary is None:
+            raise RouterError('No healthy AI backend available')
+        while pending:
+            timeout = None
+            if hedge and not hedged and queue and len(pending) == 1:
+                p95 = self._hedge_delay(primary)
+                if p95 is not None:
+                    timeout = max(0.0, started + p95 - self.clock())
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than its p95: race the next-best backend
+                hedged = True
+                backup = submit()
+                if backup is not None:
+                    with self._lock:
+                        self._stats[primary].hedges += 1
+                    logger.info(f"Hedging {primary} with {backup}")
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    answer = task.result()
+                except Exception as e:
+                    errors.append(f"{name}: {str(e)}")
+                    continue
+                # A losing hedge records its own outcome; don't log its exception as unhandled
+                for loser in pending:
+                    loser.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return RouteResult(answer, name, round((self.clock() - started) * 1000, 1),
+                                   hedged, attempts)
+
+            if not pending and queue and attempts < self.max_attempts:
+                submit()
+
+        raise RouterError(f"All AI backends failed: {'; '.join(errors)}")
+
+    def stats(self):
+        """Per-backend routing statistics"""
+        now = self.clock()
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                p95 = stats.p95(1)
+                result[name] = {
+                    'provider': self.backends[name].provider,
+                    'state': stats.state,
+                    'score': round(self.score(name), 4),
+                    'latency_ms': round(stats.latency * 1000, 1),
+                    'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                    'error_rate': round(stats.error_rate, 4),
+                    'requests': stats.requests,
+                    'failures': stats.failures,
+                    'hedges': stats.hedges,
+                    'retry_in': round(max(0.0, stats.open_until - now), 1) if stats.state == OPEN else 0,
+                }
+            return result
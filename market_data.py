@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Market Data Helpers
+=============================
+
+Multi-symbol quote fetching and the columnar payload shared by the batch
+market endpoints.
+"""
+
+import math
+
+from metrics import upstream
+
+MAX_BATCH_SYMBOLS = 500
+QUOTE_FIELDS = ('price', 'change', 'change_percent', 'volume')
+
+
+def parse_symbols(raw, limit=MAX_BATCH_SYMBOLS):
+    """Normalize a comma-separated string or list of symbols.
+
+    Symbols are upper-cased, de-duplicated and kept in request order.
+    """
+    if raw is None:
+        raw = []
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    if not isinstance(raw, (list, tuple)):
+        raise ValueError('symbols must be a list or comma-separated string')
+
+    symbols = []
+    seen = set()
+    for item in raw:
+        symbol = str(item).strip().upper()
+        if symbol and symbol not in seen:
+            seen.add(symbol)
+            symbols.append(symbol)
+
+    if not symbols:
+        raise ValueError('At least one symbol is required')
+    if len(symbols) > limit:
+        raise ValueError(f'At most {limit} symbols per request')
+    return symbols
+
+
+def _number(value):
+    """Plain float for JSON, with NaN mapped to None"""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _quote_from_bars(bars):
+    """Build a quote from a daily OHLCV frame for a single symbol"""
+    closes = bars['Close'].dropna()
+    if closes.empty:
+        return None
+
+    price = float(closes.iloc[-1])
+    previous = float(closes.iloc[-2]) if len(closes) > 1 else price
+    change = price - previous
+    volume = bars['Volume'].dropna()
+
+    return {
+        'price': round(price, 4),
+        'change': round(change, 4),
+        'change_percent': round(change / previous * 100, 4) if previous else 0.0,
+        'volume': int(volume.iloc[-1]) if not volume.empty else 0,
+    }
+
+
+def missing_symbols(frame, symbols):
+    """Requested symbols a ``yf.download`` frame has no closes for.
+
+    yfinance reports failed tickers by logging them and leaving their
+    columns empty (or the whole frame), never by raising.
+    """
+    import pandas as pd
+
+    if frame is None or frame.empty:
+        return list(symbols)
+    if isinstance(frame.columns, pd.MultiIndex):
+        available = set(frame.columns.get_level_values(0))
+        return [s for s in symbols if s not in available or frame[s]['Close'].dropna().empty]
+    return [] if not frame['Close'].dropna().empty else list(symbols[:1])
+
+
+def download_quotes(symbols):
+    """Fetch the latest daily quote for many symbols in one upstream call.
+
+    Returns ``{symbol: quote}`` for every symbol yfinance returned bars
+    for; unknown or delisted symbols are simply absent.
+    """
+    # Imported here so callers that only need the payload helpers stay light
+    import pandas as pd
+    import yfinance as yf
+
+    with upstream('yfinance', 'download_quotes') as call:
+        frame = yf.download(
+            tickers=list(symbols),
+            period='5d',
+            interval='1d',
+            group_by='ticker',
+            auto_adjust=False,
+            threads=True,
+            progress=False,
+        )
+        missing = missing_symbols(frame, symbols)
+        if missing:
+            call.fail(f"No data for {', '.join(missing)}")
+    if frame is None or frame.empty:
+        return {}
+
+    quotes = {}
+    if isinstance(frame.columns, pd.MultiIndex):
+        available = set(frame.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol in available:
+                quote = _quote_from_bars(frame[symbol])
+                if quote is not None:
+                    quotes[symbol] = quote
+    elif len(symbols) == 1:
+        quote = _quote_from_bars(frame)
+        if quote is not None:
+            quotes[symbols[0]] = quote
+    return quotes
+
+
+def to_columnar(symbols, quotes, cached=()):
+    """Columnar payload: one array per field, aligned with ``symbols``.
+
+    Symbols without a quote get ``None`` in every column and are listed
+    under ``missing``.
+    """
+    cached = set(cached)
+    columns = {field: [] for field in QUOTE_FIELDS}
+    missing = []
+
+    for symbol in symbols:
+        quote = quotes.get(symbol)
+        if quote is None:
+            missing.append(symbol)
+        for field in QUOTE_FIELDS:
+            columns[field].append(_number(quote.get(field)) if quote else None)
+
+    columns['volume'] = [int(v) if v is not None else None for v in columns['volume']]
+    return {
+        'symbols': list(symbols),
+        'fields': list(QUOTE_FIELDS),
+        'data': columns,
+        'cached': [symbol in cached for symbol in symbols],
+        'missing': missing,
+        'count': len(symbols),
+    }
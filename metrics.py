@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Prometheus Metrics
+============================
+
+Small in-process metrics registry rendered in the Prometheus text
+exposition format (0.0.4), so the apps can be scraped without adding
+prometheus_client to the serverless bundle.
+
+* ``Counter``, ``Gauge`` and ``Histogram`` with labels. Gauges can also be
+  read at scrape time from a callback (cache hit ratios, in-flight loads).
+* ``upstream(provider, operation)`` times one outbound call (OpenAI,
+  Anthropic, yfinance) and feeds the per-provider state shown by health.
+* ``instrument(app)`` adds per-route request counters, latency histograms
+  and an in-flight gauge to a Flask app, and serves ``/metrics``. Latency
+  of a streamed response is measured to its first byte.
+
+Metrics are per process; with several workers, scrape each one.
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Consecutive failures after which a provider or route is reported down
+DOWN_AFTER = 3
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """Named metric with a fixed set of label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+                for key, value in values]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a callback"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+        self._callbacks = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, callback, **labels):
+        """Read the value from ``callback()`` at scrape time"""
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = callback
+
+    def value(self, **labels):
+        key = self._key(labels)
+        callback = self._callbacks.get(key)
+        return callback() if callback is not None else self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, callback in callbacks.items():
+            try:
+                values[key] = callback()
+            except Exception as e:
+                logger.warning(f"Metric callback for {self.name} failed: {str(e)}")
+        return [f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative ``le`` buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((key, list(counts), total, count) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, counts, total, count in snapshot:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics by name; asking twice for the same name returns the same metric"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return '\n'.join(metric.render() for _, metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class OutcomeTracker:
+    """Recent success/failure state per key (provider or route) for health"""
+
+    def __init__(self, down_after=DOWN_AFTER):
+        self.down_after = down_after
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, ok, error=None):
+        now = time.time()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = {
+                    'requests': 0, 'errors': 0, 'consecutive_failures': 0,
+                    'last_success': None, 'last_error': None, 'last_error_message': None,
+                }
+            state['requests'] += 1
+            if ok:
+                state['consecutive_failures'] = 0
+                state['last_success'] = now
+            else:
+                state['errors'] += 1
+                state['consecutive_failures'] += 1
+                state['last_error'] = now
+                state['last_error_message'] = str(error)[:200] if error is not None else None
+
+    def state(self, key):
+        """'idle', 'operational', 'degraded' or 'down' plus counters for ``key``"""
+        with self._lock:
+            state = dict(self._states.get(key) or {})
+        if not state:
+            return {'state': 'idle', 'requests': 0, 'errors': 0}
+        failures = state['consecutive_failures']
+        state['state'] = 'down' if failures >= self.down_after else 'degraded' if failures else 'operational'
+        for field in ('last_success', 'last_error'):
+            if state[field] is not None:
+                state[field] = datetime.fromtimestamp(state[field]).isoformat()
+        return state
+
+    def states(self, keys=()):
+        """State of every known key, plus ``keys`` even if never used"""
+        with self._lock:
+            known = list(self._states)
+        return {key: self.state(key) for key in dict.fromkeys(list(keys) + known)}
+
+    def summary(self, keys):
+        """Worst state across ``keys`` (e.g. the routes behind one service)"""
+        order = ('idle', 'operational', 'degraded', 'down')
+        states = [self.state(key)['state'] for key in keys]
+        used = [s for s in states if s != 'idle']
+        return max(used, key=order.index) if used else 'idle'
+
+
+# Outbound calls
+UPSTREAM_DURATION = REGISTRY.histogram(
+    'findeus_upstream_request_duration_seconds',
+    'Latency of outbound provider calls', ('provider', 'operation'))
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    'findeus_upstream_requests_total',
+    'Outbound provider calls by outcome (ok, error, cancelled)', ('provider', 'operation', 'outcome'))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    'findeus_upstream_in_flight',
+    'Outbound provider calls currently waiting for a response', ('provider',))
+
+# Cache and coalescing efficiency, read from each component's stats()
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'findeus_cache_hit_ratio', 'Share of cache lookups served from cache', ('cache',))
+CACHE_ENTRIES = REGISTRY.gauge(
+    'findeus_cache_entries', 'Live entries per cache', ('cache',))
+COALESCED_RATIO = REGISTRY.gauge(
+    'findeus_coalesced_ratio', 'Share of upstream calls that joined an identical in-flight call', ('coalescer',))
+COALESCER_IN_FLIGHT = REGISTRY.gauge(
+    'findeus_coalescer_in_flight', 'Distinct upstream calls currently in flight', ('coalescer',))
+
+# Inbound requests
+HTTP_DURATION = REGISTRY.histogram(
+    'findeus_http_request_duration_seconds',
+    'Request latency per route (to first byte for streams)', ('route', 'method'))
+HTTP_REQUESTS = REGISTRY.counter(
+    'findeus_http_requests_total',
+    'Requests per route, method and status', ('route', 'method', 'status'))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'findeus_http_requests_in_flight', 'Requests currently being handled')
+
+upstreams = OutcomeTracker()
+routes = OutcomeTracker()
+
+
+class _UpstreamCall:
+    """Context manager timing one outbound call; usable inside async code"""
+
+    def __init__(self, provider, operation):
+        self.provider = provider
+        self.operation = operation
+        self.error = None
+
+    def fail(self, error):
+        """Record the call as failed although it returned (errors reported in-band)"""
+        self.error = error
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.inc(provider=self.provider)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        UPSTREAM_IN_FLIGHT.dec(provider=self.provider)
+        if exc_type is None:
+            outcome = 'ok' if self.error is None else 'error'
+            exc = self.error
+        elif issubclass(exc_type, Exception):
+            outcome = 'error'
+        else:
+            # Generator closed or task cancelled: the caller went away, not the provider
+            outcome = 'cancelled'
+        UPSTREAM_DURATION.observe(elapsed, provider=self.provider, operation=self.operation)
+        UPSTREAM_REQUESTS.inc(provider=self.provider, operation=self.operation, outcome=outcome)
+        if outcome != 'cancelled':
+            upstreams.record(self.provider, outcome == 'ok', exc)
+        return False
+
+
+def upstream(provider, operation):
+    """``with upstream('openai', 'chat'):`` around an outbound call"""
+    return _UpstreamCall(provider, operation)
+
+
+def track_cache(name, stats):
+    """Export hit ratio and size of a cache exposing TTLCache-style ``stats()``"""
+    CACHE_HIT_RATIO.track(lambda: stats()['hit_ratio'], cache=name)
+    CACHE_ENTRIES.track(lambda: stats()['entries'], cache=name)
+
+
+def track_coalescer(coalescer):
+    COALESCED_RATIO.track(lambda: coalescer.stats()['coalesced_ratio'], coalescer=coalescer.name)
+    COALESCER_IN_FLIGHT.track(lambda: coalescer.stats()['in_flight'], coalescer=coalescer.name)
+
+
+def record_request(route, method, status, elapsed):
+    HTTP_DURATION.observe(elapsed, route=route, method=method)
+    HTTP_REQUESTS.inc(route=route, method=method, status=str(status))
+    routes.record(route, status < 500, f'HTTP {status}' if status >= 500 else None)
+
+
+def instrument(app, registry=REGISTRY, path='/metrics'):
+    """Per-route metrics for a Flask app, exposed on ``path``"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            record_request(route, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def _end_request(error=None):
+        if g.pop('metrics_started', None) is not None:
+            HTTP_IN_FLIGHT.dec()
+
+    def metrics_endpoint():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule(path, 'metrics', metrics_endpoint)
+    return app
@@ -2,199 +2,261 @@
 """
 FinDeus - Netlify Function Handler with Real AI APIs
 ==================================================
+
+Everything that does not depend on the request is built once at module
+load and reused by warm invocations: configuration, response headers, the
+route table and a keep-alive ``requests.Session`` whose connection pool
+keeps the TLS connection to the OpenAI API open between invocations.
+Each response reports whether it was served by a cold or warm container.
+
+Market, portfolio, risk and forecast endpoints are served by the shared
+``api_core`` handlers through its dispatch table, without importing Flask.
+The deployed bundle is read-only, so on Lambda the history store, forecast
+models and symbol index default to ``/tmp``.
 """
 
+import time
+
+_MODULE_START = time.perf_counter()
+
 import json
+import logging
 import os
+import sys
 import requests
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# Shared handlers live at the repository root (bundled via included_files)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# Set before api_core pulls in the modules that read them
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    os.environ.setdefault('HISTORY_STORE_PATH', '/tmp/findeus/history')
+    os.environ.setdefault('FORECAST_MODEL_PATH', '/tmp/findeus/models')
+    os.environ.setdefault('SYMBOL_INDEX_PATH', '/tmp/findeus/reference/symbols.idx')
+
+import api_core
+
+# The Lambda runtime installs its own root handler, so only the level is set here
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+OPENAI_CHAT_URL = 'https://api.openai.com/v1/chat/completions'
+OPENAI_MODEL = 'gpt-3.5-turbo'
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 30))
+SYSTEM_PROMPT = 'You are FinDeus, a highly knowledgeable financial AI assistant. You provide expert financial advice, market analysis, and investment guidance with professional authority. Always give practical, actionable advice while maintaining a professional tone.'
+SERVICE_NAME = 'FinDeus Financial Intelligence'
+
+# CORS headers
+HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Expose-Headers': 'Server-Timing, X-Cold-Start, X-Invocation',
+    'Content-Type': 'application/json'
+}
+ERROR_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Content-Type': 'application/json'
+}
+OPENAI_HEADERS = {
+    'Authorization': f'Bearer {OPENAI_API_KEY}',
+    'Content-Type': 'application/json'
+}
+
+
+def create_session():
+    """Keep-alive session reused across warm invocations"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount('https://', adapter)
+    session.headers.update(OPENAI_HEADERS)
+    return session
+
+
+SESSION = create_session()
+
+# Warm-container bookkeeping
+_invocations = 0
+_INIT_MS = (time.perf_counter() - _MODULE_START) * 1000
+
+
+def respond(status, payload, headers=HEADERS):
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'body': json.dumps(payload)
+    }
+
+
+def guidance(model, text):
+    return respond(200, {
+        'response': text,
+        'timestamp': datetime.now().isoformat(),
+        'model': model,
+        'service': SERVICE_NAME
+    })
+
+
+def health(request):
+    return respond(200, {
+        'status': 'healthy',
+        'service': 'FinDeus - Financial Intelligence',
+        'timestamp': datetime.now().isoformat(),
+        'version': '2.0.0',
+        'openai_configured': bool(OPENAI_API_KEY),
+        'warm': {
+            'invocations': _invocations,
+            'init_ms': round(_INIT_MS, 1)
+        },
+        'debug': {
+            'method': request['method'],
+            'path': request['path'],
+            'query_params': request['query_params'],
+            'route': request['route']
+        }
+    })
+
+
+def ai_query(request):
+    query = request['body'].get('query', '')
+
+    if not query:
+        return respond(400, {'error': 'Query is required'})
+
+    if not OPENAI_API_KEY:
+        return guidance('general-guidance', f'I appreciate your question about "{query}". While I\'m currently operating in limited mode, I can provide general financial guidance: Focus on building an emergency fund, diversify your investments, understand your risk tolerance, and consider long-term investment strategies.')
+
+    # Call OpenAI API over the pooled connection
+    try:
+        response = SESSION.post(
+            OPENAI_CHAT_URL,
+            json={
+                'model': OPENAI_MODEL,
+                'messages': [
+                    {'role': 'system', 'content': SYSTEM_PROMPT},
+                    {'role': 'user', 'content': query}
+                ],
+                'max_tokens': 1000,
+                'temperature': 0.7
+            },
+            timeout=OPENAI_TIMEOUT
+        )
+
+        if response.status_code == 200:
+            result = response.json()
+            return guidance(OPENAI_MODEL, result['choices'][0]['message']['content'])
+
+        return guidance('fallback', f'I understand you\'re asking about "{query}". While I\'m experiencing some technical difficulties, I can provide general financial guidance. For specific investment advice, I recommend consulting with a qualified financial advisor.')
+
+    except Exception:
+        return guidance('fallback', f'Thank you for your question about "{query}". I\'m currently experiencing some technical issues, but I can offer this general advice: Always diversify your investments, understand your risk tolerance, and consider consulting with a financial professional.')
+
+
+# route -> {method: handler}; '*' matches any method. Everything else is
+# looked up in the api_core dispatch table.
+ROUTES = {
+    '/api/health': {'*': health},
+    '/api/ai/query': {'POST': ai_query},
+}
+AVAILABLE_ROUTES = list(ROUTES) + [pattern for _, pattern, _ in api_core.ROUTES]
+
+
+def parse_request(event):
+    method = event.get('httpMethod', 'GET')
+    path = event.get('path', '/')
+    query_params = event.get('queryStringParameters') or {}
+
+    # Determine the route from query parameters, falling back to the path
+    route = f"/api/{query_params['path']}" if 'path' in query_params else path
+
+    body_data = {}
+    body = event.get('body', '')
+    if body:
+        try:
+            body_data = json.loads(body)
+        except ValueError:
+            pass
+
+    return {
+        'method': method,
+        'path': path,
+        'query_params': query_params,
+        'route': route,
+        'body': body_data
+    }
+
+
+def dispatch(event):
+    # Handle preflight requests
+    if event.get('httpMethod') == 'OPTIONS':
+        return respond(200, {'message': 'CORS preflight'})
+
+    request = parse_request(event)
+    methods = ROUTES.get(request['route'], {})
+    route_handler = methods.get(request['method']) or methods.get('*')
+    if route_handler is not None:
+        return route_handler(request)
+
+    core_handler, path_params = api_core.match(request['route'], request['method'])
+    if core_handler is not None:
+        query = {k: v for k, v in request['query_params'].items() if k != 'path'}
+        payload, status = core_handler(api_core.request_params(query, request['body'], path_params))
+        return respond(status, payload)
+
+    # Default response for unhandled routes
+    return respond(404, {
+        'error': 'Route not found',
+        'route': request['route'],
+        'method': request['method'],
+        'available_routes': AVAILABLE_ROUTES,
+        'debug': {
+            'path': request['path'],
+            'query_params': request['query_params'],
+            'event': event
+        }
+    })
+
 
 def handler(event, context):
     """
     Netlify serverless function for FinDeus AI - God of Finance
     """
+    global _invocations
+    started = time.perf_counter()
+    _invocations += 1
+    cold = _invocations == 1
+
     try:
-        # Get environment variables
-        openai_key = os.environ.get('OPENAI_API_KEY', '')
-        
-        # CORS headers
-        headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Content-Type': 'application/json'
-        }
-        
-        # Handle preflight requests
-        if event.get('httpMethod') == 'OPTIONS':
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps({'message': 'CORS preflight'})
-            }
-        
-        # Parse the request
-        method = event.get('httpMethod', 'GET')
-        path = event.get('path', '/')
-        query_params = event.get('queryStringParameters') or {}
-        body = event.get('body', '')
-        
-        # Debug logging
-        print(f"Debug - Method: {method}, Path: {path}, Query: {query_params}")
-        
-        # Determine the route from query parameters
-        if 'path' in query_params:
-            api_path = query_params['path']
-            route = f'/api/{api_path}'
-        else:
-            # Fallback to path parsing
-            route = path
-        
-        print(f"Debug - Route determined: {route}")
-        
-        # Parse JSON body
-        body_data = {}
-        if body:
-            try:
-                body_data = json.loads(body)
-            except:
-                pass
-        
-        # Route handling
-        if route == '/api/health':
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps({
-                    'status': 'healthy',
-                    'service': 'FinDeus - Financial Intelligence',
-                    'timestamp': datetime.now().isoformat(),
-                    'version': '2.0.0',
-                    'openai_configured': bool(openai_key),
-                    'debug': {
-                        'method': method,
-                        'path': path,
-                        'query_params': query_params,
-                        'route': route
-                    }
-                })
+        response = dispatch(event)
+    except Exception as e:
+        response = respond(500, {
+            'error': 'Internal server error',
+            'message': str(e),
+            'debug': {
+                'event': event
             }
-        
-        elif route == '/api/ai/query' and method == 'POST':
-            query = body_data.get('query', '')
-            
-            if not query:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Query is required'})
-                }
-            
-            # Call OpenAI API
-            if openai_key:
-                try:
-                    response = requests.post(
-                        'https://api.openai.com/v1/chat/completions',
-                        headers={
-                            'Authorization': f'Bearer {openai_key}',
-                            'Content-Type': 'application/json'
-                        },
-                        json={
-                            'model': 'gpt-3.5-turbo',
-                            'messages': [
-                                {
-                                    'role': 'system',
-                                    'content': 'You are FinDeus, a highly knowledgeable financial AI assistant. You provide expert financial advice, market analysis, and investment guidance with professional authority. Always give practical, actionable advice while maintaining a professional tone.'
-                                },
-                                {
-                                    'role': 'user',
-                                    'content': query
-                                }
-                            ],
-                            'max_tokens': 1000,
-                            'temperature': 0.7
-                        },
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        ai_response = result['choices'][0]['message']['content']
-                        
-                        return {
-                            'statusCode': 200,
-                            'headers': headers,
-                            'body': json.dumps({
-                                'response': ai_response,
-                                'timestamp': datetime.now().isoformat(),
-                                'model': 'gpt-3.5-turbo',
-                                'service': 'FinDeus Financial Intelligence'
-                            })
-                        }
-                    else:
-                        return {
-                            'statusCode': 200,
-                            'headers': headers,
-                            'body': json.dumps({
-                                'response': f'I understand you\'re asking about "{query}". While I\'m experiencing some technical difficulties, I can provide general financial guidance. For specific investment advice, I recommend consulting with a qualified financial advisor.',
-                                'timestamp': datetime.now().isoformat(),
-                                'model': 'fallback',
-                                'service': 'FinDeus Financial Intelligence'
-                            })
-                        }
-                        
-                except Exception as e:
-                    return {
-                        'statusCode': 200,
-                        'headers': headers,
-                        'body': json.dumps({
-                            'response': f'Thank you for your question about "{query}". I\'m currently experiencing some technical issues, but I can offer this general advice: Always diversify your investments, understand your risk tolerance, and consider consulting with a financial professional.',
-                            'timestamp': datetime.now().isoformat(),
-                            'model': 'fallback',
-                            'service': 'FinDeus Financial Intelligence'
-                        })
-                    }
-            else:
-                return {
-                    'statusCode': 200,
-                    'headers': headers,
-                    'body': json.dumps({
-                        'response': f'I appreciate your question about "{query}". While I\'m currently operating in limited mode, I can provide general financial guidance: Focus on building an emergency fund, diversify your investments, understand your risk tolerance, and consider long-term investment strategies.',
-                        'timestamp': datetime.now().isoformat(),
-                        'model': 'general-guidance',
-                        'service': 'FinDeus Financial Intelligence'
-                    })
-                }
-        
-        # Default response for unhandled routes
-        return {
-            'statusCode': 404,
-            'headers': headers,
-            'body': json.dumps({
-                'error': 'Route not found',
-                'route': route,
-                'method': method,
-                'available_routes': ['/api/health', '/api/ai/query'],
-                'debug': {
-                    'path': path,
-                    'query_params': query_params,
-                    'event': event
-                }
-            })
+        }, headers=ERROR_HEADERS)
+
+    handler_ms = (time.perf_counter() - started) * 1000
+    timing = f'handler;dur={handler_ms:.1f}'
+    if cold:
+        timing = f'init;dur={_INIT_MS:.1f}, {timing}'
+    response['headers'] = dict(
+        response['headers'],
+        **{
+            'Server-Timing': timing,
+            'X-Cold-Start': 'true' if cold else 'false',
+            'X-Invocation': str(_invocations)
         }
-        
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'message': str(e),
-                'debug': {
-                    'event': event
-                }
-            })
-        } 
\ No newline at end of file
+    )
+    logger.info(
+        "%s invocation %d: %s %s %d in %.1f ms%s",
+        'cold' if cold else 'warm', _invocations, event.get('httpMethod', 'GET'), event.get('path', '/'),
+        response['statusCode'], handler_ms, f" (init {_INIT_MS:.1f} ms)" if cold else ''
+    )
+    return response
@@ -5,24 +5,31 @@ A simplified version of the Flask app optimized for Netlify deployment
 """
 
 import os
-import json
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from datetime import datetime
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-import openai
-import anthropic
 import threading
 import time
-from functools import wraps
+
+import ai_async
+import api_core
+import metrics
+import response_encoding
+from api_core import upstream
+from ai_streaming import (
+    SSE_HEADERS, SYSTEM_PROMPT, anthropic_deltas, fake_deltas, openai_deltas,
+    sse_stream, wants_stream
+)
+from embedding_codec import OCTET_STREAM, encode_matrix, encode_vector, parse_format, raw_matrix
+from embedding_pipeline import EmbeddingError, EmbeddingPipeline, content_hash, with_retries
+from lazy_imports import lazy_import
+from llm_router import Backend, LLMRouter, RouterError
+from semantic_cache import SemanticCache, normalize_query
+
+# Heavy dependencies are imported on first use by the route that needs them
+openai = lazy_import('openai')
+anthropic = lazy_import('anthropic')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +38,8 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+metrics.instrument(app)
+response_encoding.install(app)
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -40,40 +49,73 @@ OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 
-# Initialize API clients
-openai_client = None
-anthropic_client = None
+# Local fake streaming provider (model 'fake-*') for exercising SSE without keys
+FAKE_AI_PROVIDER = os.environ.get('FAKE_AI_PROVIDER') == '1'
+FAKE_AI_INTERVAL = float(os.environ.get('FAKE_AI_INTERVAL', 0.05))
 
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
-    openai_client = openai
+# API clients are created on first use so cold starts skip the SDK imports
+_clients = {}
+_clients_lock = threading.Lock()
 
-if ANTHROPIC_API_KEY:
-    anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+def get_openai_client():
+    """OpenAI client, or None when no API key is configured"""
+    if not OPENAI_API_KEY:
+        return None
+    with _clients_lock:
+        if 'openai' not in _clients:
+            openai.api_key = OPENAI_API_KEY
+            _clients['openai'] = openai
+        return _clients['openai']
 
-# Cache for market data
-cache = {}
-cache_lock = threading.Lock()
-CACHE_DURATION = 300  # 5 minutes
+def get_anthropic_client():
+    """Anthropic client, or None when no API key is configured"""
+    if not ANTHROPIC_API_KEY:
+        return None
+    with _clients_lock:
+        if 'anthropic' not in _clients:
+            _clients['anthropic'] = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+        return _clients['anthropic']
 
-def cache_result(duration=CACHE_DURATION):
-    """Decorator to cache function results"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            
-            with cache_lock:
-                if cache_key in cache:
-                    result, timestamp = cache[cache_key]
-                    if time.time() - timestamp < duration:
-                        return result
-                
-                result = func(*args, **kwargs)
-                cache[cache_key] = (result, time.time())
-                return result
-        return wrapper
-    return decorator
+# Non-blocking provider calls for the ASGI server (asgi_app.py)
+async_ai = ai_async.AsyncAIClient(OPENAI_API_KEY, ANTHROPIC_API_KEY)
+
+# Cache for AI answers: exact (model, query) tier plus embedding similarity tier
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 3600))
+AI_CACHE_CAPACITY = int(os.environ.get('AI_CACHE_CAPACITY', 1000))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.95))
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.environ.get('SEMANTIC_CACHE_EMBEDDING_MODEL', 'text-embedding-3-small')
+
+def embed_query(text):
+    """Embedding used by the semantic cache tier"""
+    def request_embedding():
+        with metrics.upstream('openai', 'embeddings'):
+            response = get_openai_client().embeddings.create(
+                model=SEMANTIC_CACHE_EMBEDDING_MODEL,
+                input=text
+            )
+        return response.data[0].embedding
+    return upstream.run(f"embed:{content_hash(text, SEMANTIC_CACHE_EMBEDDING_MODEL)}", request_embedding)
+
+async def embed_query_async(text):
+    """Async ``embed_query``"""
+    async def request_embedding():
+        return (await async_ai.embeddings(SEMANTIC_CACHE_EMBEDDING_MODEL, text))[0]
+    return await upstream.arun(f"embed:{content_hash(text, SEMANTIC_CACHE_EMBEDDING_MODEL)}", request_embedding)
+
+ai_cache = SemanticCache(
+    embed=embed_query if OPENAI_API_KEY else None,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl=AI_CACHE_TTL,
+    capacity=AI_CACHE_CAPACITY
+)
+metrics.CACHE_HIT_RATIO.track(lambda: ai_cache.stats()['hit_ratio'], cache='ai')
+metrics.CACHE_ENTRIES.track(lambda: ai_cache.stats()['exact_entries'], cache='ai')
+
+def core_view(handler, **path_params):
+    """Serve a framework-free api_core handler through Flask"""
+    params = api_core.request_params(request.args.to_dict(), request.get_json(silent=True), path_params)
+    payload, status = handler(params)
+    return jsonify(payload), status
 
 # Health Check Endpoint
 @app.route('/', methods=['GET'])
@@ -85,135 +127,633 @@ def root():
         'available_endpoints': [
             '/api/health',
             '/api/ai/query',
-            '/api/embeddings/generate'
+            '/api/market/realtime/<symbol>',
+            '/api/market/batch',
+            '/api/market/reference',
+            '/api/market/history/<symbol>',
+            '/api/market/indicators',
+            '/api/portfolio/analyze',
+            '/api/portfolio/upload',
+            '/api/portfolio/optimize',
+            '/api/analysis/risk',
+            '/api/analysis/covariance',
+            '/api/predictions/forecast',
+            '/api/embeddings/generate',
+            '/api/embeddings/search',
+            '/metrics'
         ]
     })
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
+def health_status():
+    """Health payload shared by the Flask and ASGI servers"""
     services = {
         'openai': bool(OPENAI_API_KEY),
         'anthropic': bool(ANTHROPIC_API_KEY),
         'pinecone': bool(PINECONE_API_KEY),
         'yfinance': True
     }
+    upstreams = metrics.upstreams.states(('openai', 'anthropic', 'yfinance'))
     
-    return jsonify({
-        'status': 'healthy',
+    return {
+        'status': 'degraded' if any(u['state'] == 'down' for u in upstreams.values()) else 'healthy',
         'timestamp': datetime.now().isoformat(),
         'services': services,
+        'upstreams': upstreams,
+        'cache': api_core.market_cache.stats(),
+        'ai_cache': ai_cache.stats(),
+        'ai_router': ai_router.stats(),
+        'coalescing': upstream.stats(),
         'version': '1.0.0'
-    })
+    }
 
-# Market Data Endpoints
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify(health_status())
+
+# Market, Portfolio and Prediction Endpoints (shared with the Netlify function)
 @app.route('/api/market/realtime/<symbol>', methods=['GET'])
-@cache_result(60)  # Cache for 1 minute
 def get_realtime_data(symbol):
     """Get real-time market data"""
-    try:
-        ticker = yf.Ticker(symbol.upper())
-        info = ticker.info
-        
-        return jsonify({
-            'symbol': symbol.upper(),
-            'name': info.get('longName', symbol.upper()),
-            'price': info.get('currentPrice', 0),
-            'change': info.get('regularMarketChange', 0),
-            'change_percent': info.get('regularMarketChangePercent', 0),
-            'volume': info.get('regularMarketVolume', 0),
-            'market_cap': info.get('marketCap', 0),
-            'pe_ratio': info.get('trailingPE', 0),
-            'timestamp': datetime.now().isoformat()
-        })
-    except Exception as e:
-        logger.error(f"Error getting realtime data for {symbol}: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+    return core_view(api_core.market_realtime, symbol=symbol)
+
+@app.route('/api/market/batch', methods=['GET', 'POST'])
+def get_batch_quotes():
+    """Get quotes for many symbols in one call"""
+    return core_view(api_core.market_batch)
+
+@app.route('/api/market/reference', methods=['GET'])
+def get_reference():
+    """Static reference data for many symbols from the local index"""
+    return core_view(api_core.market_reference)
+
+@app.route('/api/market/history/<symbol>', methods=['GET'])
+def get_history(symbol):
+    """OHLCV bars from the local history store, refreshed incrementally"""
+    return core_view(api_core.market_history, symbol=symbol)
+
+@app.route('/api/market/indicators', methods=['GET'])
+def get_indicators():
+    """Technical indicators for many symbols from the local history store"""
+    return core_view(api_core.market_indicators)
+
+@app.route('/api/portfolio/analyze', methods=['POST'])
+def portfolio_analyze():
+    """Portfolio analysis endpoint"""
+    return core_view(api_core.portfolio_analyze)
+
+@app.route('/api/portfolio/optimize', methods=['POST'])
+def portfolio_optimize():
+    """Mean-variance portfolios and the efficient frontier"""
+    return core_view(api_core.portfolio_optimize)
+
+@app.route('/api/portfolio/upload', methods=['POST'])
+def portfolio_upload():
+    """Portfolio analysis of a streamed CSV or NDJSON holdings file"""
+    params = api_core.request_params(request.args.to_dict())
+    payload, status = api_core.portfolio_upload(params, api_core.read_chunks(request.stream), request.mimetype)
+    return jsonify(payload), status
+
+@app.route('/api/analysis/risk', methods=['POST'])
+def risk_analysis():
+    """Risk analysis endpoint"""
+    return core_view(api_core.risk_analysis)
+
+@app.route('/api/analysis/covariance', methods=['GET', 'POST'])
+def covariance_matrix():
+    """Sample, EWMA or Ledoit-Wolf covariance over stored returns"""
+    return core_view(api_core.covariance_matrix)
+
+@app.route('/api/predictions/forecast', methods=['POST'])
+def forecast():
+    """Price forecasts from per-symbol models trained on stored history"""
+    return core_view(api_core.forecast)
 
 # AI Query Endpoint
-@app.route('/api/ai/query', methods=['POST'])
-def ai_query():
-    """Process AI queries"""
-    try:
-        data = request.get_json()
-        query = data.get('query', '')
-        model = data.get('model', 'gpt-4')
-        
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        if model.startswith('gpt') and openai_client:
-            response = openai_client.chat.completions.create(
+def model_provider(model):
+    """Provider that serves ``model``, or None if it is unavailable"""
+    if model.startswith('gpt') and OPENAI_API_KEY:
+        return 'openai'
+    if model.startswith('claude') and ANTHROPIC_API_KEY:
+        return 'anthropic'
+    if model.startswith('fake') and FAKE_AI_PROVIDER:
+        return 'fake'
+    return None
+
+def fake_answer(query):
+    return f"Fake streamed analysis for: {query}"
+
+def complete_ai_query(model, query):
+    """Run a blocking completion and return the answer text"""
+    provider = model_provider(model)
+    
+    if provider == 'openai':
+        with metrics.upstream('openai', 'chat'):
+            response = get_openai_client().chat.completions.create(
                 model=model,
                 messages=[
-                    {"role": "system", "content": "You are a financial AI assistant. Provide helpful, accurate financial advice and analysis."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": query}
                 ],
                 max_tokens=500,
                 temperature=0.7
             )
-            
-            return jsonify({
-                'response': response.choices[0].message.content,
-                'model': model,
-                'timestamp': datetime.now().isoformat()
-            })
-        
-        elif model.startswith('claude') and anthropic_client:
-            response = anthropic_client.messages.create(
+        return response.choices[0].message.content
+    
+    if provider == 'anthropic':
+        with metrics.upstream('anthropic', 'chat'):
+            response = get_anthropic_client().messages.create(
                 model=model,
                 max_tokens=500,
                 messages=[
                     {"role": "user", "content": f"As a financial AI assistant, please help with: {query}"}
                 ]
             )
-            
+        return response.content[0].text
+    
+    if provider == 'fake':
+        return ''.join(fake_deltas(fake_answer(query), interval=FAKE_AI_INTERVAL))
+    
+    raise ValueError('Model not available or API key missing')
+
+async def complete_ai_query_async(model, query):
+    """Async ``complete_ai_query``"""
+    provider = model_provider(model)
+    if provider == 'openai':
+        return await async_ai.openai_complete(model, query)
+    if provider == 'anthropic':
+        return await async_ai.anthropic_complete(model, query)
+    if provider == 'fake':
+        return ''.join([text async for text in ai_async.fake_deltas(fake_answer(query), interval=FAKE_AI_INTERVAL)])
+    raise ValueError('Model not available or API key missing')
+
+def stream_deltas(model, query):
+    """Token delta iterator for ``model``"""
+    provider = model_provider(model)
+    if provider == 'openai':
+        return openai_deltas(get_openai_client(), model, query)
+    if provider == 'anthropic':
+        return anthropic_deltas(get_anthropic_client(), model, query)
+    if provider == 'fake':
+        return fake_deltas(fake_answer(query), interval=FAKE_AI_INTERVAL)
+    raise ValueError('Model not available or API key missing')
+
+def stream_deltas_async(model, query):
+    """Async token delta iterator for ``model``"""
+    provider = model_provider(model)
+    if provider == 'openai':
+        return async_ai.openai_deltas(model, query)
+    if provider == 'anthropic':
+        return async_ai.anthropic_deltas(model, query)
+    if provider == 'fake':
+        return ai_async.fake_deltas(fake_answer(query), interval=FAKE_AI_INTERVAL)
+    raise ValueError('Model not available or API key missing')
+
+# Live routing across configured models ('auto'), with per-model health stats
+AI_ROUTER_MODELS = os.environ.get('AI_ROUTER_MODELS', 'gpt-4,claude-3-sonnet-20240229,fake-model')
+# Further models clients may request by name; anything else is rejected
+AI_MODELS = os.environ.get(
+    'AI_MODELS', 'gpt-4o,gpt-4o-mini,gpt-3.5-turbo,claude-3-opus-20240229,claude-3-haiku-20240307')
+AI_ROUTER_HEDGE = os.environ.get('AI_ROUTER_HEDGE') == '1'
+# Threads running blocking completions: the cap on concurrent AI queries per process
+AI_ROUTER_WORKERS = int(os.environ.get('AI_ROUTER_WORKERS', 64))
+# Prior answer quality per model family, traded off against observed latency
+MODEL_QUALITY = {'gpt': 0.92, 'claude': 0.89, 'fake': 0.5}
+
+def parse_models(value):
+    return [model.strip() for model in value.split(',') if model.strip()]
+
+def build_router():
+    """Router tracking every configured model whose provider is available"""
+    router = LLMRouter(hedge=AI_ROUTER_HEDGE, max_workers=AI_ROUTER_WORKERS)
+    for model in parse_models(AI_ROUTER_MODELS) + parse_models(AI_MODELS):
+        provider = model_provider(model)
+        if provider is None or model in router.backends:
+            continue
+        quality = next((q for prefix, q in MODEL_QUALITY.items() if model.startswith(prefix)), 0.8)
+        router.add(Backend(model, lambda query, model=model: complete_ai_query(model, query),
+                           provider=provider, quality=quality,
+                           acall=lambda query, model=model: complete_ai_query_async(model, query)))
+    return router
+
+ai_router = build_router()
+# Every allowed model is tracked, but 'auto' only picks the router's own
+auto_models = [model for model in parse_models(AI_ROUTER_MODELS) if model in ai_router.backends]
+
+def model_available(model):
+    """True if ``model`` may be requested: 'auto' or a configured, reachable backend"""
+    return model == 'auto' or model in ai_router.backends
+
+def route_model(model, exclude=()):
+    """Claim the backend for a stream: the best healthy one for 'auto', else ``model``"""
+    if model == 'auto':
+        return ai_router.select([m for m in auto_models if m not in exclude])
+    return model if ai_router.claim(model) else None
+
+def open_stream(model, query):
+    """Start a stream on a routed backend, failing over until one yields a first delta.
+
+    Provider streams are lazy, so the first delta is pulled here, where a
+    failure can still move to another backend; it is chained back in front.
+    Returns ``(model, deltas, started)``.
+    """
+    tried = []
+    for _ in range(ai_router.max_attempts):
+        routed = route_model(model, exclude=tried)
+        if routed is None:
+            break
+        tried.append(routed)
+        started = time.perf_counter()
+        try:
+            deltas = stream_deltas(routed, query)
+            first = next(deltas, None)
+        except Exception as e:
+            ai_router.record(routed, time.perf_counter() - started, False)
+            if model != 'auto':
+                raise
+            logger.warning(f"Could not start stream on {routed}: {str(e)}")
+            continue
+        return routed, prepended(first, deltas), started
+    raise RouterError('No healthy AI backend available')
+
+def prepended(first, deltas):
+    """``first`` (unless None) followed by the rest of ``deltas``, closing it when done"""
+    try:
+        if first is not None:
+            yield first
+        yield from deltas
+    finally:
+        deltas.close()
+
+class RoutedDeltas:
+    """Delta iterator that reports its stream's outcome to the router once.
+
+    Running out records a success and an error a failure. Closing it
+    early, even before the first delta is read (a client that leaves
+    after the start event), releases the claim: that says nothing about
+    the backend.
+    """
+
+    def __init__(self, deltas, model, started):
+        self.deltas = deltas
+        self.model = model
+        self.started = started
+        self.settled = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.deltas)
+        except StopIteration:
+            self.settle(True)
+            raise
+        except Exception:
+            self.settle(False)
+            raise
+
+    def settle(self, outcome):
+        if self.settled:
+            return
+        self.settled = True
+        if outcome is None:
+            ai_router.release(self.model)
+        else:
+            ai_router.record(self.model, time.perf_counter() - self.started, outcome)
+
+    def close(self):
+        self.settle(None)
+        close = getattr(self.deltas, 'close', None)
+        if close is not None:
+            close()
+
+def caching_deltas(deltas, model, query, vector):
+    """Pass deltas through and cache the full answer once the stream completes"""
+    parts = []
+    for text in deltas:
+        parts.append(text)
+        yield text
+    ai_cache.store(model, query, ''.join(parts), vector)
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+@app.route('/api/ai/query', methods=['POST'])
+def ai_query():
+    """Process AI queries"""
+    try:
+        data = request.get_json()
+        query = data.get('query', '')
+        model = data.get('model', 'gpt-4')
+        
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+        
+        if not model_available(model):
+            return jsonify({'error': 'Model not available or API key missing'}), 400
+        
+        stream = wants_stream(data, request.args)
+        cached = ai_cache.lookup(model, query)
+        
+        if cached.answer is not None:
+            if stream:
+                return sse_response(sse_stream(iter([cached.answer]), model, 'cache'))
             return jsonify({
-                'response': response.content[0].text,
+                'response': cached.answer,
                 'model': model,
+                'cached': cached.tier,
+                'similarity': round(cached.score, 4),
                 'timestamp': datetime.now().isoformat()
             })
         
-        else:
-            return jsonify({'error': 'Model not available or API key missing'}), 400
+        if stream:
+            routed, deltas, started = open_stream(model, query)
+            deltas = RoutedDeltas(caching_deltas(deltas, model, query, cached.vector), routed, started)
+            return sse_response(sse_stream(deltas, routed, model_provider(routed), started=started))
+        
+        candidates = auto_models if model == 'auto' else [model]
+        
+        def complete():
+            result = ai_router.complete(query, candidates=candidates)
+            ai_cache.store(model, query, result.answer, cached.vector)
+            return result
+        
+        result = upstream.run(f"ai:{model}:{normalize_query(query)}", complete)
+        
+        return jsonify({
+            'response': result.answer,
+            'model': result.backend,
+            'latency_ms': result.latency_ms,
+            'hedged': result.hedged,
+            'timestamp': datetime.now().isoformat()
+        })
     
+    except RouterError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error processing AI query: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 # Document Processing
+EMBEDDING_MODEL = "text-embedding-ada-002"
+VECTOR_INDEX_PATH = os.environ.get('VECTOR_INDEX_PATH')
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', 4))
+
+vector_index_module = lazy_import('vector_index')
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+def get_vector_index(dim=None):
+    """Process-wide vector index, loaded from VECTOR_INDEX_PATH on first use"""
+    global _vector_index
+    if _vector_index is None:
+        if VECTOR_INDEX_PATH and os.path.exists(os.path.join(VECTOR_INDEX_PATH, 'manifest.json')):
+            _vector_index = vector_index_module.VectorIndex.load(VECTOR_INDEX_PATH)
+        elif dim is not None:
+            _vector_index = vector_index_module.VectorIndex(dim)
+    return _vector_index
+
+def embed_texts(texts):
+    """One embeddings request for many inputs; identical in-flight batches share it"""
+    key = f"embed:{content_hash(chr(0).join(texts), EMBEDDING_MODEL)}"
+    return upstream.run(key, lambda: request_embeddings(texts))
+
+async def embed_texts_async(texts):
+    """Async ``embed_texts``"""
+    key = f"embed:{content_hash(chr(0).join(texts), EMBEDDING_MODEL)}"
+    return await upstream.arun(key, lambda: async_ai.embeddings(EMBEDDING_MODEL, texts))
+
+def get_embeddings_client():
+    """OpenAI client without SDK retries; the embedding pipeline retries batches itself"""
+    if not OPENAI_API_KEY:
+        return None
+    with _clients_lock:
+        if 'openai_embeddings' not in _clients:
+            _clients['openai_embeddings'] = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+        return _clients['openai_embeddings']
+
+def request_embeddings(texts):
+    """Call the embeddings API, mapping provider errors to ones the pipeline retries"""
+    try:
+        with metrics.upstream('openai', 'embeddings'):
+            response = get_embeddings_client().embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=texts
+            )
+    except openai.APITimeoutError as e:
+        raise TimeoutError(str(e)) from e
+    except openai.APIConnectionError as e:
+        raise ConnectionError(str(e)) from e
+    except Exception as e:
+        status = getattr(e, 'status_code', None)
+        if status is None:
+            raise
+        response = getattr(e, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        raise EmbeddingError(
+            str(e), status=status,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+        ) from e
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def store_embeddings(records):
+    """Pipeline sink: append finished batches to the local vector index"""
+    with _vector_index_lock:
+        index = get_vector_index(dim=len(records[0]['embedding']))
+        fresh = [r for r in records if r['id'] not in index]
+        if fresh:
+            index.add(
+                [r['id'] for r in fresh],
+                [r['embedding'] for r in fresh],
+                [dict(r['metadata'], text=r['text']) for r in fresh]
+            )
+
+def parse_metadata(value):
+    """Document metadata from a request: a JSON object, or {} when absent"""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError('metadata must be an object')
+    return value
+
+def index_document(doc_id, text, embedding, metadata):
+    """Add one embedded document to the local index (and persist it) if new"""
+    with _vector_index_lock:
+        index = get_vector_index(dim=len(embedding))
+        if doc_id not in index:
+            index.add([doc_id], [embedding], [{'text': text, **metadata}])
+            if VECTOR_INDEX_PATH:
+                index.save(VECTOR_INDEX_PATH)
+
+def search_index(embedding, k, exact=None):
+    """``(matches, index_size, search_ms)``, or None when the index is empty"""
+    with _vector_index_lock:
+        index = get_vector_index()
+        if index is None or len(index) == 0:
+            return None
+        started = time.perf_counter()
+        matches = index.search(embedding, k=k, exact=exact)
+        return matches, len(index), (time.perf_counter() - started) * 1000
+
+def is_embedded(key):
+    index = get_vector_index()
+    return index is not None and key in index
+
+def ingest_texts(texts, store, options):
+    """Chunk, dedupe and embed a list of texts through the batching pipeline"""
+    records = []
+    
+    def sink(batch):
+        if store:
+            store_embeddings(batch)
+        else:
+            records.extend(batch)
+    
+    pipeline = EmbeddingPipeline(
+        embed_batch=embed_texts,
+        sink=sink,
+        is_embedded=is_embedded if store else None,
+        model=EMBEDDING_MODEL,
+        max_concurrency=EMBEDDING_CONCURRENCY,
+        chunk_words=int(options.get('chunk_words', 200)),
+        overlap_words=int(options.get('overlap_words', 40))
+    )
+    summary = pipeline.ingest(texts)
+    
+    if store and summary['embedded'] and VECTOR_INDEX_PATH:
+        with _vector_index_lock:
+            get_vector_index().save(VECTOR_INDEX_PATH)
+    
+    # Batches finish out of order; return chunks in document order
+    records.sort(key=lambda r: (r['metadata']['document'], r['metadata']['chunk']))
+    return summary, records
+
+def raw_batch(summary, records, fmt):
+    """``(body, headers)`` for a raw batch response, or ``(error, None)``.
+
+    Raw rows carry no ids, so a batch with failed chunks is an error
+    rather than a body with rows silently missing.
+    """
+    if not records:
+        return 'No embeddings produced', None
+    if summary['failed']:
+        return f"{summary['failed']} of {summary['chunks']} chunks failed to embed", None
+    rows = [(r['metadata']['document'], r['metadata']['chunk']) for r in records]
+    return raw_matrix([r['embedding'] for r in records], fmt or 'f32', rows=rows)
+
+def ingest_result(summary, records, store, fmt):
+    """JSON payload for a multi-document embedding request"""
+    result = {'summary': summary, 'timestamp': datetime.now().isoformat()}
+    if not store:
+        result['ids'] = [r['id'] for r in records]
+        result['metadata'] = [r['metadata'] for r in records]
+        if fmt and records:
+            result['embeddings'] = encode_matrix([r['embedding'] for r in records], fmt)
+        else:
+            result['embeddings'] = [r['embedding'] for r in records]
+    return result
+
 @app.route('/api/embeddings/generate', methods=['POST'])
 def generate_embeddings():
     """Generate embeddings for documents"""
     try:
         data = request.get_json()
         text = data.get('text', '')
+        texts = data.get('texts')
+        fmt = parse_format(data.get('format') or request.args.get('format'))
+        raw = data.get('encoding') == 'raw' or request.accept_mimetypes.best == OCTET_STREAM
         
-        if not text:
+        if not text and not texts:
             return jsonify({'error': 'Text is required'}), 400
+        if texts is not None and not isinstance(texts, list):
+            return jsonify({'error': 'texts must be a list'}), 400
+        metadata = parse_metadata(data.get('metadata'))
         
+        openai_client = get_openai_client()
         if not openai_client:
             return jsonify({'error': 'OpenAI API key not configured'}), 400
         
-        # Generate embeddings
-        response = openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        
-        embedding = response.data[0].embedding
+        # Many documents: chunked, deduplicated, batched and embedded concurrently
+        if texts:
+            store = bool(data.get('store'))
+            summary, records = ingest_texts(texts, store, data)
+            
+            if raw and not store:
+                body, headers = raw_batch(summary, records, fmt)
+                if headers is None:
+                    return jsonify({'summary': summary, 'error': body}), 502
+                return Response(body, mimetype=OCTET_STREAM, headers=headers)
+            
+            return jsonify(ingest_result(summary, records, store, fmt))
         
-        return jsonify({
+        # Generate embeddings; the client has SDK retries off, so retry transient errors here
+        embedding = with_retries(lambda: embed_texts([text]), max_retries=2)[0]
+        result = {
             'text': text[:100] + '...' if len(text) > 100 else text,
             'embedding_dimension': len(embedding),
-            'embedding': embedding,
+            'embedding': encode_vector(embedding, fmt) if fmt else embedding,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        
+        # Optionally keep the vector in the local index for /api/embeddings/search
+        if data.get('store'):
+            doc_id = str(data.get('id') or content_hash(text, EMBEDDING_MODEL))
+            index_document(doc_id, text, embedding, metadata)
+            result['id'] = doc_id
+        
+        return jsonify(result)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error generating embeddings: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/embeddings/search', methods=['POST'])
+def search_embeddings():
+    """Top-k documents from the local vector index"""
+    try:
+        data = request.get_json()
+        query = data.get('query', '')
+        embedding = data.get('embedding')
+        k = int(data.get('k', 5))
+        
+        if not query and embedding is None:
+            return jsonify({'error': 'Query or embedding is required'}), 400
+        
+        if embedding is None:
+            openai_client = get_openai_client()
+            if not openai_client:
+                return jsonify({'error': 'OpenAI API key not configured'}), 400
+            with metrics.upstream('openai', 'embeddings'):
+                embedding = openai_client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=query
+                ).data[0].embedding
+        
+        found = search_index(embedding, k, exact=data.get('exact'))
+        if found is None:
+            return jsonify({'error': 'Vector index is empty'}), 404
+        matches, index_size, elapsed_ms = found
+        
+        return jsonify({
+            'matches': matches,
+            'index_size': index_size,
+            'search_ms': round(elapsed_ms, 3),
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching embeddings: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Error Handlers
 @app.errorhandler(404)
 def not_found(error):
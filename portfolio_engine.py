@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Portfolio Analytics Engine
+====================================
+
+Vectorized holdings analytics used by /api/portfolio/analyze.
+
+Holdings are turned into column arrays once; everything after that
+(duplicate-symbol netting, weights, sector and asset-class exposure,
+concentration, returns and risk contributions) is NumPy grouping and
+matrix-vector work, so a 10,000-position book costs a few milliseconds
+beyond parsing.
+
+Risk comes from a ``RiskModel``: the covariance matrix and return history
+of the symbols with stored prices, normally taken from the cached
+covariance service, so repeated analyses only pay for one matvec. The
+optional minimum-variance comparison is a full QP over the held names and
+is only run on request.
+"""
+
+import numpy as np
+
+from covariance import ledoit_wolf_shrinkage, shrink
+from portfolio_optimizer import min_variance_hint
+
+TRADING_DAYS = 252
+MAX_POSITIONS = 250_000
+TOP_HOLDINGS = 10
+UNCLASSIFIED = 'Unclassified'
+DEFAULT_ASSET_CLASS = 'Equity'
+HOLDING_FIELDS = ('symbol', 'value', 'quantity', 'price', 'cost_basis', 'sector', 'asset_class')
+
+# Thresholds behind the generated recommendations
+MAX_POSITION_WEIGHT = 0.10
+MAX_SECTOR_WEIGHT = 0.40
+MIN_EFFECTIVE_POSITIONS = 10
+RISK_WEIGHT_RATIO = 1.5
+MIN_RISK_CONTRIBUTION = 0.05
+OPTIMIZE_HINT_MAX = 500  # covered positions; larger books skip the min-variance comparison
+
+
+def _float_column(holdings, key):
+    """Float array of ``key`` across holdings, NaN where missing"""
+    # NumPy maps None to NaN for float arrays
+    return np.array([h.get(key) for h in holdings], dtype=np.float64)
+
+
+def _label_column(holdings, key, default):
+    return np.array([str(h.get(key) or default) for h in holdings], dtype=object)
+
+
+def holdings_columns(holdings):
+    """Column arrays from holdings rows or an already columnar payload.
+
+    Each holding has ``symbol`` and either ``value`` or ``quantity`` and
+    ``price``, plus optional ``cost_basis`` (total cost), ``sector`` and
+    ``asset_class``. Returns ``symbol``, ``value``, ``cost_basis``,
+    ``sector`` and ``asset_class`` arrays.
+    """
+    if isinstance(holdings, dict):
+        count = len(holdings.get('symbol') if holdings.get('symbol') is not None else [])
+        if any(holdings.get(key) is not None and len(holdings[key]) not in (0, count)
+               for key in HOLDING_FIELDS):
+            raise ValueError('Holdings columns must all have the same length')
+        rows = None
+    else:
+        if not isinstance(holdings, list) or not all(isinstance(h, dict) for h in holdings):
+            raise ValueError('Holdings must be a list of objects or a dict of columns')
+        count = len(holdings)
+        rows = holdings
+    if count == 0:
+        raise ValueError('Holdings data required')
+    if count > MAX_POSITIONS:
+        raise ValueError(f'At most {MAX_POSITIONS:,} positions are supported')
+
+    if rows is None:
+        def floats(key):
+            values = holdings.get(key)
+            if values is None or len(values) == 0:
+                return np.full(count, np.nan)
+            return np.array(values, dtype=np.float64)
+
+        def labels(key, default):
+            values = holdings.get(key)
+            if values is None or len(values) == 0:
+                return np.full(count, default, dtype=object)
+            values = np.array(values, dtype=object)
+            values[np.equal(values, None) | np.equal(values, '')] = default
+            return values.astype(str).astype(object)
+    else:
+        def floats(key):
+            return _float_column(rows, key)
+
+        def labels(key, default):
+            return _label_column(rows, key, default)
+
+    symbols = np.char.upper(labels('symbol', '').astype(str))
+    if (symbols == '').any():
+        raise ValueError('Every holding needs a symbol')
+
+    value = floats('value')
+    missing = np.isnan(value)
+    if missing.any():
+        value[missing] = (floats('quantity') * floats('price'))[missing]
+    if np.isnan(value).any():
+        bad = symbols[np.isnan(value)][0]
+        raise ValueError(f'Holding {bad} needs a value or quantity and price')
+    if not np.isfinite(value).all():
+        raise ValueError('Holding values must be finite numbers')
+
+    return {
+        'symbol': symbols,
+        'value': value,
+        'cost_basis': floats('cost_basis'),
+        'sector': labels('sector', UNCLASSIFIED),
+        'asset_class': labels('asset_class', DEFAULT_ASSET_CLASS),
+    }
+
+
+def net_positions(columns):
+    """Merge rows of the same symbol; the first row's labels are kept"""
+    symbols, first, inverse = np.unique(columns['symbol'], return_index=True, return_inverse=True)
+    if symbols.size == columns['symbol'].size:
+        order = np.argsort(columns['symbol'], kind='stable')
+        return {name: values[order] for name, values in columns.items()}
+
+    cost = columns['cost_basis']
+    known = ~np.isnan(cost)
+    cost_sum = np.bincount(inverse, weights=np.where(known, cost, 0.0), minlength=symbols.size)
+    has_cost = np.bincount(inverse, weights=known, minlength=symbols.size) > 0
+    return {
+        'symbol': symbols,
+        'value': np.bincount(inverse, weights=columns['value'], minlength=symbols.size),
+        'cost_basis': np.where(has_cost, cost_sum, np.nan),
+        'sector': columns['sector'][first],
+        'asset_class': columns['asset_class'][first],
+    }
+
+
+def group_totals(labels, values):
+    """``(names, totals)`` per label, largest absolute total first"""
+    names, inverse = np.unique(labels, return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=names.size)
+    order = np.argsort(-np.abs(totals), kind='stable')
+    return names[order], totals[order]
+
+
+class RiskModel:
+    """Covariance and return history for a sorted symbol universe"""
+
+    def __init__(self, symbols, returns, cov=None):
+        symbols = np.asarray(symbols, dtype=str)
+        returns = np.asarray(returns)
+        if returns.ndim != 2 or returns.shape[0] < 2:
+            raise ValueError('At least two periods of returns are required')
+        if cov is None:
+            cov = np.atleast_2d(np.cov(returns.astype(np.float64), rowvar=False))
+        order = np.argsort(symbols, kind='stable')
+        if (order != np.arange(order.size)).any():
+            symbols, returns, cov = symbols[order], returns[:, order], cov[np.ix_(order, order)]
+        self.symbols = symbols
+        self.returns = returns
+        self.cov = cov
+
+    @property
+    def nbytes(self):
+        return self.cov.nbytes + self.returns.nbytes + self.symbols.nbytes
+
+    def locate(self, symbols):
+        """Column of each symbol in the model, and a mask of symbols it covers"""
+        symbols = np.asarray(symbols, dtype=str)
+        if self.symbols.size == 0:
+            return np.zeros(symbols.size, dtype=np.intp), np.zeros(symbols.size, dtype=bool)
+        index = np.minimum(np.searchsorted(self.symbols, symbols), self.symbols.size - 1)
+        return index, self.symbols[index] == symbols
+
+
+def risk_contributions(cov, weights):
+    """Volatility and each asset's share of it (Euler decomposition)"""
+    # Match the matrix dtype so a float32 covariance is not upcast wholesale
+    marginal = (cov @ weights.astype(cov.dtype)).astype(np.float64)
+    variance = float(weights @ marginal)
+    if variance <= 0:
+        return 0.0, np.zeros_like(weights)
+    return float(np.sqrt(variance)), weights * marginal / variance
+
+
+def diversification_score(hhi):
+    """0-10 score from the effective number of positions (1 / HHI)"""
+    return round(float(np.clip(10 * (1 - np.sqrt(hhi)), 0, 10)), 1)
+
+
+def risk_score(volatility):
+    """1-10 score from annualized volatility; 20% maps to 5"""
+    return round(float(np.clip(volatility * 25, 1, 10)), 1)
+
+
+def _recommendations(report, top_weight, top_symbol):
+    advice = []
+    if top_weight > MAX_POSITION_WEIGHT:
+        advice.append(f'{top_symbol} is {top_weight:.0%} of the portfolio; consider trimming it '
+                      f'below {MAX_POSITION_WEIGHT:.0%}')
+    for sector in report['sectors']:
+        if sector['name'] != UNCLASSIFIED and sector['percentage'] > MAX_SECTOR_WEIGHT * 100:
+            advice.append(f"{sector['name']} exposure is {sector['percentage']:.0f}%; "
+                          f"consider reducing it below {MAX_SECTOR_WEIGHT:.0%}")
+    if report['concentration']['effective_positions'] < MIN_EFFECTIVE_POSITIONS:
+        advice.append('Portfolio behaves like fewer than '
+                      f'{MIN_EFFECTIVE_POSITIONS} equal positions; add diversifying holdings')
+
+    risk = report.get('risk')
+    if risk:
+        for holding in risk['top_contributors'][:3]:
+            if (holding['risk_contribution'] >= MIN_RISK_CONTRIBUTION * 100
+                    and holding['risk_contribution'] > RISK_WEIGHT_RATIO * abs(holding['weight'])):
+                advice.append(f"{holding['symbol']} adds {holding['risk_contribution']:.1f}% of risk "
+                              f"from {holding['weight']:.1f}% of value")
+        if 'min_variance' in risk:
+            advice.append('Rebalancing the same holdings toward minimum variance would cut volatility from '
+                          f"{risk['min_variance']['volatility']:.1f}% to "
+                          f"{risk['min_variance']['optimized_volatility']:.1f}%; see /api/portfolio/optimize")
+        if risk['coverage'] < 90:
+            advice.append(f"Only {risk['coverage']:.0f}% of the portfolio has price history; "
+                          'refresh history for full risk coverage')
+    return advice or ['Portfolio is within concentration and sector limits']
+
+
+def shrunk_covariance(returns):
+    """Ledoit-Wolf covariance of ``returns``, well conditioned even with more assets than periods"""
+    centered = returns.astype(np.float64) - returns.mean(axis=0, dtype=np.float64)
+    scatter = centered.T @ centered
+    shrinkage, mu = ledoit_wolf_shrinkage(centered, scatter)
+    return shrink(scatter, shrinkage, mu, scale=1.0 / centered.shape[0])
+
+
+def analyze(columns, risk_model=None, top=TOP_HOLDINGS, include_positions=False, min_variance=False):
+    """Portfolio report from ``holdings_columns`` output and an optional RiskModel.
+
+    ``min_variance`` adds a comparison with the minimum-variance mix of the
+    covered holdings.
+    """
+    positions = net_positions(columns)
+    symbols = positions['symbol']
+    value = positions['value']
+
+    total_value = float(value.sum())
+    if total_value == 0:
+        raise ValueError('Holdings must not net to zero value')
+    weights = value / total_value
+    gross = float(np.abs(value).sum())
+
+    def pct(x):
+        return round(float(x) * 100, 2)
+
+    def exposure(labels):
+        names, totals = group_totals(labels, weights)
+        return [{'name': str(name), 'percentage': pct(total)} for name, total in zip(names, totals)]
+
+    top_index = np.argsort(-np.abs(weights), kind='stable')[:top]
+    hhi = float(weights @ weights)
+
+    report = {
+        'total_value': round(total_value, 2),
+        'gross_exposure': round(gross, 2),
+        'positions': int(symbols.size),
+        'sectors': exposure(positions['sector']),
+        'asset_classes': exposure(positions['asset_class']),
+        'top_holdings': [
+            {'symbol': str(symbols[i]), 'value': round(float(value[i]), 2), 'weight': pct(weights[i])}
+            for i in top_index
+        ],
+        'concentration': {
+            'hhi': round(hhi, 4),
+            'effective_positions': round(1 / hhi, 1) if hhi > 0 else 0.0,
+            'largest_weight': pct(np.abs(weights).max()),
+        },
+        'diversification_score': diversification_score(hhi),
+        'total_return': None,
+        'return_basis': None,
+        'risk_score': None,
+    }
+
+    # Return on cost for positions with a cost basis
+    cost = positions['cost_basis']
+    known = ~np.isnan(cost)
+    cost_total = float(cost[known].sum())
+    if known.any() and cost_total != 0:
+        report['total_return'] = pct(value[known].sum() / cost_total - 1)
+        report['unrealized_pnl'] = round(float(value[known].sum() - cost_total), 2)
+        report['return_basis'] = 'cost_basis'
+
+    contributions = None
+    if risk_model is not None:
+        index, covered = risk_model.locate(symbols)
+        if covered.any():
+            covered_weights = weights[covered]
+            # Weights laid out on the model's universe: full matvecs, no submatrix copy
+            model_weights = np.zeros(risk_model.symbols.size)
+            model_weights[index[covered]] = covered_weights
+            volatility, share = risk_contributions(risk_model.cov, model_weights)
+            contributions = np.zeros_like(weights)
+            contributions[covered] = share[index[covered]]
+            annual_vol = volatility * np.sqrt(TRADING_DAYS)
+
+            # Realized return of the covered sleeve, not diluted by the uncovered rest of the book
+            covered_total = covered_weights.sum()
+            period_returns = risk_model.returns @ model_weights
+            if covered_total != 0:
+                period_returns = period_returns / covered_total
+            realized = float(np.prod(1 + period_returns) - 1)
+            if report['return_basis'] is None:
+                report['total_return'] = pct(realized)
+                report['return_basis'] = 'history'
+
+            by_risk = np.argsort(-np.abs(contributions), kind='stable')[:top]
+            sector_names, sector_risk = group_totals(positions['sector'], contributions)
+            report['risk'] = {
+                'volatility': pct(annual_vol),
+                'realized_return': pct(realized),
+                'observations': int(risk_model.returns.shape[0]),
+                'coverage': pct(np.abs(covered_weights).sum() / np.abs(weights).sum()),
+                'covered_positions': int(covered.sum()),
+                'top_contributors': [
+                    {'symbol': str(symbols[i]), 'weight': pct(weights[i]),
+                     'risk_contribution': pct(contributions[i])}
+                    for i in by_risk
+                ],
+                'sector_contributions': [
+                    {'name': str(name), 'percentage': pct(total)}
+                    for name, total in zip(sector_names, sector_risk)
+                ],
+            }
+            report['risk_score'] = risk_score(annual_vol)
+
+            # Compare with a long-only minimum-variance mix of the same names. A
+            # sample covariance is singular once names outnumber periods, and the
+            # optimizer would drive that to zero volatility, so this uses Ledoit-Wolf
+            if min_variance and 2 <= covered.sum() <= OPTIMIZE_HINT_MAX:
+                held = index[covered]
+                hint = min_variance_hint(
+                    risk_model.symbols[held], shrunk_covariance(risk_model.returns[:, held]), covered_weights,
+                    positions['sector'][covered], MAX_POSITION_WEIGHT, MAX_SECTOR_WEIGHT
+                )
+                if hint is not None:
+                    report['risk']['min_variance'] = {
+                        'volatility': pct(hint[0] * np.sqrt(TRADING_DAYS)),
+                        'optimized_volatility': pct(hint[1] * np.sqrt(TRADING_DAYS)),
+                    }
+
+    report['recommendations'] = _recommendations(
+        report, float(np.abs(weights[top_index[0]])), str(symbols[top_index[0]])
+    )
+
+    if include_positions:
+        report['holdings'] = {
+            'symbol': symbols.tolist(),
+            'value': value.round(2).tolist(),
+            'weight': (weights * 100).round(4).tolist(),
+            'risk_contribution': None if contributions is None else (contributions * 100).round(4).tolist(),
+        }
+    return report
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Portfolio Risk Engine
+===============================
+
+NumPy-backed VaR/CVaR, drawdown and beta calculations used by
+/api/analysis/risk. Monte Carlo scenarios are generated in fixed-size
+chunks so memory stays bounded even for millions of scenarios.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+TRADING_DAYS = 252
+CONFIDENCE_LEVELS = (0.95, 0.99)
+DEFAULT_SCENARIOS = 1_000_000
+MAX_SCENARIOS = 5_000_000
+# Upper bound on random draws held in memory at once (scenarios x assets)
+CHUNK_ELEMENTS = 4_000_000
+
+
+def _as_returns_matrix(returns):
+    """Coerce a returns payload into a (periods, assets) float64 matrix"""
+    if isinstance(returns, dict):
+        symbols = list(returns.keys())
+        series = [returns[s] for s in symbols]
+    else:
+        symbols = None
+        series = returns
+
+    matrix = np.asarray(series, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    elif matrix.ndim == 2:
+        # Per-asset series are posted as rows; store assets as columns
+        matrix = matrix.T
+
+    if matrix.ndim != 2 or matrix.shape[0] < 2:
+        raise ValueError('At least two periods of returns are required')
+    if not np.all(np.isfinite(matrix)):
+        raise ValueError('Returns must be finite numbers')
+    return matrix, symbols
+
+
+def _as_weights(weights, n_assets, symbols=None):
+    """Normalize weights to sum to one, defaulting to equal weight"""
+    if weights is None:
+        return np.full(n_assets, 1.0 / n_assets)
+    if isinstance(weights, dict):
+        if symbols is None:
+            raise ValueError('Weights by symbol require returns keyed by symbol')
+        weights = [weights.get(s, 0.0) for s in symbols]
+
+    w = np.asarray(weights, dtype=np.float64)
+    if w.shape != (n_assets,):
+        raise ValueError(f'Expected {n_assets} weights, got {w.size}')
+    total = w.sum()
+    if total == 0:
+        raise ValueError('Weights must not sum to zero')
+    return w / total
+
+
+def _var_cvar_from_sample(losses, confidence):
+    """VaR and CVaR of a loss sample at the given confidence level"""
+    k = int(np.floor(confidence * (losses.size - 1)))
+    # Partial sort is O(n) and enough to read one order statistic
+    partitioned = np.partition(losses, k)
+    var = partitioned[k]
+    tail = partitioned[k:]
+    return float(var), float(tail.mean())
+
+
+def historical_var(portfolio_returns, confidence=0.95, horizon_days=1):
+    """Historical-simulation VaR/CVaR as positive loss fractions.
+
+    Over a multi-day horizon the sample is the overlapping sums of
+    ``horizon_days`` consecutive returns, the same additive aggregation
+    the parametric and Monte Carlo methods scale by.
+    """
+    returns = np.asarray(portfolio_returns, dtype=np.float64)
+    if horizon_days > 1:
+        if returns.size <= horizon_days:
+            raise ValueError('horizon_days must be shorter than the returns history')
+        totals = np.concatenate(([0.0], np.cumsum(returns)))
+        returns = totals[horizon_days:] - totals[:-horizon_days]
+    return _var_cvar_from_sample(-returns, confidence)
+
+
+def parametric_var(mean, std, confidence=0.95):
+    """Gaussian (variance-covariance) VaR/CVaR as positive loss fractions"""
+    z = NormalDist().inv_cdf(confidence)
+    var = -mean + z * std
+    # Expected shortfall of a normal: sigma * pdf(z) / (1 - c) - mu
+    cvar = -mean + std * NormalDist().pdf(z) / (1 - confidence)
+    return float(var), float(cvar)
+
+
+def monte_carlo_var(mean, cov, weights, n_scenarios=DEFAULT_SCENARIOS,
+                    horizon_days=1, confidence_levels=CONFIDENCE_LEVELS,
+                    seed=None, chunk_size=None):
+    """Monte Carlo VaR/CVaR from multivariate normal asset scenarios.
+
+    Draws are generated chunk by chunk and immediately projected onto the
+    portfolio, so only the 1-D portfolio P&L vector grows with the number
+    of scenarios.
+    """
+    mean = np.asarray(mean, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    n_assets = mean.size
+
+    # Jitter keeps the factorization stable for near-singular samples
+    jitter = 1e-12 * max(np.trace(cov) / n_assets, 1e-12)
+    chol = np.linalg.cholesky(cov + jitter * np.eye(n_assets))
+
+    # Z @ L.T @ w == Z @ (L.T @ w): one matvec per chunk instead of a matmul
+    loading = chol.T @ weights * np.sqrt(horizon_days)
+    drift = float(mean @ weights) * horizon_days
+
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_ELEMENTS // n_assets)
+
+    rng = np.random.default_rng(seed)
+    losses = np.empty(n_scenarios, dtype=np.float64)
+    for start in range(0, n_scenarios, chunk_size):
+        stop = min(start + chunk_size, n_scenarios)
+        draws = rng.standard_normal((stop - start, n_assets))
+        np.matmul(draws, loading, out=losses[start:stop])
+    losses += drift
+    np.negative(losses, out=losses)
+
+    return {
+        confidence: _var_cvar_from_sample(losses, confidence)
+        for confidence in confidence_levels
+    }
+
+
+def max_drawdown(portfolio_returns):
+    """Largest peak-to-trough decline of the compounded return series"""
+    wealth = np.cumprod(1.0 + np.asarray(portfolio_returns, dtype=np.float64))
+    peaks = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    return float(-(wealth / peaks - 1.0).min())
+
+
+def beta(portfolio_returns, benchmark_returns):
+    """Beta of the portfolio against a benchmark return series"""
+    rp = np.asarray(portfolio_returns, dtype=np.float64)
+    rb = np.asarray(benchmark_returns, dtype=np.float64)
+    if rb.shape != rp.shape:
+        raise ValueError('Benchmark returns must match the portfolio history length')
+    rb_centered = rb - rb.mean()
+    variance = rb_centered @ rb_centered
+    if variance == 0:
+        return None
+    return float((rp - rp.mean()) @ rb_centered / variance)
+
+
+def _int_param(portfolio, name, default):
+    """Integer field of the posted portfolio; missing or null means ``default``"""
+    value = portfolio.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+
+def risk_grade(var_95_pct):
+    """Letter grade from one-day 95% VaR expressed in percent"""
+    return 'B+' if var_95_pct < 5 else 'B' if var_95_pct < 7 else 'C+'
+
+
+def analyze_risk(portfolio):
+    """Full risk report for a posted portfolio.
+
+    ``portfolio`` carries ``returns`` (per-asset periodic return series, as
+    a list of rows or a dict keyed by symbol) and optionally ``weights``,
+    ``benchmark_returns``, ``value``, ``simulations``, ``horizon_days``,
+    ``risk_free_rate`` (annual) and ``seed``.
+    """
+    if 'returns' not in portfolio:
+        raise ValueError('Portfolio returns history is required')
+
+    returns, symbols = _as_returns_matrix(portfolio['returns'])
+    n_periods, n_assets = returns.shape
+    weights = _as_weights(portfolio.get('weights'), n_assets, symbols)
+
+    n_scenarios = _int_param(portfolio, 'simulations', DEFAULT_SCENARIOS)
+    if not 1 <= n_scenarios <= MAX_SCENARIOS:
+        raise ValueError(f'simulations must be between 1 and {MAX_SCENARIOS:,}')
+    horizon_days = _int_param(portfolio, 'horizon_days', 1)
+    if horizon_days < 1:
+        raise ValueError('horizon_days must be at least 1')
+
+    port_returns = returns @ weights
+    mean = returns.mean(axis=0)
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    port_mean = float(port_returns.mean())
+    port_std = float(np.sqrt(weights @ cov @ weights))
+
+    historical = {c: historical_var(port_returns, c, horizon_days) for c in CONFIDENCE_LEVELS}
+    parametric = {
+        c: parametric_var(port_mean * horizon_days, port_std * np.sqrt(horizon_days), c)
+        for c in CONFIDENCE_LEVELS
+    }
+    simulated = monte_carlo_var(
+        mean, cov, weights,
+        n_scenarios=n_scenarios,
+        horizon_days=horizon_days,
+        seed=portfolio.get('seed'),
+    )
+
+    def pct(value):
+        return round(value * 100, 2)
+
+    def method_report(results):
+        return {
+            f'{key}_{int(c * 100)}': pct(results[c][i])
+            for c in CONFIDENCE_LEVELS
+            for i, key in enumerate(('var', 'cvar'))
+        }
+
+    risk_free_daily = float(portfolio.get('risk_free_rate', 0.0)) / TRADING_DAYS
+    sharpe = (
+        (port_mean - risk_free_daily) / port_std * np.sqrt(TRADING_DAYS)
+        if port_std > 0 else None
+    )
+
+    benchmark = portfolio.get('benchmark_returns')
+    portfolio_beta = beta(port_returns, benchmark) if benchmark is not None else None
+
+    var_95 = pct(simulated[0.95][0])
+    report = {
+        'var_95': var_95,
+        'var_99': pct(simulated[0.99][0]),
+        'cvar_95': pct(simulated[0.95][1]),
+        'cvar_99': pct(simulated[0.99][1]),
+        'sharpe_ratio': round(float(sharpe), 2) if sharpe is not None else None,
+        'max_drawdown': pct(max_drawdown(port_returns)),
+        'volatility': pct(port_std * np.sqrt(TRADING_DAYS)),
+        'beta': round(portfolio_beta, 2) if portfolio_beta is not None else None,
+        'risk_grade': risk_grade(var_95),
+        'methods': {
+            'historical': method_report(historical),
+            'parametric': method_report(parametric),
+            'monte_carlo': method_report(simulated),
+        },
+        'horizon_days': horizon_days,
+        'simulations': n_scenarios,
+        'observations': n_periods,
+    }
+
+    value = portfolio.get('value')
+    if value is not None:
+        value = float(value)
+        report['var_95_amount'] = round(simulated[0.95][0] * value, 2)
+        report['var_99_amount'] = round(simulated[0.99][0] * value, 2)
+
+    return report
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Semantic AI Response Cache
+====================================
+
+Two-tier cache in front of AI model calls:
+
+* Exact tier: keyed by model and normalized query text.
+* Similarity tier: reuses an answer for the same model when the new
+  query's embedding is within a cosine-similarity threshold of a cached
+  query. Embeddings live in one preallocated float32 matrix, so a lookup
+  is a single matrix-vector product.
+
+Both tiers expire entries after ``ttl`` seconds and hold at most
+``capacity`` entries.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+
+from lazy_imports import lazy_import
+from ttl_cache import TTLCache
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+CacheLookup = namedtuple('CacheLookup', ['answer', 'tier', 'score', 'vector'])
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query"""
+    return _WHITESPACE.sub(' ', query.strip().lower()).rstrip('?!. ')
+
+
+class SemanticCache:
+    """Exact-match plus embedding-similarity cache for AI answers"""
+
+    def __init__(self, embed=None, threshold=0.95, ttl=3600, capacity=1000):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.capacity = capacity
+
+        self.exact = TTLCache(max_entries=capacity, default_ttl=ttl, name='ai-exact-cache')
+
+        self._lock = threading.Lock()
+        self._vectors = None  # (capacity, dim) float32, allocated on first store
+        self._answers = [None] * capacity
+        self._models = {}
+        self._model_ids = None
+        self._expires = None
+        self._last_used = None
+
+        self.semantic_hits = 0
+        self.misses = 0
+        self.embed_errors = 0
+
+    def _key(self, model, query):
+        return f"{model}\x00{normalize_query(query)}"
+
+    def _embed(self, query):
+        """Unit-length float32 embedding, or None if unavailable"""
+        if self.embed is None:
+            return None
+        try:
+            return self._unit(self.embed(query))
+        except Exception as e:
+            self.embed_errors += 1
+            logger.warning(f"Semantic cache embedding failed: {str(e)}")
+            return None
+
+    def _unit(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _exact_hit(self, model, query):
+        answer = self.exact.get(self._key(model, query))
+        if answer is not None:
+            return CacheLookup(answer, 'exact', 1.0, None)
+        return None
+
+    def _similar(self, model, query, vector):
+        if vector is not None:
+            match = self._nearest(model, vector)
+            if match is not None:
+                answer, score = match
+                self.semantic_hits += 1
+                # Promote to the exact tier so the next identical query skips embedding
+                self.exact.set(self._key(model, query), answer)
+                return CacheLookup(answer, 'semantic', score, vector)
+
+        self.misses += 1
+        return CacheLookup(None, None, None, vector)
+
+    def lookup(self, model, query):
+        """Find a cached answer; the returned vector can be passed to store()"""
+        return self._exact_hit(model, query) or self._similar(model, query, self._embed(query))
+
+    async def alookup(self, model, query, aembed=None):
+        """``lookup`` for async callers, awaiting ``aembed(query)`` for the embedding"""
+        hit = self._exact_hit(model, query)
+        if hit is not None:
+            return hit
+
+        vector = None
+        if aembed is not None:
+            try:
+                vector = self._unit(await aembed(query))
+            except Exception as e:
+                self.embed_errors += 1
+                logger.warning(f"Semantic cache embedding failed: {str(e)}")
+        return self._similar(model, query, vector)
+
+    def store(self, model, query, answer, vector=None):
+        """Cache an answer in both tiers"""
+        if not answer:
+            return
+        self.exact.set(self._key(model, query), answer)
+
+        if vector is None:
+            vector = self._embed(query)
+        if vector is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.size), dtype=np.float32)
+                self._model_ids = np.full(self.capacity, -1, dtype=np.int32)
+                self._expires = np.zeros(self.capacity, dtype=np.float64)
+                self._last_used = np.zeros(self.capacity, dtype=np.float64)
+            elif vector.size != self._vectors.shape[1]:
+                logger.warning("Semantic cache embedding dimension changed; skipping store")
+                return
+
+            # Reuse an expired slot if there is one, otherwise the least recently used
+            expired = np.flatnonzero(self._expires <= now)
+            slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+
+            model_id = self._models.setdefault(model, len(self._models))
+            self._vectors[slot] = vector
+            self._model_ids[slot] = model_id
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+
+    def _nearest(self, model, vector):
+        """Best live answer for ``model`` above the similarity threshold"""
+        with self._lock:
+            if self._vectors is None or model not in self._models:
+                return None
+            if vector.size != self._vectors.shape[1]:
+                return None
+
+            now = time.monotonic()
+            scores = self._vectors @ vector
+            live = (self._model_ids == self._models[model]) & (self._expires > now)
+            scores[~live] = -np.inf
+
+            slot = int(np.argmax(scores))
+            score = float(scores[slot])
+            if score < self.threshold:
+                return None
+            self._last_used[slot] = now
+            return self._answers[slot], score
+
+    def stats(self):
+        """Hit counters for both tiers"""
+        with self._lock:
+            live = 0 if self._expires is None else int((self._expires > time.monotonic()).sum())
+        exact = self.exact.stats()
+        lookups = exact['hits'] + self.semantic_hits + self.misses
+        return {
+            'exact_hits': exact['hits'],
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'embed_errors': self.embed_errors,
+            'exact_entries': exact['entries'],
+            'semantic_entries': live,
+            'threshold': self.threshold,
+            'hit_ratio': round((exact['hits'] + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        }
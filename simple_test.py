@@ -68,51 +68,72 @@ def document_processing(api_key):
         "The Federal Reserve maintained interest rates at 5.25-5.50% in December 2023, signaling potential cuts in 2024 based on inflation data."
     ]
     
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
+    from embedding_pipeline import EmbeddingPipeline, openai_embed_batch
     
     print("   🔍 Processing financial documents...")
-    embeddings = []
-    
     for i, doc in enumerate(documents):
         print(f"   📊 Document {i+1}: {doc[:50]}...")
-        
-        data = {
-            'model': 'text-embedding-3-small',
-            'input': doc
+    
+    # All documents go out in batched requests over one keep-alive session
+    session = requests.Session()
+    records = []
+    pipeline = EmbeddingPipeline(
+        embed_batch=lambda texts: openai_embed_batch(session, api_key, texts, model='text-embedding-3-small'),
+        sink=records.extend,
+        model='text-embedding-3-small'
+    )
+    summary = pipeline.ingest(documents)
+    
+    records.sort(key=lambda r: (r['metadata']['document'], r['metadata']['chunk']))
+    embeddings = [
+        {
+            'document': r['text'],
+            'embedding': r['embedding'],
+            'dimensions': len(r['embedding'])
         }
-        
-        response = requests.post('https://api.openai.com/v1/embeddings', headers=headers, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            embedding = result['data'][0]['embedding']
-            embeddings.append({
-                'document': doc,
-                'embedding': embedding,
-                'dimensions': len(embedding)
-            })
-            print(f"   ✅ Generated {len(embedding)}-dimensional embedding")
-        else:
-            print(f"   ❌ Failed to process document {i+1}")
+        for r in records
+    ]
+    
+    if embeddings:
+        print(f"   ✅ Generated {summary['embedded']} {embeddings[0]['dimensions']}-dimensional embeddings "
+              f"in {summary['batches']} request(s), {summary['elapsed_ms']:.0f} ms")
+    if summary['failed']:
+        print(f"   ❌ Failed to process {summary['failed']} chunk(s)")
     
     return embeddings
 
 def rag_query(api_key, embeddings):
     """Simulate RAG query using processed documents"""
-    print("\n🔍 RAG Query: 'What companies had strong Q4 2023 performance?'")
+    from vector_index import VectorIndex
     
-    # In a real implementation, this would use vector similarity search
-    # For demo, we'll use the Apple document as most relevant
-    relevant_doc = embeddings[0]['document'] if embeddings else "No relevant documents found"
+    question = 'What companies had strong Q4 2023 performance?'
+    print(f"\n🔍 RAG Query: '{question}'")
     
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
     }
     
+    # Index the document embeddings and retrieve by vector similarity
+    index = VectorIndex(dim=embeddings[0]['dimensions'])
+    index.add(
+        range(len(embeddings)),
+        [e['embedding'] for e in embeddings],
+        [{'document': e['document']} for e in embeddings]
+    )
+    
+    response = requests.post('https://api.openai.com/v1/embeddings', headers=headers,
+                             json={'model': 'text-embedding-3-small', 'input': question})
+    
+    if response.status_code == 200:
+        query_embedding = response.json()['data'][0]['embedding']
+        best = index.search(query_embedding, k=1)[0]
+        relevant_doc = best['metadata']['document']
+        print(f"   🎯 Retrieved document {best['id'] + 1} (similarity {best['score']:.2f})")
+    else:
+        print("   ❌ Query embedding failed")
+        return None
+    
     data = {
         'model': 'gpt-3.5-turbo',
         'messages': [
@@ -122,7 +143,7 @@ def rag_query(api_key, embeddings):
             },
             {
                 'role': 'user',
-                'content': f"Based on this document: '{relevant_doc}'\n\nQuestion: What companies had strong Q4 2023 performance?"
+                'content': f"Based on this document: '{relevant_doc}'\n\nQuestion: {question}"
             }
         ],
         'max_tokens': 150
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Symbol Reference Index
+================================
+
+Local, memory-mapped reference data (name, sector, industry, currency,
+exchange, market cap, trailing P/E) so static metadata lookups never go
+to the network.
+
+One file holds everything::
+
+    FDSYMIDX | header length (u4) | JSON header, padded to 64 bytes
+    symbols   fixed-width ASCII, sorted, for binary search
+    records   packed rows: name offset/length, category codes, numbers
+    names     UTF-8 name blob
+
+Sector, industry, currency and exchange are dictionary-encoded into
+``uint16`` codes (vocabularies live in the header), so the file stays
+small and lookups are ``searchsorted`` plus array indexing, vectorized for
+many symbols at once.
+
+The file is rebuilt out of band (``python symbol_index.py refresh``) and
+swapped in with an atomic rename. ``get_index()`` maps it once per process
+and re-maps it when a rebuild lands.
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_PATH = os.environ.get('SYMBOL_INDEX_PATH', os.path.join('data', 'reference', 'symbols.idx'))
+RELOAD_INTERVAL = 60  # seconds between checks for a rebuilt file
+MAGIC = b'FDSYMIDX'
+VERSION = 1
+ALIGN = 64
+
+CATEGORIES = ('sector', 'industry', 'currency', 'exchange')
+NUMBERS = ('market_cap', 'trailing_pe')
+FIELDS = ('name',) + CATEGORIES + NUMBERS
+
+RECORD_DTYPE = np.dtype([
+    ('name_start', '<u4'),
+    ('name_length', '<u2'),
+    ('sector', '<u2'),
+    ('industry', '<u2'),
+    ('currency', '<u2'),
+    ('exchange', '<u2'),
+    ('market_cap', '<f8'),
+    ('trailing_pe', '<f8'),
+])
+
+# yfinance ``Ticker.info`` keys behind each field
+INFO_KEYS = {
+    'name': ('longName', 'shortName'),
+    'sector': ('sector',),
+    'industry': ('industry',),
+    'currency': ('currency',),
+    'exchange': ('exchange',),
+    'market_cap': ('marketCap',),
+    'trailing_pe': ('trailingPE',),
+}
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _number(value):
+    try:
+        return float(value) if value not in (None, '') else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class SymbolIndex:
+    """Read-only view of an index file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, header_length = f.read(len(MAGIC)), struct.unpack('<I', f.read(4))[0]
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a symbol index')
+            header = json.loads(f.read(header_length))
+        if header['version'] != VERSION:
+            raise ValueError(f"Unsupported symbol index version {header['version']}")
+
+        self.header = header
+        self.count = header['count']
+        self.built_at = header['built_at']
+        self.vocabularies = {name: np.array(words, dtype=object) for name, words in header['vocabularies'].items()}
+
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        width = header['symbol_width']
+        start = header['symbols_offset']
+        self.symbols = data[start:start + self.count * width].view(f'S{width}')
+        start = header['records_offset']
+        self.records = data[start:start + self.count * RECORD_DTYPE.itemsize].view(RECORD_DTYPE)
+        start = header['names_offset']
+        self._names = data[start:start + header['names_size']]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, symbol):
+        return bool(self.locate([symbol])[1][0])
+
+    def locate(self, symbols):
+        """Row of each symbol and a mask of the ones present"""
+        encoded = [str(s).upper().encode('ascii', 'replace') for s in symbols]
+        if self.count == 0:
+            return np.zeros(len(encoded), dtype=np.intp), np.zeros(len(encoded), dtype=bool)
+        # Keys longer than the stored width would be truncated into false matches
+        fits = np.array([len(key) <= self.symbols.itemsize for key in encoded], dtype=bool)
+        keys = np.array(encoded, dtype=self.symbols.dtype)
+        rows = np.minimum(np.searchsorted(self.symbols, keys), self.count - 1)
+        return rows, (self.symbols[rows] == keys) & fits
+
+    def _name(self, row):
+        record = self.records[row]
+        start = int(record['name_start'])
+        return bytes(self._names[start:start + int(record['name_length'])]).decode('utf-8')
+
+    def labels(self, symbols, field, default=None):
+        """Object array of one category (or 'name') per symbol, ``default`` if unknown"""
+        rows, found = self.locate(symbols)
+        out = np.full(len(rows), default, dtype=object)
+        if field == 'name':
+            for i in np.flatnonzero(found):
+                out[i] = self._name(rows[i]) or default
+            return out
+        codes = self.records[field][rows[found]]
+        words = self.vocabularies[field][codes]
+        words[codes == 0] = default
+        out[found] = words
+        return out
+
+    def get(self, symbol):
+        """Reference fields for one symbol, or None if it is not indexed"""
+        rows, found = self.locate([symbol])
+        if not found[0]:
+            return None
+        record = self.records[rows[0]]
+        entry = {'symbol': self.symbols[rows[0]].decode('ascii'), 'name': self._name(rows[0])}
+        for name in CATEGORIES:
+            entry[name] = self.vocabularies[name][record[name]] or None
+        for name in NUMBERS:
+            value = float(record[name])
+            entry[name] = None if np.isnan(value) else value
+        return entry
+
+    def entries(self):
+        """Every indexed entry, for rebuilding"""
+        for row in range(self.count):
+            yield self.get(self.symbols[row].decode('ascii'))
+
+
+def write_index(path, entries):
+    """Build an index file from reference dicts and atomically replace ``path``"""
+    by_symbol = {}
+    for entry in entries:
+        symbol = str(entry.get('symbol') or '').strip().upper()
+        if symbol:
+            by_symbol[symbol] = entry
+    symbols = sorted(by_symbol)
+
+    vocabularies = {name: [''] for name in CATEGORIES}
+    codes = {name: {'': 0} for name in CATEGORIES}
+    records = np.zeros(len(symbols), dtype=RECORD_DTYPE)
+    names = bytearray()
+    for row, symbol in enumerate(symbols):
+        entry = by_symbol[symbol]
+        name = str(entry.get('name') or '').encode('utf-8')[:0xFFFF]
+        records[row]['name_start'] = len(names)
+        records[row]['name_length'] = len(name)
+        names += name
+        for field in CATEGORIES:
+            word = str(entry.get(field) or '')
+            if word not in codes[field]:
+                codes[field][word] = len(vocabularies[field])
+                vocabularies[field].append(word)
+            records[row][field] = codes[field][word]
+        for field in NUMBERS:
+            records[row][field] = _number(entry.get(field))
+    if any(len(words) > 0xFFFF for words in vocabularies.values()):
+        raise ValueError('Too many distinct categories for a symbol index')
+
+    width = max([len(s.encode('ascii', 'replace')) for s in symbols] + [1])
+    symbol_array = np.array([s.encode('ascii', 'replace') for s in symbols], dtype=f'S{width}')
+
+    header = {'version': VERSION, 'count': len(symbols), 'symbol_width': width,
+              'built_at': time.time(), 'vocabularies': vocabularies}
+    # Offsets depend on the header length, so size the header with placeholders first
+    for key in ('symbols_offset', 'records_offset', 'names_offset', 'names_size'):
+        header[key] = 0
+    prefix = len(MAGIC) + 4 + len(json.dumps(header)) + 64
+    header['symbols_offset'] = _aligned(prefix)
+    header['records_offset'] = _aligned(header['symbols_offset'] + symbol_array.nbytes)
+    header['names_offset'] = header['records_offset'] + records.nbytes
+    header['names_size'] = len(names)
+    encoded = json.dumps(header).encode()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        f.write(b' ' * (header['symbols_offset'] - f.tell()))
+        f.write(symbol_array.tobytes())
+        f.write(b'\0' * (header['records_offset'] - f.tell()))
+        f.write(records.tobytes())
+        f.write(bytes(names))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(symbols)
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def get_index(path=DEFAULT_PATH):
+    """Process-wide index for ``path``, or None if it has not been built.
+
+    The file is mapped once; at most every RELOAD_INTERVAL seconds a stat
+    checks for an out-of-band rebuild and re-maps it.
+    """
+    now = time.monotonic()
+    cached = _loaded.get(path)
+    if cached is not None and now - cached[2] < RELOAD_INTERVAL:
+        return cached[0]
+
+    with _load_lock:
+        cached = _loaded.get(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _loaded[path] = (None, None, now)
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if cached is not None and cached[1] == version:
+            _loaded[path] = (cached[0], version, now)
+            return cached[0]
+        index = SymbolIndex(path)
+        _loaded[path] = (index, version, now)
+        return index
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or (isinstance(value, float) and np.isnan(value))
+
+
+def fetch_reference(symbols, workers=8):
+    """Reference entries from yfinance ``Ticker.info``.
+
+    Failed symbols are skipped, as are ones whose info has neither a name
+    nor a sector (yfinance returns a near-empty dict when throttled).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import yfinance as yf
+
+    from metrics import upstream
+
+    def fetch(symbol):
+        try:
+            with upstream('yfinance', 'ticker_info') as call:
+                info = yf.Ticker(symbol).info or {}
+                entry = {'symbol': symbol}
+                for field, keys in INFO_KEYS.items():
+                    entry[field] = next((info[key] for key in keys if not _blank(info.get(key))), None)
+                if entry['name'] is None and entry['sector'] is None:
+                    call.fail(f'No reference data for {symbol}')
+                    return None
+        except Exception:
+            return None
+        return entry
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [entry for entry in pool.map(fetch, symbols) if entry is not None]
+
+
+def read_csv(path):
+    """Reference entries from a CSV with a ``symbol`` column and any of FIELDS"""
+    import csv
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return [{key.strip().lower(): value for key, value in row.items() if key} for row in csv.DictReader(f)]
+
+
+def refresh(symbols=None, path=DEFAULT_PATH, csv_path=None):
+    """Rebuild the index, keeping existing entries that were not refetched.
+
+    Refetched entries are merged field by field: a blank field never
+    overwrites a value already indexed.
+
+    Without ``symbols`` or ``csv_path`` it refetches everything already
+    indexed plus every symbol in the local history store.
+    """
+    existing = {}
+    if os.path.exists(path):
+        existing = {entry['symbol']: entry for entry in SymbolIndex(path).entries()}
+
+    if csv_path:
+        fresh = read_csv(csv_path)
+    else:
+        if not symbols:
+            from history_store import HistoryStore
+            symbols = sorted(set(existing) | set(HistoryStore().symbols('1d')))
+        fresh = fetch_reference([s.upper() for s in symbols])
+
+    for entry in fresh:
+        symbol = str(entry.get('symbol') or '').strip().upper()
+        if not symbol:
+            continue
+        merged = dict(existing.get(symbol) or {}, symbol=symbol)
+        merged.update((field, value) for field, value in entry.items() if field != 'symbol' and not _blank(value))
+        existing[symbol] = merged
+    return write_index(path, existing.values()), len(fresh)
+
+
+def main(argv):
+    """Command line: refresh [SYMBOL ...] [--csv FILE] | lookup SYMBOL ..."""
+    if not argv or argv[0] not in ('refresh', 'lookup'):
+        print('usage: symbol_index.py refresh [SYMBOL ...] [--csv FILE] | lookup SYMBOL ...')
+        return 2
+    path = DEFAULT_PATH
+    args = argv[1:]
+
+    if argv[0] == 'lookup':
+        index = get_index(path)
+        if index is None:
+            print(f'No symbol index at {path}; run "symbol_index.py refresh" first')
+            return 1
+        print(json.dumps({symbol.upper(): index.get(symbol) for symbol in args}, indent=2))
+        return 0
+
+    csv_path = None
+    if '--csv' in args:
+        position = args.index('--csv')
+        csv_path = args[position + 1]
+        args = args[:position] + args[position + 2:]
+    started = time.time()
+    total, updated = refresh(args, path, csv_path)
+    print(f'Indexed {total} symbols ({updated} updated) in {time.time() - started:.1f}s -> {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Serve the local fake streaming provider as model 'fake-*'
+os.environ.setdefault('FAKE_AI_PROVIDER', '1')
+os.environ.setdefault('FAKE_AI_INTERVAL', '0.01')
@@ -0,0 +1,202 @@
+import json
+import time
+
+import pytest
+
+import ai_streaming
+from ai_streaming import fake_deltas, sse_event, sse_stream, wants_stream
+
+
+def parse_events(body):
+    """``[(event, data), ...]`` from an SSE body"""
+    events = []
+    for block in body.split('\n\n'):
+        if not block:
+            continue
+        lines = block.split('\n')
+        assert lines[0].startswith('event: ') and lines[1].startswith('data: ')
+        events.append((lines[0][len('event: '):], json.loads(lines[1][len('data: '):])))
+    return events
+
+
+def test_sse_event_framing():
+    assert sse_event('delta', {'index': 0, 'text': 'a\nb'}) == 'event: delta\ndata: {"index": 0, "text": "a\\nb"}\n\n'
+
+
+@pytest.mark.parametrize('data, args, expected', [
+    ({'stream': True}, None, True),
+    ({'stream': 'yes'}, None, True),
+    ({}, {'stream': '1'}, True),
+    ({'stream': False}, {'stream': '1'}, False),
+    ({}, {}, False),
+    (None, None, False),
+])
+def test_wants_stream(data, args, expected):
+    assert wants_stream(data, args) is expected
+
+
+def test_fake_deltas_pieces():
+    pieces = list(fake_deltas('one two three four five', interval=0, chunk_words=2))
+    assert pieces == ['one two ', 'three four ', 'five']
+
+
+def test_fake_deltas_intervals():
+    started = time.perf_counter()
+    deltas = fake_deltas('a b c', interval=0.02, first_delay=0.1)
+    next(deltas)
+    first = time.perf_counter() - started
+    list(deltas)
+    total = time.perf_counter() - started
+    assert 0.1 <= first < 0.2
+    assert total >= 0.14
+
+
+def test_sse_stream_event_order():
+    events = parse_events(''.join(sse_stream(fake_deltas('alpha beta gamma', interval=0), 'fake-model', 'fake')))
+    assert [name for name, _ in events] == ['start', 'delta', 'delta', 'delta', 'done']
+    assert events[0][1] == {'model': 'fake-model', 'provider': 'fake'}
+    assert [data['index'] for name, data in events if name == 'delta'] == [0, 1, 2]
+    assert ''.join(data['text'] for name, data in events if name == 'delta') == 'alpha beta gamma'
+    done = events[-1][1]
+    assert done['chunks'] == 3 and done['characters'] == len('alpha beta gamma')
+
+
+def test_sse_stream_first_token_timing():
+    stream = sse_stream(fake_deltas('slow start', interval=0.01, first_delay=0.15), 'fake-model', 'fake')
+    started = time.perf_counter()
+    # The start event goes out before the provider produces anything
+    assert next(stream).startswith('event: start')
+    assert time.perf_counter() - started < 0.05
+    done = parse_events(''.join(stream))[-1][1]
+    assert done['first_token_ms'] >= 150
+    assert done['elapsed_ms'] >= done['first_token_ms']
+
+
+def test_sse_stream_error_event():
+    events = parse_events(''.join(sse_stream(fake_deltas('a b c d', interval=0, fail_after=2), 'fake-model', 'fake')))
+    assert [name for name, _ in events] == ['start', 'delta', 'delta', 'error']
+    assert events[-1][1] == {'error': 'Fake provider failure'}
+
+
+def read_stream(response, started=None):
+    """``[(seconds since started, chunk), ...]`` for a streamed Flask response"""
+    if started is None:
+        started = time.perf_counter()
+    chunks = []
+    for chunk in response.response:
+        chunks.append((time.perf_counter() - started, chunk.decode() if isinstance(chunk, bytes) else chunk))
+    response.close()
+    return chunks
+
+
+@pytest.fixture
+def netlify_client():
+    netlify_app = pytest.importorskip('netlify_app')
+    return netlify_app, netlify_app.app.test_client()
+
+
+def test_netlify_stream(netlify_client):
+    netlify_app, client = netlify_client
+    query = 'stream framing check'
+    response = client.post('/api/ai/query', json={'query': query, 'model': 'fake-model', 'stream': True},
+                           buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    events = parse_events(''.join(chunk for _, chunk in read_stream(response)))
+    names = [name for name, _ in events]
+    assert names[0] == 'start' and names[-1] == 'done' and set(names[1:-1]) == {'delta'}
+    assert ''.join(data['text'] for name, data in events if name == 'delta') == netlify_app.fake_answer(query)
+    assert events[0][1]['model'] == 'fake-model' and events[0][1]['provider'] == 'fake'
+
+
+def test_netlify_stream_query_string_opt_in(netlify_client):
+    _, client = netlify_client
+    response = client.post('/api/ai/query?stream=true', json={'query': 'query string opt in', 'model': 'fake-model'})
+    assert response.mimetype == 'text/event-stream'
+    assert parse_events(response.get_data(as_text=True))[-1][0] == 'done'
+
+
+def test_netlify_stream_first_token_timing(netlify_client, monkeypatch):
+    netlify_app, client = netlify_client
+    monkeypatch.setattr(netlify_app, 'stream_deltas',
+                        lambda model, query: fake_deltas('late first token', interval=0.01, first_delay=0.2))
+    started = time.perf_counter()
+    response = client.post('/api/ai/query', json={'query': 'first token timing', 'model': 'fake-model', 'stream': True},
+                           buffered=False)
+    chunks = read_stream(response, started)
+    deltas = [at for at, chunk in chunks if chunk.startswith('event: delta')]
+    assert deltas and deltas[0] >= 0.2
+    done = parse_events(chunks[-1][1])[0][1]
+    assert done['first_token_ms'] >= 200
+
+
+def test_netlify_stream_error_event(netlify_client, monkeypatch):
+    netlify_app, client = netlify_client
+    monkeypatch.setattr(netlify_app, 'stream_deltas',
+                        lambda model, query: fake_deltas('a b c d', interval=0, fail_after=2))
+    query = 'mid-stream failure'
+    response = client.post('/api/ai/query', json={'query': query, 'model': 'fake-model', 'stream': True})
+    events = parse_events(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ['start', 'delta', 'delta', 'error']
+    assert events[-1][1] == {'error': 'Fake provider failure'}
+    # A failed stream is not cached as an answer
+    assert netlify_app.ai_cache.lookup('fake-model', query).answer is None
+
+
+def test_netlify_stream_fails_over_before_first_delta(netlify_client, monkeypatch):
+    netlify_app, client = netlify_client
+    monkeypatch.setattr(netlify_app, 'stream_deltas',
+                        lambda model, query: fake_deltas('never sent', interval=0, fail_after=0))
+    failures = netlify_app.ai_router._stats['fake-model'].failures
+    # With every candidate failing to start, the client gets an error status, not a 200 stream
+    response = client.post('/api/ai/query', json={'query': 'no backend starts', 'model': 'auto', 'stream': True})
+    assert response.status_code == 503
+    assert netlify_app.ai_router._stats['fake-model'].failures == failures + 1
+    netlify_app.ai_router.record('fake-model', 0.01, True)
+
+
+def test_netlify_abandoned_stream_releases_claim(netlify_client):
+    netlify_app, _ = netlify_client
+    stats = netlify_app.ai_router._stats['fake-model']
+    requests = stats.requests
+    routed, deltas, started = netlify_app.open_stream('fake-model', 'abandoned stream')
+    deltas = netlify_app.RoutedDeltas(deltas, routed, started)
+    next(deltas)
+    deltas.close()
+    assert stats.requests == requests
+
+
+def test_netlify_stream_closed_after_start_releases_claim(netlify_client, monkeypatch):
+    netlify_app, _ = netlify_client
+    released = []
+    monkeypatch.setattr(netlify_app.ai_router, 'release', released.append)
+    routed, deltas, started = netlify_app.open_stream('fake-model', 'gone after start')
+    stream = netlify_app.sse_stream(netlify_app.RoutedDeltas(deltas, routed, started), routed, 'fake')
+    # The client leaves after the start event, before any delta is read
+    next(stream)
+    stream.close()
+    assert released == ['fake-model']
+
+
+def test_netlify_unavailable_model(netlify_client):
+    netlify_app, client = netlify_client
+    response = client.post('/api/ai/query', json={'query': 'x', 'model': 'unknown-model', 'stream': True})
+    assert response.status_code == 400
+    # Names outside the allowlist are rejected, not tracked as new backends
+    response = client.post('/api/ai/query', json={'query': 'x', 'model': 'fake-unlisted'})
+    assert response.status_code == 400
+    assert 'fake-unlisted' not in netlify_app.ai_router.backends
+
+
+def test_web_app_stream(monkeypatch):
+    web_app = pytest.importorskip('web_app')
+    monkeypatch.setattr(ai_streaming.time, 'sleep', lambda seconds: None)
+    query = 'portfolio check'
+    response = web_app.app.test_client().post('/api/ai/query', json={'query': query, 'stream': True})
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    assert events[0] == ('start', {'model': 'findeus-sim', 'provider': 'simulated'})
+    assert events[-1][0] == 'done'
+    assert ''.join(data['text'] for name, data in events if name == 'delta') == web_app.simulated_answer(query)
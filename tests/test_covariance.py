@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from covariance import CovarianceService, CovarianceState, gram, ledoit_wolf_shrinkage
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+
+
+def returns(periods=80, seed=0):
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.01, (periods, 1))
+    return (factor + rng.normal(0.0005, 0.01, (periods, len(SYMBOLS)))).astype(np.float32)
+
+
+@pytest.mark.parametrize('method', ['sample', 'ledoit_wolf', 'ewma'])
+@pytest.mark.parametrize('window', [60, 100])
+def test_incremental_updates_match_rebuild(method, window):
+    # A 60-period window drops a row per update; a 100-period one is still filling
+    data = returns()
+    timestamps = np.arange(data.shape[0])
+    new = 4
+    start = max(data.shape[0] - window - new, 0)
+    state = CovarianceState.build(SYMBOLS, '1d', window, method, timestamps[start:-new],
+                                  data[start:-new], block=2)
+    advanced = state.advance(timestamps[-new:], data[-new:], block=2)
+    rebuilt = CovarianceState.build(SYMBOLS, '1d', window, method, timestamps[-window:], data[-window:], block=2)
+
+    assert advanced.as_of == rebuilt.as_of
+    assert advanced.returns.shape == rebuilt.returns.shape
+    np.testing.assert_allclose(advanced.cov, rebuilt.cov, rtol=0, atol=1e-7)
+    # Updates are copy-on-write
+    assert state.as_of == timestamps[-new - 1]
+
+
+def test_ledoit_wolf_intensity_matches_sklearn():
+    covariance = pytest.importorskip('sklearn.covariance')
+    data = returns(periods=40).astype(np.float64)
+    centered = data - data.mean(axis=0)
+    shrinkage, mu = ledoit_wolf_shrinkage(centered, gram(centered))
+    assert shrinkage == pytest.approx(covariance.ledoit_wolf_shrinkage(data), rel=1e-5)
+    assert mu == pytest.approx(np.trace(centered.T @ centered) / centered.size, rel=1e-6)
+
+
+class Store:
+    """HistoryStore stand-in serving a fixed returns matrix"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def revision(self, symbol, interval):
+        return 0
+
+    def returns_matrix(self, symbols, interval, lookback=252, start=None):
+        timestamps = np.arange(self.data.shape[0])
+        if start is not None:
+            keep = timestamps >= start
+            return timestamps[keep], self.data[keep]
+        return timestamps[-lookback:], self.data[-lookback:]
+
+
+def test_service_keeps_no_lock_per_universe():
+    service = CovarianceService(Store(returns()))
+    for window in range(10, 40):
+        service.get(SYMBOLS, window=window)
+    assert not hasattr(service, '_locks')
+    # The advance lock lives on the cached state
+    state = service.get(SYMBOLS, window=20)
+    assert state.lock.acquire(blocking=False)
+    state.lock.release()
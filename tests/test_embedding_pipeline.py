@@ -0,0 +1,59 @@
+import pytest
+
+from embedding_pipeline import EmbeddingError, EmbeddingPipeline, with_retries
+from vector_index import VectorIndex
+
+
+def failing(*errors):
+    """Call that raises ``errors`` in turn, then returns 'ok'"""
+    remaining = list(errors)
+
+    def call():
+        if remaining:
+            raise remaining.pop(0)
+        return 'ok'
+    return call
+
+
+def test_retry_after_is_capped():
+    delays = []
+    call = failing(EmbeddingError('slow down', status=429, retry_after=3600.0))
+    assert with_retries(call, max_delay=5.0, sleep=delays.append) == 'ok'
+    assert delays == [5.0]
+
+
+def test_transport_errors_are_retried():
+    delays = []
+    call = failing(ConnectionError('reset'), TimeoutError('timed out'))
+    assert with_retries(call, base_delay=0.01, sleep=delays.append) == 'ok'
+    assert len(delays) == 2
+    with pytest.raises(EmbeddingError):
+        with_retries(failing(ConnectionError('reset')), max_retries=0, sleep=delays.append)
+
+
+def test_local_errors_are_not_retried():
+    delays = []
+    for error in (FileNotFoundError('missing'), PermissionError('denied'),
+                  EmbeddingError('bad request', status=400)):
+        with pytest.raises(type(error)):
+            with_retries(failing(error), sleep=delays.append)
+    assert delays == []
+
+
+def test_metadata_must_be_an_object():
+    pipeline = EmbeddingPipeline(embed_batch=lambda texts: [[1.0]] * len(texts), sink=lambda records: None)
+    for document in ({'text': 'a b c', 'metadata': 'tag'}, {'text': 'a b c', 'metadata': [1]}, 42):
+        with pytest.raises(ValueError):
+            pipeline.plan([document])
+    index = VectorIndex(dim=2)
+    with pytest.raises(ValueError):
+        index.add(['a'], [[1.0, 0.0]], ['tag'])
+    assert len(index.ids) == 0
+
+
+def test_generate_rejects_non_object_metadata():
+    netlify_app = pytest.importorskip('netlify_app')
+    response = netlify_app.app.test_client().post(
+        '/api/embeddings/generate', json={'text': 'hello', 'store': True, 'metadata': 'tag'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'metadata must be an object'}
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+import forecasting
+from forecasting import Forecaster, build_features
+
+
+class Store:
+    """Minimal HistoryStore stand-in holding one symbol's daily closes"""
+
+    def __init__(self, close):
+        self.close = np.asarray(close, dtype=np.float64)
+        self.timestamp = 1_600_000_000 + 86400 * np.arange(self.close.size, dtype=np.int64)
+
+    def last_timestamp(self, symbol, interval):
+        return int(self.timestamp[-1])
+
+    def revision(self, symbol, interval):
+        return 0
+
+    def read(self, symbol, interval, columns=None):
+        return {'timestamp': self.timestamp, 'close': self.close}
+
+
+def test_serving_features_match_training(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, 600)))
+    forecaster = Forecaster(Store(close), root=str(tmp_path), horizon=5, lookback=300,
+                            n_estimators=5, max_workers=1)
+    rows = []
+
+    def recording(values):
+        features = build_features(values)
+        rows.append(features[-1])
+        return features
+
+    monkeypatch.setattr(forecasting, 'build_features', recording)
+    forecaster.forecast('TEST', days=5)
+    # fit_model's last row and forecast's serving row describe the same final bar
+    trained, served = rows
+    assert np.isfinite(served).all()
+    np.testing.assert_allclose(served, trained, rtol=1e-12)
+
+
+def test_short_serving_window_would_skew_features():
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, 600)))
+    full = build_features(close)[-1]
+    short = build_features(close[-(forecasting.WARMUP + 1):])[-1]
+    rsi = forecasting.FEATURES.index('rsi_14')
+    assert full[rsi] != pytest.approx(short[rsi], abs=1e-6)
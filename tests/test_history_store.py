@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import api_core
+from history_store import HistoryStore
+
+
+def bars(start, closes):
+    closes = np.asarray(closes, dtype=np.float64)
+    return {
+        'timestamp': 1_600_000_000 + 86400 * np.arange(start, start + closes.size, dtype=np.int64),
+        'open': closes, 'high': closes, 'low': closes, 'close': closes,
+        'volume': np.full(closes.size, 1000.0),
+    }
+
+
+def test_append_is_incremental_and_idempotent(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    assert store.append('abc', '1d', bars(0, [10.0, 11.0, 12.0])) == 3
+    assert store.append('ABC', '1d', bars(1, [11.0, 12.0])) == 0
+    assert store.append('ABC', '1d', bars(2, [12.0, 13.0, 14.0])) == 2
+    assert store.read('ABC')['close'].tolist() == [10.0, 11.0, 12.0, 13.0, 14.0]
+    assert store.revision('ABC') == 0
+
+
+def test_changed_last_bar_is_not_rewritten_in_place(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    store.append('ABC', '1d', bars(0, [10.0, 11.0, 12.0]))
+    # A reader holding the mapped columns before the partial bar closes
+    before = store.read('ABC')['close']
+
+    assert store.append('ABC', '1d', bars(2, [12.5, 13.0])) == 2
+    assert before.tolist() == [10.0, 11.0, 12.0]
+    assert store.read('ABC')['close'].tolist() == [10.0, 11.0, 12.5, 13.0]
+    assert store.revision('ABC') == 1
+
+    # Later appends go to the new generation
+    assert store.append('ABC', '1d', bars(4, [14.0])) == 1
+    assert store.read('ABC')['close'].tolist() == [10.0, 11.0, 12.5, 13.0, 14.0]
+
+
+def test_risk_analysis_weights_by_stored_symbol(tmp_path, monkeypatch):
+    store = HistoryStore(root=str(tmp_path))
+    rng = np.random.default_rng(0)
+    for symbol in ('AAA', 'BBB'):
+        store.append(symbol, '1d', bars(0, 100 * np.cumprod(1 + rng.normal(0, 0.01, 60))))
+    monkeypatch.setattr(api_core, 'get_history_store', lambda: store)
+
+    payload, status = api_core.risk_analysis({
+        'refresh': False,
+        'portfolio': {'symbols': ['AAA', 'BBB'], 'weights': {'AAA': 0.7, 'BBB': 0.3}},
+    })
+    assert status == 200, payload
+
+
+def test_demo_app_never_refreshes(tmp_path, monkeypatch):
+    web_app = pytest.importorskip('web_app')
+    store = HistoryStore(root=str(tmp_path))
+    store.append('AAA', '1d', bars(0, np.linspace(100.0, 110.0, 30)))
+
+    def refresh(symbols, interval='1d'):
+        raise AssertionError('the demo app downloaded history')
+
+    monkeypatch.setattr(store, 'refresh', refresh)
+    monkeypatch.setattr(api_core, 'get_history_store', lambda: store)
+    response = web_app.app.test_client().post(
+        '/api/analysis/risk?refresh=true',
+        json={'refresh': True, 'portfolio': {'symbols': ['AAA'], 'simulations': 1000}},
+    )
+    assert response.status_code == 200, response.get_json()
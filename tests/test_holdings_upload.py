@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pytest
+
+import holdings_upload
+from holdings_upload import HoldingsUpload
+
+
+def upload(data, fmt='csv', chunk_size=None, chunk_rows=holdings_upload.CHUNK_ROWS):
+    """Aggregated columns of ``data`` fed in ``chunk_size``-byte pieces"""
+    parsed = HoldingsUpload(fmt, chunk_rows=chunk_rows)
+    chunk_size = chunk_size or len(data)
+    for start in range(0, len(data), chunk_size):
+        parsed.feed(data[start:start + chunk_size])
+    return parsed.finish(), parsed
+
+
+def totals(columns):
+    return dict(zip(columns['symbol'].tolist(), columns['value'].tolist()))
+
+
+CSV = (
+    b'\xef\xbb\xbfTicker,Market Value,Sector,Cost\n'
+    b'aapl,100,Technology,80\n'
+    b'MSFT,200,Technology,\n'
+    b'"BRK.B",150,Financials,100\n'
+    b'AAPL,50,Ignored,30\n'
+)
+
+
+def test_bom_aliases_and_duplicate_netting():
+    columns, parsed = upload(CSV)
+    assert totals(columns) == {'AAPL': 150.0, 'MSFT': 200.0, 'BRK.B': 150.0}
+    by_symbol = {s: i for i, s in enumerate(columns['symbol'].tolist())}
+    # The first row for a symbol supplies its labels; cost is summed where known
+    assert columns['sector'][by_symbol['AAPL']] == 'Technology'
+    assert columns['cost_basis'][by_symbol['AAPL']] == 110.0
+    assert np.isnan(columns['cost_basis'][by_symbol['MSFT']])
+    assert parsed.summary()['rows'] == 4
+
+
+def test_chunk_boundaries_do_not_change_totals():
+    rows = b''.join(b'S%d,%d\n' % (i % 7, i) for i in range(100))
+    data = b'symbol,value\n' + rows
+    expected = totals(upload(data)[0])
+    for chunk_size, chunk_rows in ((1, 3), (5, 8), (17, 1), (64, 100)):
+        columns, parsed = upload(data, chunk_size=chunk_size, chunk_rows=chunk_rows)
+        assert totals(columns) == expected
+        assert parsed.summary()['rows'] == 100
+
+
+def test_ndjson():
+    data = b''.join(json.dumps(row).encode() + b'\n' for row in (
+        {'symbol': 'AAPL', 'quantity': 2, 'price': 50},
+        {'symbol': 'aapl', 'value': 10},
+    ))
+    columns, _ = upload(data, fmt='ndjson', chunk_size=7)
+    assert totals(columns) == {'AAPL': 110.0}
+
+
+def test_quoted_fields():
+    columns, _ = upload(b'symbol,value,sector\nAAPL,10,"Tech, Hardware"\n')
+    assert columns['sector'].tolist() == ['Tech, Hardware']
+    with pytest.raises(ValueError, match='Line 2'):
+        upload(b'symbol,value,sector\nAAPL,10,"Tech\nHardware"\n')
+
+
+def test_distinct_symbols_are_capped(monkeypatch):
+    monkeypatch.setattr(holdings_upload, 'MAX_POSITIONS', 5)
+    data = b'symbol,value\n' + b''.join(b'S%d,1\n' % i for i in range(6))
+    upload(data[:data.rindex(b'S5')])
+    with pytest.raises(ValueError, match='At most 5'):
+        # Each block stays under the cap; the running totals must not
+        upload(data, chunk_rows=2)
@@ -0,0 +1,77 @@
+from llm_router import CLOSED, HALF_OPEN, OPEN, Backend, LLMRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_router(clock, **kwargs):
+    """Router with one backend 'a' whose breaker has just opened"""
+    router = LLMRouter(failure_threshold=1, cooldown=10.0, clock=clock, **kwargs)
+    router.add(Backend('a', lambda query: 'answer'))
+    assert router.claim('a')
+    router.record('a', 0.1, False)
+    assert router._stats['a'].state == OPEN
+    return router
+
+
+def test_half_open_admits_one_probe():
+    clock = Clock()
+    router = open_router(clock)
+    assert not router.claim('a')
+    clock.now = 10.0
+    assert router.claim('a')
+    assert router._stats['a'].state == HALF_OPEN
+    assert not router.claim('a') and router.rank() == []
+    router.record('a', 0.1, True)
+    assert router._stats['a'].state == CLOSED
+
+
+def test_released_probe_lets_next_request_probe():
+    clock = Clock()
+    router = open_router(clock)
+    clock.now = 10.0
+    assert router.claim('a')
+    router.release('a')
+    assert router.rank() == ['a']
+    assert router.claim('a')
+    router.record('a', 0.1, False)
+    assert router._stats['a'].state == OPEN
+
+
+def test_stale_probe_expires():
+    clock = Clock()
+    router = open_router(clock, probe_timeout=60.0)
+    clock.now = 10.0
+    assert router.claim('a')
+    clock.now = 69.0
+    assert not router.claim('a')
+    clock.now = 70.0
+    assert router.claim('a')
+
+
+def test_queued_primary_is_not_hedged():
+    import threading
+    import time
+
+    router = LLMRouter(hedge=True, hedge_min_samples=5, max_workers=1)
+
+    def answer(query):
+        time.sleep(0.01)
+        return 'answer'
+
+    router.add(Backend('a', answer, quality=1.0))
+    router.add(Backend('b', answer, quality=0.5))
+    for _ in range(5):
+        router.record('a', 0.02, True)
+    # Occupy the only worker: the primary waits in the queue well past its p95
+    release = threading.Event()
+    router._pool.submit(release.wait)
+    threading.Timer(0.2, release.set).start()
+    result = router.complete('query')
+    assert result.backend == 'a' and not result.hedged
+    assert result.latency_ms >= 200
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import metrics
+from market_data import missing_symbols
+
+
+def test_upstream_in_band_failure():
+    tracker = metrics.upstreams
+    with metrics.upstream('test-provider', 'call') as call:
+        call.fail('No data for X')
+    state = tracker.state('test-provider')
+    assert state['errors'] == 1 and state['last_error_message'] == 'No data for X'
+    with metrics.upstream('test-provider', 'call'):
+        pass
+    assert tracker.state('test-provider')['state'] == 'operational'
+
+
+def test_missing_symbols():
+    index = pd.date_range('2024-01-01', periods=2)
+    columns = pd.MultiIndex.from_product([['AAA', 'BBB'], ['Close', 'Volume']])
+    frame = pd.DataFrame(np.ones((2, 4)), index=index, columns=columns)
+    frame['BBB'] = np.nan
+    assert missing_symbols(frame, ['AAA', 'BBB', 'CCC']) == ['BBB', 'CCC']
+    assert missing_symbols(pd.DataFrame(), ['AAA']) == ['AAA']
+    assert missing_symbols(frame['AAA'], ['AAA']) == []
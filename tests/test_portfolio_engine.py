@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from portfolio_engine import RiskModel, analyze, holdings_columns
+
+
+def book(rows):
+    return holdings_columns([dict(zip(('symbol', 'value', 'sector'), row)) for row in rows])
+
+
+def risk_model(symbols, periods=120, seed=0):
+    rng = np.random.default_rng(seed)
+    return RiskModel(symbols, rng.normal(0.001, 0.02, (periods, len(symbols))))
+
+
+def test_duplicate_rows_are_netted():
+    report = analyze(book([('AAA', 100, 'Tech'), ('aaa', 50, 'Other'), ('BBB', 50, 'Energy')]),
+                     include_positions=True)
+    assert report['positions'] == 2
+    assert report['holdings']['symbol'] == ['AAA', 'BBB']
+    assert report['holdings']['value'] == [150.0, 50.0]
+    # The first row's sector labels the netted position
+    assert report['sectors'] == [{'name': 'Tech', 'percentage': 75.0}, {'name': 'Energy', 'percentage': 25.0}]
+
+
+def test_sector_exposure_sums_to_book():
+    report = analyze(book([('AAA', 30, 'Tech'), ('BBB', 20, 'Tech'), ('CCC', 50, None)]))
+    assert report['sectors'] == [{'name': 'Tech', 'percentage': 50.0},
+                                 {'name': 'Unclassified', 'percentage': 50.0}]
+    assert sum(s['percentage'] for s in report['asset_classes']) == pytest.approx(100.0)
+
+
+def test_risk_contributions_sum_to_one():
+    symbols = ['AAA', 'BBB', 'CCC', 'DDD']
+    report = analyze(book([(s, v, 'Tech') for s, v in zip(symbols, (40, 30, 20, 10))]),
+                     risk_model=risk_model(symbols), include_positions=True)
+    assert sum(report['holdings']['risk_contribution']) == pytest.approx(100.0, abs=1e-3)
+    assert sum(s['percentage'] for s in report['risk']['sector_contributions']) == pytest.approx(100.0)
+
+
+def test_realized_return_covers_only_covered_positions():
+    model = risk_model(['AAA', 'BBB'])
+    full = analyze(book([('AAA', 60, 'Tech'), ('BBB', 40, 'Tech')]), risk_model=model)
+    # Half the book has no history; the realized figure is for the covered half, not diluted by it
+    partial = analyze(book([('AAA', 60, 'Tech'), ('BBB', 40, 'Tech'), ('ZZZ', 100, 'Tech')]), risk_model=model)
+    assert partial['risk']['coverage'] == 50.0
+    assert partial['risk']['realized_return'] == full['risk']['realized_return']
+    assert partial['total_return'] == full['total_return']
+    assert partial['return_basis'] == 'history'
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from portfolio_engine import RiskModel, analyze
+from portfolio_optimizer import build_problem
+
+
+def market_returns(seed, periods, assets):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, (periods, 1))
+    return rng.normal(0.0004, 0.015, (periods, assets)) + market * rng.uniform(0.5, 1.5, assets)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_min_variance_with_shorting(seed):
+    returns = market_returns(seed, 250, 30)
+    cov = np.cov(returns, rowvar=False)
+    lower = -np.random.default_rng(seed).uniform(0.2, 1.0)
+    problem = build_problem([f'S{i}' for i in range(30)], cov, returns, min_weight=lower, max_weight=1.0)
+
+    weights = problem.min_variance()
+    assert weights.sum() == pytest.approx(1.0, abs=1e-12)
+    assert (weights >= lower - 1e-12).all() and (weights <= 1.0 + 1e-12).all()
+    # Optimal: the unconstrained-by-bounds solution on the free assets
+    free = (weights > lower + 1e-9) & (weights < 1.0 - 1e-9)
+    gradient = cov @ weights
+    assert np.ptp(gradient[free]) < 1e-9 * np.abs(gradient).max()
+    assert (gradient[~free & (weights <= lower + 1e-9)] >= gradient[free].max() - 1e-9).all()
+
+    returns_path, path = problem.critical_line()
+    assert np.allclose(path.sum(axis=0), 1.0, atol=1e-9)
+    assert (np.diff(returns_path) > 0).all()
+
+
+def test_critical_line_matches_min_variance_and_max_return():
+    returns = market_returns(7, 300, 12)
+    cov = np.cov(returns, rowvar=False)
+    sectors = np.array(['A', 'B', 'C'] * 4, dtype=object)
+    problem = build_problem([f'S{i}' for i in range(12)], cov, returns, min_weight=-0.3, max_weight=0.5,
+                            sectors=sectors, sector_limits={'A': (0.1, 0.6), 'B': (-0.2, 0.4)})
+    returns_path, path = problem.critical_line()
+    assert np.allclose(path[:, 0], problem.min_variance(), atol=1e-9)
+    assert returns_path[-1] == pytest.approx(problem.expected @ problem.extreme_return(), abs=1e-9)
+
+
+def holdings(symbols):
+    return {'symbol': np.array(symbols, dtype=object), 'value': np.full(len(symbols), 1000.0),
+            'cost_basis': np.full(len(symbols), np.nan), 'sector': np.array(['Tech'] * len(symbols), dtype=object),
+            'asset_class': np.array(['Equity'] * len(symbols), dtype=object)}
+
+
+def test_min_variance_hint_is_opt_in():
+    symbols = [f'S{i:02d}' for i in range(20)]
+    model = RiskModel(symbols, market_returns(3, 250, 20))
+    assert 'min_variance' not in analyze(holdings(symbols), model)['risk']
+
+
+def test_min_variance_hint_with_more_names_than_periods():
+    symbols = [f'S{i:02d}' for i in range(60)]
+    returns = np.random.default_rng(5).normal(0, 0.02, (12, 60)) * np.linspace(0.5, 2.0, 60)
+    report = analyze(holdings(symbols), RiskModel(symbols, returns), min_variance=True)
+    # The singular sample covariance has zero-variance long-only mixes, which
+    # would be reported as cutting volatility to 0%
+    hint = report['risk'].get('min_variance')
+    assert hint is None or hint['optimized_volatility'] > 0.2 * hint['volatility']
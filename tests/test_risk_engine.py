@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import risk_engine
+from risk_engine import analyze_risk, historical_var, max_drawdown, monte_carlo_var, parametric_var
+
+
+def normal_returns(periods=2000, assets=3, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0.0005, 0.01, (assets, periods))
+
+
+def test_methods_agree_across_horizons():
+    returns = normal_returns()
+    for horizon in (1, 10):
+        report = analyze_risk({'returns': returns.tolist(), 'simulations': 200_000,
+                               'horizon_days': horizon, 'seed': 1})
+        methods = report['methods']
+        parametric = methods['parametric']['var_95']
+        assert methods['historical']['var_95'] == pytest.approx(parametric, rel=0.15)
+        assert methods['monte_carlo']['var_95'] == pytest.approx(parametric, rel=0.05)
+
+
+def test_historical_var_aggregates_overlapping_returns():
+    returns = np.array([0.01, -0.02, 0.03, -0.04, 0.05])
+    var, cvar = historical_var(returns, confidence=0.75, horizon_days=2)
+    # Two-day sums: -0.01, 0.01, -0.01, 0.01
+    assert var == pytest.approx(0.01)
+    assert cvar == pytest.approx(0.01)
+    with pytest.raises(ValueError):
+        historical_var(returns, horizon_days=5)
+
+
+def test_parametric_and_monte_carlo_var():
+    var, cvar = parametric_var(0.0, 0.01, 0.95)
+    assert var == pytest.approx(0.0164485, rel=1e-5)
+    assert cvar == pytest.approx(0.0206271, rel=1e-5)
+
+    simulated = monte_carlo_var(np.zeros(2), np.diag([1e-4, 1e-4]), np.array([1.0, 0.0]),
+                                n_scenarios=400_000, seed=0, chunk_size=50_000)
+    assert simulated[0.95][0] == pytest.approx(var, rel=0.02)
+
+
+def test_max_drawdown():
+    assert max_drawdown([0.1, -0.5, 0.2]) == pytest.approx(0.5)
+    assert max_drawdown([0.01, 0.02]) == 0.0
+
+
+def test_parameters_are_validated(monkeypatch):
+    returns = normal_returns(periods=50).tolist()
+    monkeypatch.setattr(risk_engine, 'DEFAULT_SCENARIOS', 1000)
+    report = analyze_risk({'returns': returns, 'simulations': None, 'horizon_days': None, 'seed': 0})
+    assert report['simulations'] == 1000
+    assert report['horizon_days'] == 1
+    for bad in ({'simulations': 'many'}, {'simulations': 0}, {'horizon_days': [2]}, {'horizon_days': 0}):
+        with pytest.raises(ValueError):
+            analyze_risk(dict({'returns': returns}, **bad))
+
+
+def test_weights_by_symbol():
+    returns = normal_returns(periods=100, assets=2)
+    keyed = {'AAA': returns[0].tolist(), 'BBB': returns[1].tolist()}
+    by_symbol = analyze_risk({'returns': keyed, 'weights': {'BBB': 1.0}, 'simulations': 1000, 'seed': 0})
+    by_position = analyze_risk({'returns': returns.tolist(), 'weights': [0.0, 1.0],
+                                'simulations': 1000, 'seed': 0})
+    assert by_symbol['methods'] == by_position['methods']
+    with pytest.raises(ValueError):
+        analyze_risk({'returns': returns.tolist(), 'weights': {'AAA': 1.0}})
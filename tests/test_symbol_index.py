@@ -0,0 +1,17 @@
+import symbol_index
+
+
+def test_refresh_merges_blank_fields(tmp_path):
+    path = str(tmp_path / 'symbols.idx')
+    symbol_index.write_index(path, [
+        {'symbol': 'AAA', 'name': 'Alpha Inc', 'sector': 'Technology', 'market_cap': 5e9},
+    ])
+    csv_path = tmp_path / 'reference.csv'
+    csv_path.write_text('symbol,name,sector,market_cap,trailing_pe\naaa,,,,21.5\nBBB,Beta Corp,Energy,,\n')
+    symbol_index.refresh(path=path, csv_path=str(csv_path))
+    index = symbol_index.SymbolIndex(path)
+    assert index.get('AAA') == {
+        'symbol': 'AAA', 'name': 'Alpha Inc', 'sector': 'Technology', 'industry': None, 'currency': None,
+        'exchange': None, 'market_cap': 5e9, 'trailing_pe': 21.5,
+    }
+    assert index.get('BBB')['name'] == 'Beta Corp'
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Single-Flight TTL Cache
+=================================
+
+Bounded in-process cache used in front of slow upstream calls.
+
+* Hits never take a lock: entries live in a plain dict and are replaced,
+  never mutated, apart from their access tick.
+* Misses are single-flight per key: concurrent callers for the same key
+  wait on one loader call instead of each calling upstream.
+* Entries expire after ``ttl`` seconds, may be served stale for a further
+  ``stale_ttl`` seconds while one background refresh runs, and are evicted
+  least-recently-used first once the entry or byte budget is exceeded.
+"""
+
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'stale_until', 'size', 'last_access')
+
+    def __init__(self, value, expires_at, stale_until, size, last_access):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.size = size
+        self.last_access = last_access
+
+
+class _Flight:
+    """One in-progress load that other callers can wait on"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU/TTL cache with single-flight loading"""
+
+    def __init__(self, max_entries=1024, max_bytes=None, default_ttl=300,
+                 stale_ttl=0, sizeof=sys.getsizeof, name='cache'):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.sizeof = sizeof
+        self.name = name
+
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._ticks = itertools.count()
+        self._bytes = 0
+
+        # Counters are updated without a lock and are best-effort under contention
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load_errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None, allow_stale=False):
+        """Return a cached value without loading, or ``default``"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires_at or (allow_stale and now < entry.stale_until):
+                entry.last_access = next(self._ticks)
+                self.hits += 1
+                return entry.value
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        """Store a value, evicting older entries if over budget"""
+        ttl = self.default_ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        now = time.monotonic()
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        entry = _Entry(value, now + ttl, now + ttl + stale_ttl, size, next(self._ticks))
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict_locked(now)
+
+    def invalidate(self, key):
+        """Drop a single key"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self):
+        """Drop every entry; in-flight loads are left to finish"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_or_load(self, key, loader, ttl=None, stale_ttl=None, cache_if=None):
+        """Return the cached value for ``key``, calling ``loader`` on a miss.
+
+        Concurrent misses for the same key share one ``loader()`` call and
+        all receive its result (or its exception). Expired entries still
+        inside their stale window are returned immediately while a single
+        background refresh runs. Results failing ``cache_if`` are returned
+        but not stored.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires_at:
+                entry.last_access = next(self._ticks)
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                entry.last_access = next(self._ticks)
+                self.stale_hits += 1
+                self._start_flight(key, loader, ttl, stale_ttl, cache_if, background=True)
+                return entry.value
+
+        self.misses += 1
+        flight, leader = self._start_flight(key, loader, ttl, stale_ttl, cache_if)
+        if not leader:
+            self.coalesced += 1
+            flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _start_flight(self, key, loader, ttl, stale_ttl, cache_if, background=False):
+        """Join the in-flight load for ``key`` or become its leader"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+
+        if background:
+            threading.Thread(
+                target=self._run_flight,
+                args=(key, flight, loader, ttl, stale_ttl, cache_if),
+                name=f'{self.name}-refresh',
+                daemon=True,
+            ).start()
+        else:
+            self._run_flight(key, flight, loader, ttl, stale_ttl, cache_if)
+        return flight, True
+
+    def _run_flight(self, key, flight, loader, ttl, stale_ttl, cache_if):
+        try:
+            value = loader()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl=ttl, stale_ttl=stale_ttl)
+            flight.value = value
+        except Exception as e:
+            self.load_errors += 1
+            flight.error = e
+            logger.warning(f"{self.name}: load failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _evict_locked(self, now):
+        """Drop dead entries, then least-recently-used ones, until within budget"""
+        if not self._over_budget():
+            return
+
+        dead = [k for k, e in self._entries.items() if now >= e.stale_until]
+        for key in dead:
+            self._bytes -= self._entries.pop(key).size
+        self.expirations += len(dead)
+
+        if not self._over_budget():
+            return
+
+        # Evict down to 90% of the budget so eviction is amortized over inserts
+        target_entries = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9) if self.max_bytes is not None else None
+        excess = max(len(self._entries) - target_entries, 1)
+        ordered = heapq.nsmallest(
+            len(self._entries) if target_bytes is not None else excess,
+            self._entries.items(),
+            key=lambda item: item[1].last_access,
+        )
+        for key, entry in ordered:
+            if len(self._entries) <= target_entries and (
+                target_bytes is None or self._bytes <= target_bytes
+            ):
+                break
+            del self._entries[key]
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def _over_budget(self):
+        if len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def stats(self):
+        """Counters and occupancy for health and metrics endpoints"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'load_errors': self.load_errors,
+            'in_flight': len(self._flights),
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
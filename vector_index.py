@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+FinDeus - Local Vector Index
+============================
+
+In-process vector index for the RAG pipeline.
+
+* Vectors are kept in one contiguous float32 matrix, so exact top-k search
+  is a single matrix multiply plus a partial sort.
+* ``build_ivf()`` adds an inverted-file (IVF) approximate mode for large
+  collections: vectors are clustered with k-means, stored contiguously per
+  cluster, and a query only scans the ``nprobe`` closest clusters.
+* ``save()``/``load()`` persist the index to a directory::
+
+      {path}/
+          manifest.json         size, generation and IVF settings (the commit point)
+          vectors.{gen}.f4      raw float32 rows
+          records.{gen}.jsonl   one ``[id, metadata]`` line per row
+          centroids.{gen}.npy offsets.{gen}.npy   IVF arrays, if built
+
+  Saving rows added since the last save/load appends them to the current
+  generation's files and then atomically replaces the manifest, so a save
+  costs O(new rows) and readers never see a partial write. A reordering
+  ``build_ivf()`` (or a save to another path) writes a new generation under
+  fresh file names instead of overwriting files other processes may have
+  memory-mapped. Loading memory-maps the matrix; ids and metadata are
+  parsed from the records file, so startup is linear in their size.
+  One process writes to a directory at a time.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+METRICS = ('cosine', 'ip')
+# Rows of the matrix scored at once during exact search and k-means assignment
+SCAN_BLOCK = 65_536
+
+_GENERATION_FILE = re.compile(r'^(vectors|records|centroids|offsets)\.(\d+)\.(f4|jsonl|npy)$')
+
+
+def _files(path, generation):
+    """Data file paths of one saved generation"""
+    return {
+        'vectors': os.path.join(path, f'vectors.{generation}.f4'),
+        'records': os.path.join(path, f'records.{generation}.jsonl'),
+        'centroids': os.path.join(path, f'centroids.{generation}.npy'),
+        'offsets': os.path.join(path, f'offsets.{generation}.npy'),
+    }
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first"""
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class VectorIndex:
+    """Float32 vector index with exact and IVF approximate search"""
+
+    def __init__(self, dim, metric='cosine', capacity=1024):
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        self.dim = int(dim)
+        self.metric = metric
+        self.ids = []
+        self.metadata = []
+        self._id_positions = {}
+        self._vectors = np.empty((max(capacity, 1), self.dim), dtype=np.float32)
+        self._size = 0
+
+        # IVF state; vectors at positions >= _ivf_size are an unclustered tail
+        self._centroids = None
+        self._offsets = None
+        self._ivf_size = 0
+        self.nprobe = 8
+
+        # (directory, generation, rows) last saved or loaded; rows beyond it are unsaved
+        self._persisted = None
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return item_id in self._id_positions
+
+    @property
+    def vectors(self):
+        """Read-only view of the stored vectors"""
+        view = self._vectors[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def _prepare(self, vectors):
+        """Cast to contiguous float32 rows, normalized for cosine"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f'Expected vectors of dimension {self.dim}')
+        vectors = np.ascontiguousarray(vectors)
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        return vectors
+
+    def _reserve(self, extra):
+        """Grow the matrix geometrically so appends are amortized O(1)"""
+        needed = self._size + extra
+        if needed <= self._vectors.shape[0] and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._vectors.shape[0])
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def add(self, ids, vectors, metadata=None):
+        """Append vectors with their ids and optional metadata dicts"""
+        vectors = self._prepare(vectors)
+        ids = list(ids)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError('ids and vectors must have the same length')
+        if metadata is None:
+            metadata = [None] * len(ids)
+        elif len(metadata) != len(ids):
+            raise ValueError('metadata and vectors must have the same length')
+        elif not all(item is None or isinstance(item, dict) for item in metadata):
+            raise ValueError('metadata must be dicts')
+
+        duplicates = [i for i in ids if i in self._id_positions]
+        if duplicates or len(set(ids)) != len(ids):
+            raise ValueError(f'Duplicate ids: {duplicates[:5] or "within batch"}')
+
+        self._reserve(len(ids))
+        self._vectors[self._size:self._size + len(ids)] = vectors
+        for offset, item_id in enumerate(ids):
+            self._id_positions[item_id] = self._size + offset
+        self.ids.extend(ids)
+        self.metadata.extend(metadata)
+        self._size += len(ids)
+
+    def search(self, query, k=10, exact=None, nprobe=None):
+        """Top-k neighbours of one query as ``[{'id', 'score', 'metadata'}]``.
+
+        Uses the IVF index when one is built, unless ``exact`` is True.
+        """
+        q = self._prepare(query)[0]
+        use_ivf = self._centroids is not None and not exact
+        positions, scores = (
+            self._search_ivf(q, k, nprobe or self.nprobe) if use_ivf
+            else self._search_exact(q, k)
+        )
+        return [
+            {'id': self.ids[p], 'score': float(s), 'metadata': self.metadata[p]}
+            for p, s in zip(positions, scores)
+        ]
+
+    def search_batch(self, queries, k=10):
+        """Exact top-k for many queries: returns (positions, scores) arrays"""
+        Q = self._prepare(queries)
+        k = min(k, self._size)
+        positions = np.empty((Q.shape[0], k), dtype=np.int64)
+        scores = np.empty((Q.shape[0], k), dtype=np.float32)
+        if k == 0:
+            return positions, scores
+
+        all_scores = self._vectors[:self._size] @ Q.T
+        for row in range(Q.shape[0]):
+            best = _top_k(all_scores[:, row], k)
+            positions[row] = best
+            scores[row] = all_scores[best, row]
+        return positions, scores
+
+    def _search_exact(self, q, k):
+        """Brute-force scan, blocked so huge memory-mapped indexes stream"""
+        if self._size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self._size <= SCAN_BLOCK:
+            scores = self._vectors[:self._size] @ q
+            best = _top_k(scores, k)
+            return best, scores[best]
+
+        best_pos = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self._size, SCAN_BLOCK):
+            stop = min(start + SCAN_BLOCK, self._size)
+            scores = self._vectors[start:stop] @ q
+            local = _top_k(scores, k)
+            best_pos = np.concatenate((best_pos, local + start))
+            best_scores = np.concatenate((best_scores, scores[local]))
+            keep = _top_k(best_scores, k)
+            best_pos, best_scores = best_pos[keep], best_scores[keep]
+        return best_pos, best_scores
+
+    def _search_ivf(self, q, k, nprobe):
+        """Scan only the ``nprobe`` clusters closest to the query"""
+        centroid_scores = self._centroids @ q
+        probes = _top_k(centroid_scores, nprobe)
+
+        ranges = [(self._offsets[c], self._offsets[c + 1]) for c in probes]
+        # Vectors added after build_ivf() are not clustered yet; always scan them
+        ranges.append((self._ivf_size, self._size))
+
+        positions = np.concatenate([np.arange(a, b) for a, b in ranges if b > a] or
+                                   [np.empty(0, dtype=np.int64)])
+        if positions.size == 0:
+            return positions, np.empty(0, dtype=np.float32)
+        scores = np.concatenate([self._vectors[a:b] @ q for a, b in ranges if b > a])
+        best = _top_k(scores, k)
+        return positions[best], scores[best]
+
+    def build_ivf(self, nlist=None, nprobe=8, iterations=10, sample_size=None, seed=0):
+        """Cluster the vectors and regroup them contiguously per cluster.
+
+        ``nlist`` defaults to about ``sqrt(n)``. Centroids are trained
+        with spherical k-means on a sample of at most ``sample_size``
+        vectors (default ``64 * nlist``).
+        """
+        n = self._size
+        if n == 0:
+            raise ValueError('Cannot build an IVF index over an empty index')
+        if nlist is None:
+            nlist = int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        sample_size = min(n, sample_size or 64 * nlist)
+
+        rng = np.random.default_rng(seed)
+        sample = self._vectors[np.sort(rng.choice(n, sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = self._assign(sample, centroids)
+            counts = np.bincount(assignment, minlength=nlist)
+            # Sort by cluster so each cluster's points are one contiguous run to sum
+            order = np.argsort(assignment, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            counts[empty] = 1
+            centroids = sums / counts[:, None]
+            if self.metric == 'cosine':
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignment = self._assign(self._vectors[:n], centroids)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=nlist)
+
+        self._vectors = np.ascontiguousarray(self._vectors[order])
+        self.ids = [self.ids[i] for i in order]
+        self.metadata = [self.metadata[i] for i in order]
+        self._id_positions = {item_id: pos for pos, item_id in enumerate(self.ids)}
+
+        self._centroids = centroids.astype(np.float32)
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._ivf_size = n
+        self.nprobe = nprobe
+        # Rows moved, so the next save writes a new generation
+        self._persisted = None
+
+    def _assign(self, vectors, centroids):
+        """Nearest centroid (by inner product) for each row"""
+        assignment = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], SCAN_BLOCK):
+            stop = min(start + SCAN_BLOCK, vectors.shape[0])
+            assignment[start:stop] = np.argmax(vectors[start:stop] @ centroids.T, axis=1)
+        return assignment
+
+    def save(self, path):
+        """Persist to ``path``, appending to the saved generation when possible"""
+        os.makedirs(path, exist_ok=True)
+        directory = os.path.abspath(path)
+        manifest = _read_manifest(path)
+        appendable = (
+            manifest is not None and self._persisted is not None and
+            self._persisted == (directory, manifest['generation'], manifest['size'])
+        )
+        if appendable:
+            generation = manifest['generation']
+            start, records_bytes = manifest['size'], manifest['records_bytes']
+        else:
+            generation = manifest['generation'] + 1 if manifest else 0
+            start, records_bytes = 0, 0
+        files = _files(path, generation)
+
+        with open(files['vectors'], 'ab') as f:
+            # Discard bytes from a save that crashed before its commit
+            f.truncate(start * self.dim * 4)
+            f.write(np.ascontiguousarray(self._vectors[start:self._size], dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        records = b''.join(
+            json.dumps([item_id, metadata]).encode() + b'\n'
+            for item_id, metadata in zip(self.ids[start:self._size], self.metadata[start:self._size])
+        )
+        with open(files['records'], 'ab') as f:
+            f.truncate(records_bytes)
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+
+        manifest = {
+            'dim': self.dim,
+            'metric': self.metric,
+            'size': self._size,
+            'generation': generation,
+            'records_bytes': records_bytes + len(records),
+            'ivf': None,
+        }
+        if self._centroids is not None:
+            if not appendable:
+                np.save(files['centroids'], self._centroids)
+                np.save(files['offsets'], self._offsets)
+            manifest['ivf'] = {'ivf_size': self._ivf_size, 'nprobe': self.nprobe}
+
+        tmp = os.path.join(path, 'manifest.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        # Manifest is written last and swapped in atomically
+        os.replace(tmp, os.path.join(path, 'manifest.json'))
+        self._persisted = (directory, generation, self._size)
+
+        # Keep the previous generation for readers that loaded its manifest
+        # but have not opened its files yet; mapped files survive unlinking
+        for name in os.listdir(path):
+            match = _GENERATION_FILE.match(name)
+            if match and int(match.group(2)) < generation - 1:
+                os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index; vectors are memory-mapped read-only by default.
+
+        Adding to a memory-mapped index copies the matrix into memory first.
+        """
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        files = _files(path, manifest['generation'])
+        dim, size = manifest['dim'], manifest['size']
+
+        index = cls(dim, metric=manifest['metric'], capacity=1)
+        if mmap and size:
+            index._vectors = np.memmap(files['vectors'], dtype=np.float32, mode='r', shape=(size, dim))
+        else:
+            index._vectors = np.fromfile(files['vectors'], dtype=np.float32, count=size * dim).reshape(size, dim)
+        index._size = size
+
+        # Only the committed prefix; JSON strings never contain a raw newline
+        with open(files['records'], 'rb') as f:
+            records = f.read(manifest['records_bytes'])
+        rows = json.loads(b'[' + records.rstrip(b'\n').replace(b'\n', b',') + b']')
+        index.ids = [row[0] for row in rows]
+        index.metadata = [row[1] for row in rows]
+        index._id_positions = {item_id: pos for pos, item_id in enumerate(index.ids)}
+
+        if manifest['ivf']:
+            index._centroids = np.load(files['centroids'])
+            index._offsets = np.load(files['offsets'])
+            index._ivf_size = manifest['ivf']['ivf_size']
+            index.nprobe = manifest['ivf']['nprobe']
+        index._persisted = (os.path.abspath(path), manifest['generation'], size)
+        return index
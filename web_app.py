@@ -4,7 +4,7 @@ FinDeus - Advanced Financial Intelligence Platform
 =================================================
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 import os
@@ -12,8 +12,16 @@ import time
 import random
 from datetime import datetime
 
+import api_core
+import metrics
+import response_encoding
+from ai_streaming import SSE_HEADERS, fake_deltas, sse_stream, wants_stream
+from market_data import parse_symbols, to_columnar
+
 app = Flask(__name__)
 CORS(app)
+metrics.instrument(app)
+response_encoding.install(app)
 
 # Load environment variables
 def load_env():
@@ -38,18 +46,42 @@ def index():
     """Main dashboard page"""
     return render_template('index.html')
 
+# Routes behind each service reported by health
+SERVICE_ROUTES = {
+    'ai_engine': ['/api/ai/query'],
+    'market_data': ['/api/market/data/<symbol>', '/api/market/batch'],
+    'analytics': ['/api/portfolio/analyze', '/api/portfolio/upload', '/api/portfolio/optimize',
+                  '/api/analysis/risk', '/api/predictions/forecast'],
+}
+
+def health_status():
+    """Health payload shared by the Flask and ASGI servers"""
+    # A service is degraded/down after recent 5xx responses; idle until first use
+    services = {name: metrics.routes.summary(routes) for name, routes in SERVICE_ROUTES.items()}
+    return {
+        'status': 'degraded' if 'down' in services.values() else 'online',
+        'timestamp': datetime.now().isoformat(),
+        'services': services,
+        'upstreams': metrics.upstreams.states()
+    }
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'online',
-        'timestamp': datetime.now().isoformat(),
-        'services': {
-            'ai_engine': 'operational',
-            'market_data': 'operational',
-            'analytics': 'operational'
-        }
-    })
+    return jsonify(health_status())
+
+def simulated_answer(query):
+    """Canned contextual answer for the demo AI engine"""
+    # Generate contextual response based on query
+    if 'market' in query.lower() or 'stock' in query.lower():
+        response = f"Based on current market analysis, here's my assessment of '{query}': The market shows mixed signals with volatility expected. Key indicators suggest cautious optimism for the next quarter. Technical analysis reveals support levels holding, but watch for potential resistance at current levels."
+    elif 'portfolio' in query.lower() or 'investment' in query.lower():
+        response = f"Portfolio analysis for '{query}': Diversification remains key. Current allocation shows 60% equities, 30% bonds, 10% alternatives. Risk-adjusted returns are within target parameters. Consider rebalancing if equity allocation exceeds 65%."
+    elif 'risk' in query.lower():
+        response = f"Risk assessment for '{query}': Current risk metrics show moderate exposure. VaR calculations suggest 2.3% daily risk. Stress testing indicates portfolio resilience under various scenarios. Consider hedging strategies for downside protection."
+    else:
+        response = f"Financial analysis for '{query}': Based on comprehensive data analysis, multiple factors indicate this requires careful consideration. Market conditions, economic indicators, and risk metrics all play crucial roles in this assessment. Recommend further analysis before making decisions."
+    return response
 
 @app.route('/api/ai/query', methods=['POST'])
 def ai_query():
@@ -61,19 +93,19 @@ def ai_query():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
+        response = simulated_answer(query)
+        
+        if wants_stream(data, request.args):
+            # Stream the simulated answer a few words at a time
+            return Response(
+                stream_with_context(sse_stream(fake_deltas(response, interval=0.02, chunk_words=3), 'findeus-sim', 'simulated')),
+                mimetype='text/event-stream',
+                headers=SSE_HEADERS
+            )
+        
         # Simulate AI processing
         time.sleep(0.5)
         
-        # Generate contextual response based on query
-        if 'market' in query.lower() or 'stock' in query.lower():
-            response = f"Based on current market analysis, here's my assessment of '{query}': The market shows mixed signals with volatility expected. Key indicators suggest cautious optimism for the next quarter. Technical analysis reveals support levels holding, but watch for potential resistance at current levels."
-        elif 'portfolio' in query.lower() or 'investment' in query.lower():
-            response = f"Portfolio analysis for '{query}': Diversification remains key. Current allocation shows 60% equities, 30% bonds, 10% alternatives. Risk-adjusted returns are within target parameters. Consider rebalancing if equity allocation exceeds 65%."
-        elif 'risk' in query.lower():
-            response = f"Risk assessment for '{query}': Current risk metrics show moderate exposure. VaR calculations suggest 2.3% daily risk. Stress testing indicates portfolio resilience under various scenarios. Consider hedging strategies for downside protection."
-        else:
-            response = f"Financial analysis for '{query}': Based on comprehensive data analysis, multiple factors indicate this requires careful consideration. Market conditions, economic indicators, and risk metrics all play crucial roles in this assessment. Recommend further analysis before making decisions."
-        
         return jsonify({
             'response': response,
             'timestamp': datetime.now().isoformat(),
@@ -84,126 +116,97 @@ def ai_query():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def simulate_quote(symbol):
+    """Simulated quote for a single symbol"""
+    base_price = 150 + random.uniform(-50, 50)
+    change = random.uniform(-5, 5)
+    change_percent = (change / base_price) * 100
+    
+    return {
+        'symbol': symbol.upper(),
+        'price': round(base_price + change, 2),
+        'change': round(change, 2),
+        'change_percent': round(change_percent, 2),
+        'volume': random.randint(1000000, 10000000)
+    }
+
+def simulate_market_data(symbol):
+    """Simulated quote with valuation fields"""
+    quote = simulate_quote(symbol)
+    quote.update({
+        'timestamp': datetime.now().isoformat(),
+        'market_cap': f"${random.randint(10, 500)}B",
+        'pe_ratio': round(random.uniform(15, 35), 2)
+    })
+    return quote
+
 @app.route('/api/market/data/<symbol>')
 def market_data(symbol):
     """Market data endpoint"""
     try:
         # Simulate market data
-        base_price = 150 + random.uniform(-50, 50)
-        change = random.uniform(-5, 5)
-        change_percent = (change / base_price) * 100
-        
-        return jsonify({
-            'symbol': symbol.upper(),
-            'price': round(base_price + change, 2),
-            'change': round(change, 2),
-            'change_percent': round(change_percent, 2),
-            'volume': random.randint(1000000, 10000000),
-            'timestamp': datetime.now().isoformat(),
-            'market_cap': f"${random.randint(10, 500)}B",
-            'pe_ratio': round(random.uniform(15, 35), 2)
-        })
+        return jsonify(simulate_market_data(symbol))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/portfolio/analyze', methods=['POST'])
-def portfolio_analyze():
-    """Portfolio analysis endpoint"""
+@app.route('/api/market/batch', methods=['GET', 'POST'])
+def market_batch():
+    """Batch market data endpoint"""
     try:
-        data = request.json
-        holdings = data.get('holdings', [])
-        
-        if not holdings:
-            return jsonify({'error': 'Holdings data required'}), 400
-        
-        # Simulate portfolio analysis
-        total_value = sum(float(h.get('value', 0)) for h in holdings)
+        if request.method == 'POST':
+            raw_symbols = (request.json or {}).get('symbols')
+        else:
+            raw_symbols = request.args.get('symbols')
         
-        analysis = {
-            'total_value': round(total_value, 2),
-            'total_return': round(random.uniform(-5, 15), 2),
-            'risk_score': round(random.uniform(3, 8), 1),
-            'diversification_score': round(random.uniform(6, 9), 1),
-            'sectors': [
-                {'name': 'Technology', 'percentage': 35},
-                {'name': 'Healthcare', 'percentage': 20},
-                {'name': 'Finance', 'percentage': 25},
-                {'name': 'Consumer', 'percentage': 20}
-            ],
-            'recommendations': [
-                'Consider reducing tech exposure',
-                'Increase international diversification',
-                'Add defensive positions'
-            ],
-            'timestamp': datetime.now().isoformat()
-        }
+        symbols = parse_symbols(raw_symbols)
+        quotes = {symbol: simulate_quote(symbol) for symbol in symbols}
         
-        return jsonify(analysis)
+        payload = to_columnar(symbols, quotes)
+        payload['timestamp'] = datetime.now().isoformat()
+        return jsonify(payload)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Shared framework-free handlers; the demo app never downloads history
+def core_view(handler, **path_params):
+    """Serve an api_core handler, reading history from the local store only"""
+    params = api_core.request_params(
+        request.args.to_dict(), request.get_json(silent=True), path_params,
+        forced={'refresh': False}
+    )
+    payload, status = handler(params)
+    return jsonify(payload), status
+
+@app.route('/api/portfolio/analyze', methods=['POST'])
+def portfolio_analyze():
+    """Portfolio analysis endpoint"""
+    return core_view(api_core.portfolio_analyze)
+
+@app.route('/api/portfolio/optimize', methods=['POST'])
+def portfolio_optimize():
+    """Mean-variance portfolios and the efficient frontier"""
+    return core_view(api_core.portfolio_optimize)
+
+@app.route('/api/portfolio/upload', methods=['POST'])
+def portfolio_upload():
+    """Portfolio analysis of a streamed CSV or NDJSON holdings file"""
+    params = api_core.request_params(request.args.to_dict(), forced={'refresh': False})
+    payload, status = api_core.portfolio_upload(params, api_core.read_chunks(request.stream), request.mimetype)
+    return jsonify(payload), status
+
 @app.route('/api/analysis/risk', methods=['POST'])
 def risk_analysis():
     """Risk analysis endpoint"""
-    try:
-        data = request.json
-        portfolio = data.get('portfolio', {})
-        
-        # Simulate risk calculations
-        var_95 = round(random.uniform(2, 8), 2)
-        var_99 = round(random.uniform(4, 12), 2)
-        sharpe_ratio = round(random.uniform(0.8, 2.2), 2)
-        
-        risk_metrics = {
-            'var_95': var_95,
-            'var_99': var_99,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': round(random.uniform(8, 25), 2),
-            'volatility': round(random.uniform(12, 28), 2),
-            'beta': round(random.uniform(0.7, 1.3), 2),
-            'risk_grade': 'B+' if var_95 < 5 else 'B' if var_95 < 7 else 'C+',
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return jsonify(risk_metrics)
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return core_view(api_core.risk_analysis)
 
 @app.route('/api/predictions/forecast', methods=['POST'])
 def forecast():
     """Market forecast endpoint"""
-    try:
-        data = request.json
-        symbol = data.get('symbol', 'MARKET')
-        days = int(data.get('days', 30))
-        
-        # Generate forecast data
-        current_price = 150 + random.uniform(-50, 50)
-        forecast_data = []
-        
-        for i in range(days):
-            date = datetime.now().strftime('%Y-%m-%d')
-            price = current_price * (1 + random.uniform(-0.03, 0.03))
-            forecast_data.append({
-                'date': date,
-                'price': round(price, 2),
-                'confidence': round(random.uniform(0.6, 0.9), 2)
-            })
-            current_price = price
-        
-        return jsonify({
-            'symbol': symbol,
-            'forecast': forecast_data,
-            'trend': 'bullish' if forecast_data[-1]['price'] > forecast_data[0]['price'] else 'bearish',
-            'accuracy': round(random.uniform(0.7, 0.85), 2),
-            'timestamp': datetime.now().isoformat()
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return core_view(api_core.forecast)
 
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist